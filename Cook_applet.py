@@ -2,58 +2,124 @@
 点菜系统微信小程序后端 - 主应用文件
 支持用户端点餐和商家端接单功能
 """
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from dataclasses import dataclass, asdict
-from typing import List, Optional
-from datetime import datetime
-from enum import Enum
+from fastapi.responses import Response
+from dataclasses import dataclass, fields
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from datetime import date, datetime, timedelta
 from contextlib import asynccontextmanager
 import json
 import asyncio
 import os
 
+from order_store import (OrderStore, sort_key, decode_cursor, encode_cursor,
+                         to_microseconds, from_microseconds)
+from order_persistence import OrderWriteBehind, load_active_orders, load_order, query_orders_page
+from order_archive import OrderArchive, OrderRetention
+# 订单模型使用紧凑的内存表示，见 order_model.py
+from order_model import Order, OrderItem, OrderStatus
+import analytics
+from analytics import SalesAnalytics, load_order_columns
+from order_state_machine import InvalidTransition, OrderStateMachine, TransitionLog, load_transitions
+from idempotency import KEY_FIELD, IdempotencyCache, normalize_key, request_fingerprint, scoped_key
+from menu_cache import MenuSnapshot, from_cents
+from search_index import DishSearchIndex
+from image_pipeline import ImagePipeline
+import static_cache
+from static_cache import StaticCache, REVALIDATE_CACHE_CONTROL
+from recipe_parser import parse_recipe, recipe_columns, recipe_from_columns
+from serializer import encode, json_response
+from connection_manager import ConnectionManager
+from kitchen_board import KitchenBoard
+from event_bus import create_event_bus
+from db_executor import DBExecutor, LoopLagMonitor
+from logger import get_logger
+from metrics import (REGISTRY, CONTENT_TYPE, MetricsMiddleware, WS_CONNECTIONS, WS_QUEUE_DEPTH,
+                     ORDER_WRITES_PENDING)
+from config import (ORDER_FLUSH_INTERVAL_MS, ORDER_FLUSH_BATCH_SIZE,
+                    WS_QUEUE_SIZE, WS_OVERFLOW_POLICY, WS_SEND_TIMEOUT,
+                    SERVER_HOST, SERVER_PORT, SERVER_WORKERS,
+                    EVENT_BUS_BACKEND, EVENT_JOURNAL_PATH, EVENT_POLL_INTERVAL_MS,
+                    DB_READ_THREADS, LOOP_LAG_INTERVAL_MS,
+                    ORDER_PAGE_DEFAULT_LIMIT, ORDER_PAGE_MAX_LIMIT, BATCH_MAX_ITEMS,
+                    KITCHEN_PUSH_INTERVAL_MS, SEARCH_PAGE_DEFAULT_LIMIT, SEARCH_PAGE_MAX_LIMIT,
+                    IMAGE_DIR, IMAGE_THUMBNAIL_WIDTHS, IMAGE_WORKERS, IMAGE_MAX_BYTES, IMAGE_FETCH_TIMEOUT,
+                    IMAGE_FETCH_ALLOWED_HOSTS,
+                    STATIC_CACHE_MAX_BYTES, ORDER_HOT_RETENTION_MINUTES, ORDER_ARCHIVE_AFTER_DAYS,
+                    ORDER_ARCHIVE_DIR, ORDER_RETENTION_INTERVAL_S, ORDER_ARCHIVE_INTERVAL_S,
+                    ORDER_ARCHIVE_BATCH_SIZE, ANALYTICS_DEFAULT_DAYS, ANALYTICS_MAX_DAYS,
+                    ANALYTICS_WARM_DAYS, ANALYTICS_TOP_LIMIT, ORDER_TRANSITION_LOG_CAPACITY,
+                    IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES)
+
+logger = get_logger("app")
+
 # 定义生命周期管理器
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时初始化数据
-    from database import SessionLocal, DishModel
-    db = SessionLocal()
+    # 启动时初始化数据（数据库操作同样放到 db_executor 线程中执行）
+    from database import init_database
+    await loop_monitor.start()
+    await db_executor.run_write(init_database)
+    await asyncio.get_running_loop().run_in_executor(None, register_static_assets)
     try:
-        db_dishes = db.query(DishModel).all()
-        for db_dish in db_dishes:
-            dish = Dish(
-                id=db_dish.id,
-                name=db_dish.name,
-                price=db_dish.price,
-                description=db_dish.description,
-                image_url=db_dish.image_url,
-                cooking_instructions=db_dish.cooking_instructions,
-                category=db_dish.category,
-                is_available=db_dish.is_available
-            )
-            dishes_db.append(dish)
-        print(f"已加载 {len(dishes_db)} 个菜品")
+        await db_executor.write(_db_backfill_recipes)
+        dishes_db.extend(await db_executor.read(_db_load_dishes))
+        refresh_menu_snapshot()
+        logger.info(f"已加载 {len(dishes_db)} 个菜品")
     except Exception as e:
-        print(f"加载数据失败: {e}")
-    finally:
-        db.close()
+        logger.error(f"加载数据失败: {e}")
+    
+    # 只恢复未结束的订单，历史订单留在数据库中
+    try:
+        for row in await db_executor.run_read(load_active_orders):
+            orders_db.add(order_from_dict(row))
+        logger.info(f"已恢复 {len(orders_db)} 个进行中的订单")
+    except Exception as e:
+        logger.error(f"恢复订单失败: {e}")
+    try:
+        await idempotency_cache.load()
+    except Exception as e:
+        logger.error(f"加载幂等键失败: {e}")
+    await order_writer.start()
+    await idempotency_cache.start()
+    await order_transition_log.start()
+    await order_retention.start()
+    await sales_analytics.start()
+    await event_bus.start()
+    await kitchen_board.start(lambda message: kitchen_manager.broadcast(encode(message)))
     
-    print("点菜系统API启动成功！")
-    print("=" * 50)
-    print("📱 用户端页面: http://yxcmqx.top:8000/demo.html")
-    print("🏪 商家端页面: http://yxcmqx.top:8000/merchant.html")
-    print("📖 API文档: http://yxcmqx.top:8000/docs")
-    print("🔌 WebSocket: ws://yxcmqx.top:8000/ws/merchant")
-    print("=" * 50)
+    logger.info("点菜系统API启动成功！\n" + "\n".join([
+        "=" * 50,
+        "📱 用户端页面: http://yxcmqx.top:8000/demo.html",
+        "🏪 商家端页面: http://yxcmqx.top:8000/merchant.html",
+        "📖 API文档: http://yxcmqx.top:8000/docs",
+        "📈 运行指标: http://yxcmqx.top:8000/metrics",
+        "🔌 WebSocket: ws://yxcmqx.top:8000/ws/merchant",
+        "=" * 50,
+    ]))
     
     yield
     
-    # 关闭时的清理工作（如需要）
-    print("应用正在关闭...")
+    # 关闭时把尚未写入的订单全部落盘
+    logger.info("应用正在关闭...")
+    await event_bus.stop()
+    await kitchen_board.stop()
+    await manager.close_all()
+    await kitchen_manager.close_all()
+    await order_retention.stop()
+    await sales_analytics.stop()
+    await order_transition_log.stop()
+    await idempotency_cache.stop()
+    await order_writer.stop()
+    # 所有写入都已落盘，等数据库线程执行完手头的操作后再关闭连接池
+    db_executor.shutdown()
+    from database import engine, read_engine
+    engine.dispose()
+    read_engine.dispose()
+    await loop_monitor.stop()
+    image_pipeline.close()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -69,18 +135,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Has-More", "X-Menu-Version", "Idempotent-Replayed"],
 )
 
-# ==================== 数据模型定义 ====================
-
-class OrderStatus(str, Enum):
-    """订单状态枚举"""
-    PENDING = "pending"  # 待接单（用户刚下单）
-    ACCEPTED = "accepted"  # 已接单（商家已接单）
-    PREPARING = "preparing"  # 制作中（商家正在制作）
-    COMPLETED = "completed"  # 已完成（制作完成）
-    CANCELLED = "cancelled"  # 已取消
+# 请求耗时和在途请求数统计（放在最外层，耗时包含CORS处理）
+app.add_middleware(MetricsMiddleware)
 
+# ==================== 数据模型定义 ====================
 
 @dataclass
 class Dish:
@@ -93,29 +154,9 @@ class Dish:
     image_url: Optional[str] = None
     cooking_instructions: Optional[str] = None  # 制作说明
     is_available: bool = True
-
-
-@dataclass
-class OrderItem:
-    """订单项模型"""
-    dish_id: int
-    dish_name: str
-    quantity: int
-    price: float
-
-
-@dataclass
-class Order:
-    """订单模型"""
-    id: str
-    user_id: str
-    user_name: str
-    total_amount: float
-    status: OrderStatus
-    items: List[OrderItem]
-    created_at: datetime
-    updated_at: datetime
-    note: Optional[str] = None
+    thumbnails: Optional[dict] = None  # 缩略图 {"宽度": URL}，菜单列表应优先使用
+    # 结构化菜谱 {"ingredients": [{"name", "quantity"}], "steps": [...], "tips": [...]}，只在菜品详情中返回
+    recipe: Optional[dict] = None
 
 
 @dataclass
@@ -135,36 +176,108 @@ class PaymentRequest:
     amount: float
 
 
+class OrderAction(NamedTuple):
+    """商家对订单的操作（允许从哪些状态执行由 order_state_machine.TRANSITIONS 决定）"""
+    target: OrderStatus
+    error: str  # 状态机不允许时的提示
+    message: str  # 成功提示
+    log: str  # 日志前缀
+
+
+# 单个接口和批量接口共用同一个状态机
+ORDER_ACTIONS = {
+    "accept": OrderAction(OrderStatus.ACCEPTED, "订单状态不正确，无法接单", "接单成功", "✅ 商家已接单"),
+    "start": OrderAction(OrderStatus.PREPARING, "订单状态不正确，请先接单", "开始制作", "🍳 开始制作订单"),
+    "complete": OrderAction(OrderStatus.COMPLETED, "订单状态不正确，请先开始制作", "订单已完成", "✅ 订单已完成"),
+    "cancel": OrderAction(OrderStatus.CANCELLED, "订单已完成，无法取消", "订单已取消", "❌ 订单已取消"),
+}
+
+
 # ==================== 数据存储（示例用内存存储，生产环境应使用数据库）====================
 
 # 菜品数据存储
 dishes_db: List[Dish] = []
+# 菜品ID索引（菜品变更时随菜单快照一起重建）
+dishes_by_id: Dict[int, Dish] = {}
 
-# 订单数据存储
-orders_db: List[Order] = []
-order_id_counter = 1
+# 订单数据存储（按订单号、用户、状态建立索引）
+orders_db = OrderStore()
 
-# WebSocket连接管理器（用于实时通知商家）
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+# 数据库执行器（所有数据库操作都在线程池中执行）和事件循环延迟监控
+db_executor = DBExecutor(DB_READ_THREADS)
+loop_monitor = LoopLagMonitor(LOOP_LAG_INTERVAL_MS)
+
+# 订单后台批量写入器（订单创建和状态变更都会登记到这里）
+order_writer = OrderWriteBehind(ORDER_FLUSH_INTERVAL_MS, ORDER_FLUSH_BATCH_SIZE, db_executor)
+
+# 订单状态机：所有状态变更都经过它，流转记录先进环形缓冲区再批量写入数据库
+order_transition_log = TransitionLog(ORDER_TRANSITION_LOG_CAPACITY, ORDER_FLUSH_INTERVAL_MS, db_executor)
+order_machine = OrderStateMachine(orders_db, order_transition_log)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# 下单幂等键缓存：重试请求直接返回第一次的响应，新键批量写入数据库
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES,
+                                     ORDER_FLUSH_INTERVAL_MS, db_executor)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+# 订单分层保留：已结束的订单过一段时间移出内存，更早的从数据库移入按天压缩的归档文件
+order_archive = OrderArchive(ORDER_ARCHIVE_DIR)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                pass
 
+def evict_terminal_orders(cutoff: datetime) -> int:
+    """移出内存中更新时间早于 cutoff、且已写入数据库的已结束订单，返回移出数量"""
+    count = 0
+    for status in (OrderStatus.COMPLETED, OrderStatus.CANCELLED):
+        for order in orders_db.by_status(status):
+            if order.updated_at < cutoff and not order_writer.is_pending(order.id):
+                orders_db.remove(order.id)
+                count += 1
+    return count
 
-manager = ConnectionManager()
+
+order_retention = OrderRetention(
+    order_archive, evict_terminal_orders, db_executor,
+    hot_retention_minutes=ORDER_HOT_RETENTION_MINUTES, archive_after_days=ORDER_ARCHIVE_AFTER_DAYS,
+    retention_interval=ORDER_RETENTION_INTERVAL_S, archive_interval=ORDER_ARCHIVE_INTERVAL_S,
+    batch_size=ORDER_ARCHIVE_BATCH_SIZE
+)
+
+# WebSocket连接管理器（用于实时通知商家）
+manager = ConnectionManager(WS_QUEUE_SIZE, WS_OVERFLOW_POLICY, WS_SEND_TIMEOUT)
+
+# 后厨看板（随订单新增和状态变更增量更新）及其WebSocket连接
+kitchen_board = KitchenBoard(lambda dish_id: dishes_by_id.get(dish_id), KITCHEN_PUSH_INTERVAL_MS)
+orders_db.subscribe(kitchen_board.on_order_change)
+kitchen_manager = ConnectionManager(WS_QUEUE_SIZE, WS_OVERFLOW_POLICY, WS_SEND_TIMEOUT)
+
+# 销售统计（按天汇总，订单变更时只重算变更订单的下单日期）
+sales_analytics = SalesAnalytics(
+    lambda start, end, exclude: load_order_columns(start, end, order_archive, exclude),
+    orders_db.all, db_executor, warm_days=ANALYTICS_WARM_DAYS
+)
+orders_db.subscribe(sales_analytics.on_order_change)
+
+# 预序列化的菜单快照（菜品变更时重建）
+menu_snapshot = MenuSnapshot()
+# 菜品搜索索引（菜品变更时只重新索引变化的菜品）
+search_index = DishSearchIndex()
+
+# 菜品图片本地化和缩略图（后台线程池），以及内存中的预压缩静态资源
+image_pipeline = ImagePipeline(IMAGE_DIR, "/static/images", IMAGE_THUMBNAIL_WIDTHS, IMAGE_WORKERS,
+                               IMAGE_MAX_BYTES, IMAGE_FETCH_TIMEOUT, IMAGE_FETCH_ALLOWED_HOSTS)
+static_assets = StaticCache(STATIC_CACHE_MAX_BYTES)
+# 正在进行的后台任务（持有引用，避免任务未完成就被回收）
+background_tasks = set()
+
+# 导出时才读取的运行状态指标
+WS_CONNECTIONS.set_function(lambda: len(manager.active_connections))
+WS_QUEUE_DEPTH.set_function(manager.queue_depth)
+ORDER_WRITES_PENDING.set_function(lambda: order_writer.pending_count)
+
+# 事件总线（多 worker 部署时用于同步各进程的订单、菜品和WebSocket通知）
+event_bus = create_event_bus(
+    EVENT_BUS_BACKEND,
+    **({"path": EVENT_JOURNAL_PATH, "poll_interval_ms": EVENT_POLL_INTERVAL_MS}
+       if EVENT_BUS_BACKEND == "sqlite" else {})
+)
 
 # ==================== 辅助函数 ====================
 
@@ -174,29 +287,238 @@ def serialize_datetime(obj):
         return obj.isoformat()
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
-def dataclass_to_dict(obj):
-    """将dataclass对象转换为字典，处理datetime等特殊类型"""
-    if hasattr(obj, '__dataclass_fields__'):
-        result = asdict(obj)
-        # 递归处理字典中的datetime对象
-        return _convert_datetime_in_dict(result)
-    elif isinstance(obj, list):
-        return [dataclass_to_dict(item) for item in obj]
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    else:
-        return obj
-
-def _convert_datetime_in_dict(data):
-    """递归转换字典中的datetime对象"""
-    if isinstance(data, dict):
-        return {key: _convert_datetime_in_dict(value) for key, value in data.items()}
-    elif isinstance(data, list):
-        return [_convert_datetime_in_dict(item) for item in data]
-    elif isinstance(data, datetime):
-        return data.isoformat()
+def parse_datetime(value):
+    """事件或数据库中的时间统一转为datetime"""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def order_from_dict(data: dict) -> Order:
+    """由字典（数据库恢复或其他 worker 的事件）重建订单对象"""
+    status = data["status"]
+    return Order(
+        id=data["id"],
+        user_id=data["user_id"],
+        user_name=data["user_name"],
+        total_amount=data["total_amount"],
+        status=OrderStatus(status) if status in OrderStatus._value2member_map_ else status,
+        items=data["items"],  # 订单项字典直接打包，不创建中间的 OrderItem
+        created_at=parse_datetime(data["created_at"]),
+        updated_at=parse_datetime(data["updated_at"]),
+        note=data.get("note"),
+        status_times={status: parse_datetime(at) for status, at in (data.get("status_times") or {}).items()}
+    )
+
+# 菜品列表中返回的字段（结构化菜谱只在详情中返回，列表保持原来的体积）
+DISH_SUMMARY_FIELDS = tuple(f.name for f in fields(Dish) if f.name != "recipe")
+# 菜品详情中返回的字段（制作说明以结构化菜谱 recipe 返回，不再重复带原文）
+DISH_DETAIL_FIELDS = tuple(f.name for f in fields(Dish) if f.name != "cooking_instructions")
+
+
+def encode_dish_summary(dish: Dish) -> str:
+    """菜品列表中单个菜品的JSON"""
+    return encode({name: getattr(dish, name) for name in DISH_SUMMARY_FIELDS})
+
+
+def encode_dish_detail(dish: Dish) -> str:
+    """菜品详情的JSON"""
+    return encode({name: getattr(dish, name) for name in DISH_DETAIL_FIELDS})
+
+
+def refresh_menu_snapshot():
+    """菜品增删改后重建菜单快照、菜品ID索引和搜索索引"""
+    global dishes_by_id
+    menu_snapshot.rebuild(dishes_db, encode_dish_summary, encode_dish_detail)
+    search_index.sync(dishes_db)
+    dishes_by_id = {dish.id: dish for dish in dishes_db}
+
+
+def _local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """带时区的时间转为本地时间（订单时间均为本地 naive datetime）"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+async def orders_page_response(limit: int, user_id: Optional[str] = None, status: Optional[str] = None,
+                               before: Optional[str] = None, after: Optional[str] = None,
+                               from_time: Optional[datetime] = None, to_time: Optional[datetime] = None):
+    """
+    订单游标分页：依次合并内存中的订单、数据库中已持久化的订单和归档文件中的历史订单
+    每层都只取 limit 条，翻到多深代价都和第一页相同；本页已经确定不会包含归档订单时不读归档文件。
+    响应体仍是订单数组，下一页游标放在 X-Next-Cursor 响应头中
+    """
+    try:
+        before_key = decode_cursor(before) if before else None
+        after_key = decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="分页游标格式错误")
+    from_time, to_time = _local_naive(from_time), _local_naive(to_time)
+
+    hot, hot_more = orders_db.page(
+        limit, user_id=user_id, status=status, before=before_key, after=after_key,
+        start=to_microseconds(from_time) if from_time else None,
+        end=to_microseconds(to_time) if to_time else None
+    )
+    query_args = (
+        limit, user_id, status,
+        (from_microseconds(before_key[0]), before_key[1]) if before_key else None,
+        (from_microseconds(after_key[0]), after_key[1]) if after_key else None,
+        from_time, to_time
+    )
+    try:
+        # 内存中已有的订单由内存层返回，数据库层跳过它们，db_more 只统计其余订单
+        rows, db_more = await db_executor.run_read(query_orders_page, *query_args, orders_db)
+    except Exception as e:
+        # 历史库不可用时退化为只返回内存中的订单
+        logger.warning(f"⚠️ 查询历史订单失败: {e}")
+        rows, db_more = [], False
+
+    # 越靠前的层状态越新，后面层里同一订单的旧快照直接忽略
+    merged = {order.id: order for order in hot}
+    for row in rows:
+        if row["id"] not in orders_db and row["id"] not in merged:
+            merged[row["id"]] = order_from_dict(row)
+    ordered = sorted(merged.values(), key=sort_key, reverse=True)
+    forward = after_key is not None and before_key is None
+    has_more = hot_more or db_more
+
+    archive_bound = await db_executor.run_read(order_archive.upper_bound)
+    if archive_bound is not None and _may_need_archive(ordered, limit, forward, after_key, archive_bound):
+        try:
+            archived, archive_more = await db_executor.run_read(order_archive.query_page, *query_args)
+        except Exception as e:
+            logger.warning(f"⚠️ 查询归档订单失败: {e}")
+            archived, archive_more = [], False
+        for row in archived:
+            if row["id"] not in merged:
+                merged[row["id"]] = order_from_dict(row)
+        ordered = sorted(merged.values(), key=sort_key, reverse=True)
+        has_more = has_more or archive_more
+
+    page = ordered[-limit:] if forward else ordered[:limit]
+    has_more = has_more or len(ordered) > limit
+
+    headers = {"X-Has-More": "true" if has_more else "false"}
+    if page:
+        headers["X-Next-Cursor"] = encode_cursor(sort_key(page[0] if forward else page[-1]))
+    return json_response(page, headers=headers)
+
+
+def _may_need_archive(ordered: List[Order], limit: int, forward: bool, after_key, archive_bound: datetime) -> bool:
+    """
+    本页是否可能包含归档订单（归档订单的下单时间都早于 archive_bound）
+    向前翻页时游标已经晚于 archive_bound，或向后翻页时本页已满且最后一条也晚于 archive_bound，都不需要读归档
+    """
+    bound = to_microseconds(archive_bound)
+    if forward:
+        return after_key[0] < bound
+    return len(ordered) <= limit or sort_key(ordered[limit - 1])[0] < bound
+
+
+async def find_order(order_id: str) -> Optional[Order]:
+    """按订单号查找订单：依次查内存、数据库和归档文件"""
+    order = orders_db.get(order_id)
+    if order is not None:
+        return order
+    try:
+        row = await db_executor.run_read(load_order, order_id)
+        if row is None:
+            row = await db_executor.run_read(order_archive.get, order_id)
+    except Exception as e:
+        logger.warning(f"⚠️ 查询历史订单失败: {e}")
+        return None
+    return order_from_dict(row) if row is not None else None
+
+
+# ==================== 事件处理 ====================
+
+def on_order_transitions(transitions):
+    """
+    状态机的流转事件：登记持久化，并作为一个事件发布（批量操作只产生一个事件和一条WebSocket推送）
+    批量接口的多笔流转会在后台写入器的同一个批次中提交
+    """
+    for transition in transitions:
+        order_writer.submit(transition.order)
+    event_bus.publish("order_status_batch", {"updates": [{
+        "order_id": transition.order.id,
+        "from_status": transition.from_status,
+        "status": transition.to_status,
+        "updated_at": transition.at.isoformat()
+    } for transition in transitions]})
+
+
+order_machine.subscribe(on_order_transitions)
+
+def publish_dish_changed(dish=None, deleted_id: Optional[int] = None):
+    """发布菜品变更事件（新增/修改时传 dish，删除时传 deleted_id）"""
+    if dish is not None:
+        event_bus.publish("dish_updated", {"dish": json.loads(encode(dish))})
     else:
-        return data
+        event_bus.publish("dish_deleted", {"dish_id": deleted_id})
+
+def publish_dishes_changed(dishes):
+    """一次发布多个菜品的变更（批量上下架）"""
+    event_bus.publish("dishes_updated", {"dishes": [json.loads(encode(dish)) for dish in dishes]})
+
+def handle_event(event_type: str, data: dict, local: bool):
+    """
+    处理事件总线上的事件
+    其他 worker 发布的事件先同步到本进程内存，再转发给本进程的商家端连接
+    """
+    global dishes_db
+    if event_type == "order_created":
+        order_data = data["order"]
+        if not local:
+            orders_db.add(order_from_dict(order_data))
+            idempotency = data.get("idempotency")
+            if idempotency:
+                idempotency_cache.put(idempotency["key"], idempotency["fingerprint"], 200,
+                                      encode(order_data).encode("utf-8"),
+                                      expires_at=idempotency["expires_at"], persist=False)
+        manager.broadcast(json.dumps({
+            "type": "new_order",
+            "order": {
+                "id": order_data["id"],
+                "user_name": order_data["user_name"],
+                "total_amount": order_data["total_amount"],
+                "items_count": len(order_data["items"])
+            }
+        }, ensure_ascii=False))
+    elif event_type == "order_status_batch":
+        if not local:
+            for update in data["updates"]:
+                _apply_remote_status(update)
+        manager.broadcast(json.dumps({
+            "type": "orders_updated",
+            "orders": [{"id": u["order_id"], "status": u["status"]} for u in data["updates"]]
+        }, ensure_ascii=False))
+    elif local:
+        return
+    elif event_type == "order_status":
+        # 旧版本 worker 发布的单笔状态变更
+        _apply_remote_status(data)
+    elif event_type == "dish_updated":
+        dish = Dish(**data["dish"])
+        dishes_db = [d for d in dishes_db if d.id != dish.id] + [dish]
+        refresh_menu_snapshot()
+    elif event_type == "dishes_updated":
+        changed = {dish["id"]: Dish(**dish) for dish in data["dishes"]}
+        dishes_db = [changed.pop(d.id, d) for d in dishes_db] + list(changed.values())
+        refresh_menu_snapshot()
+    elif event_type == "dish_deleted":
+        dishes_db = [d for d in dishes_db if d.id != data["dish_id"]]
+        refresh_menu_snapshot()
+
+
+def _apply_remote_status(update: dict):
+    """同步其他 worker 的订单状态变更（发起的 worker 已经检查过流转并记录了日志，这里只同步内存）"""
+    order = orders_db.get(update["order_id"])
+    if order is not None:
+        status = update["status"]
+        if status in OrderStatus._value2member_map_:
+            status = OrderStatus(status)
+        orders_db.update_status(order, status, parse_datetime(update["updated_at"]))
+
+
+event_bus.subscribe(handle_event)
 
 
 # ==================== 静态文件服务 ====================
@@ -204,21 +526,61 @@ def _convert_datetime_in_dict(data):
 # 获取当前文件所在目录
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# 启动时读入内存的静态文件（页面和 tabBar 图标）
+STATIC_FILES = ("demo.html", "merchant.html", "dish.png", "dish-active.png",
+                "cart.png", "cart-active.png", "order.png", "order-active.png")
+
+
+def register_static_assets():
+    """读入并预压缩静态文件（启动时在线程池中执行；页面修改后重启服务生效）"""
+    for name in STATIC_FILES:
+        if static_assets.register_file(os.path.join(BASE_DIR, name)) is None:
+            logger.warning(f"静态文件不存在: {name}")
+
+
+def serve_page(request: Request, name: str) -> Response:
+    """入口页面使用固定URL，每次协商缓存（ETag没变时返回304）"""
+    asset = static_assets.get_by_name(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return static_cache.respond(request, asset, REVALIDATE_CACHE_CONTROL)
+
+
 @app.get("/demo.html")
-async def serve_demo():
+async def serve_demo(request: Request):
     """提供用户端演示页面"""
-    file_path = os.path.join(BASE_DIR, "demo.html")
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    raise HTTPException(status_code=404, detail="File not found")
+    return serve_page(request, "demo.html")
 
 @app.get("/merchant.html")
-async def serve_merchant():
+async def serve_merchant(request: Request):
     """提供商家端管理页面"""
-    file_path = os.path.join(BASE_DIR, "merchant.html")
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    raise HTTPException(status_code=404, detail="File not found")
+    return serve_page(request, "merchant.html")
+
+@app.get("/api/static/manifest")
+async def get_static_manifest():
+    """静态文件名到带内容哈希URL的映射（如 cart.png -> /static/cart.1a2b3c4d.png）"""
+    return {name: f"/static/{versioned}" for name, versioned in static_assets.manifest.items()}
+
+@app.get("/static/images/{name}")
+async def serve_image(name: str, request: Request):
+    """菜品图片和缩略图（文件名即内容哈希，可长期缓存）"""
+    asset = static_assets.get_cached(name)
+    if asset is None:
+        path = image_pipeline.path_for(name)
+        if path is not None:
+            asset = await asyncio.get_running_loop().run_in_executor(None, static_assets.load_file, path)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        static_assets.put(name, asset)
+    return static_cache.respond(request, asset)
+
+@app.get("/static/{name}")
+async def serve_static(name: str, request: Request):
+    """带内容哈希的静态文件（内容变化时URL随之变化，可长期缓存）"""
+    asset = static_assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return static_cache.respond(request, asset)
 
 @app.get("/")
 async def root():
@@ -229,58 +591,113 @@ async def root():
 # ==================== 用户端 API ====================
 
 @app.get("/api/user/dishes")
-async def get_dishes():
-    """获取所有可用菜品"""
-    available_dishes = [dish for dish in dishes_db if dish.is_available]
-    return [dataclass_to_dict(dish) for dish in available_dishes]
+async def get_dishes(request: Request):
+    """获取所有可用菜品（返回预序列化快照，支持ETag协商缓存）"""
+    return menu_snapshot.respond(request, menu_snapshot.dishes)
+
+
+# 注意：必须注册在 /api/user/dishes/{dish_id} 之前，否则 search 会被当作菜品ID
+@app.get("/api/user/dishes/search")
+async def search_dishes(
+    q: str = "",
+    category: Optional[str] = None,
+    limit: int = Query(SEARCH_PAGE_DEFAULT_LIMIT, ge=1, le=SEARCH_PAGE_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    """
+    搜索菜品：按菜名、描述和食材匹配，支持中文片段和拼音首字母（如 gbjd）
+    q 为空时按分类浏览全部菜品；facets 为全部命中菜品的分类计数（不受 category 过滤影响）
+    """
+    result = search_index.search(q, category, limit, offset)
+    # 菜品直接复用菜单快照中已编码好的JSON
+    items = ",".join(menu_snapshot.encoded_dish(dish.id) or encode_dish_summary(dish) for dish in result.items)
+    body = (f'{{"total":{result.total},"limit":{limit},"offset":{offset},'
+            f'"items":[{items}],"facets":{encode(result.facets)}}}')
+    return Response(content=body.encode("utf-8"), media_type="application/json")
 
 
 @app.get("/api/user/dishes/{dish_id}")
-async def get_dish(dish_id: int):
-    """获取单个菜品详情"""
-    dish = next((d for d in dishes_db if d.id == dish_id and d.is_available), None)
-    if not dish:
+async def get_dish(dish_id: int, request: Request):
+    """获取单个菜品详情（制作说明以结构化菜谱 recipe 返回）"""
+    cached = menu_snapshot.get_dish(dish_id)
+    if not cached:
         raise HTTPException(status_code=404, detail="菜品不存在")
-    return dataclass_to_dict(dish)
+    return menu_snapshot.respond(request, cached)
 
 
 @app.get("/api/user/categories")
-async def get_categories():
+async def get_categories(request: Request):
     """获取所有菜品分类"""
-    categories = list(set(dish.category for dish in dishes_db))
-    return {"categories": categories}
+    return menu_snapshot.respond(request, menu_snapshot.categories)
+
+
+def replay_response(record) -> Response:
+    """原样返回幂等键第一次请求的响应"""
+    return Response(content=record.body, status_code=record.status_code, media_type="application/json",
+                    headers={"Idempotent-Replayed": "true"})
 
 
 @app.post("/api/user/orders")
-async def create_order(request_data: dict):
-    """创建订单"""
-    global order_id_counter
+async def create_order(request_data: dict, request: Request):
+    """
+    创建订单
+    客户端可以通过 Idempotency-Key 请求头或 idempotency_key 字段带上幂等键，
+    同一个键的重试直接返回第一次创建的订单，不会重复下单和通知商家
+    （幂等键按用户隔离；函数中没有 await，查缓存到登记响应之间不会穿插同一个键的其他请求）
+    """
     from utils import generate_order_number
     
+    try:
+        idempotency_key = normalize_key(request.headers.get("Idempotency-Key") or request_data.get(KEY_FIELD))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # 验证必需字段
     required_fields = ['user_id', 'user_name', 'items']
     for field in required_fields:
         if field not in request_data:
             raise HTTPException(status_code=400, detail=f"缺少必需字段: {field}")
     
+    if idempotency_key:
+        idempotency_key = scoped_key(request_data['user_id'], idempotency_key)
+        fingerprint = request_fingerprint(request_data)
+        record = idempotency_cache.get(idempotency_key)
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="幂等键已用于内容不同的下单请求")
+            logger.info(f"🔁 重复的下单请求，返回原订单（幂等键 {idempotency_key}）")
+            return replay_response(record)
+    
     # 验证items是列表且不为空
     if not isinstance(request_data['items'], list) or not request_data['items']:
         raise HTTPException(status_code=400, detail="items必须是非空列表")
     
-    # 创建 OrderItem 对象
+    # 按服务端价格表计价（客户端传来的菜名和价格一律忽略），金额用整数分累加
+    prices = menu_snapshot.prices  # 只取一次引用，整单使用同一版本的价格表
     items = []
+    total_cents = 0
     for item_data in request_data['items']:
-        if not all(key in item_data for key in ['dish_id', 'dish_name', 'quantity', 'price']):
+        if not isinstance(item_data, dict) or not all(key in item_data for key in ['dish_id', 'quantity']):
             raise HTTPException(status_code=400, detail="订单项数据不完整")
+        quantity = item_data['quantity']
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            raise HTTPException(status_code=400, detail="菜品数量必须是正整数")
+        dish_id = item_data['dish_id']
+        # bool 是 int 的子类，True 会被当成菜品1，需要单独排除
+        entry = prices.get(dish_id) if isinstance(dish_id, int) and not isinstance(dish_id, bool) else None
+        if entry is None:
+            raise HTTPException(status_code=400, detail=f"菜品不存在: {dish_id}")
+        if not entry.is_available:
+            raise HTTPException(status_code=400, detail=f"菜品已下架: {entry.name}")
+        total_cents += entry.price_cents * quantity
         items.append(OrderItem(
-            dish_id=item_data['dish_id'],
-            dish_name=item_data['dish_name'],
-            quantity=item_data['quantity'],
-            price=item_data['price']
+            dish_id=dish_id,
+            dish_name=entry.name,
+            quantity=quantity,
+            price=from_cents(entry.price_cents)
         ))
     
-    # 计算总价
-    total_amount = sum(item.price * item.quantity for item in items)
+    total_amount = from_cents(total_cents)
     
     # 生成订单号
     order_id = generate_order_number()
@@ -298,23 +715,22 @@ async def create_order(request_data: dict):
         note=request_data.get('note')
     )
     
-    orders_db.append(order)
-    order_id_counter += 1
+    orders_db.add(order)
+    order_writer.submit(order)
+    response = json_response(order)
+    event = {"order": json.loads(response.body)}
+    if idempotency_key:
+        record = idempotency_cache.put(idempotency_key, fingerprint, response.status_code, response.body)
+        # 其他 worker 同步这个键，重试落到其他 worker 上同样能去重
+        event["idempotency"] = {"key": idempotency_key, "fingerprint": fingerprint,
+                                "expires_at": record.expires_at}
     
-    # 通知商家端（WebSocket）
-    await manager.broadcast(json.dumps({
-        "type": "new_order",
-        "order": {
-            "id": order.id,
-            "user_name": order.user_name,
-            "total_amount": order.total_amount,
-            "items_count": len(order.items)
-        }
-    }, ensure_ascii=False))
+    # 通知商家端（通过事件总线转发到所有 worker 的WebSocket连接）
+    event_bus.publish("order_created", event)
     
-    print(f"📦 新订单创建: {order.id}, 通知了 {len(manager.active_connections)} 个WebSocket连接")
+    logger.info(f"📦 新订单创建: {order.id}, 通知了 {len(manager.active_connections)} 个WebSocket连接")
     
-    return dataclass_to_dict(order)
+    return response
 
 
 @app.post("/api/user/payment")
@@ -326,7 +742,7 @@ async def process_payment(request_data: dict):
         if field not in request_data:
             raise HTTPException(status_code=400, detail=f"缺少必需字段: {field}")
     
-    order = next((o for o in orders_db if o.id == request_data['order_id']), None)
+    order = orders_db.get(request_data['order_id'])
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
     
@@ -335,49 +751,76 @@ async def process_payment(request_data: dict):
     return {
         "success": True,
         "message": "支付成功",
-        "order_id": request.order_id,
-        "transaction_id": f"TXN{request.order_id}{int(datetime.now().timestamp())}"
+        "order_id": order.id,
+        "transaction_id": f"TXN{order.id}{int(datetime.now().timestamp())}"
     }
 
 
 @app.get("/api/user/orders/{user_id}")
-async def get_user_orders(user_id: str):
-    """获取用户的订单历史"""
-    user_orders = [o for o in orders_db if o.user_id == user_id]
-    return user_orders
+async def get_user_orders(
+    user_id: str,
+    limit: int = Query(ORDER_PAGE_DEFAULT_LIMIT, ge=1, le=ORDER_PAGE_MAX_LIMIT),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
+):
+    """获取用户的订单历史（游标分页，最新的在前）"""
+    return await orders_page_response(limit, user_id=user_id, before=before, after=after,
+                                      from_time=from_time, to_time=to_time)
 
 
 # ==================== 商家端 API ====================
 
 @app.get("/api/merchant/orders")
-async def get_all_orders(status: Optional[str] = None):
-    """获取所有订单（可按状态筛选）"""
-    if status:
-        filtered_orders = [o for o in orders_db if o.status == status]
-        return [dataclass_to_dict(order) for order in filtered_orders]
-    return [dataclass_to_dict(order) for order in orders_db]
+async def get_all_orders(
+    status: Optional[str] = None,
+    limit: int = Query(ORDER_PAGE_DEFAULT_LIMIT, ge=1, le=ORDER_PAGE_MAX_LIMIT),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to"),
+):
+    """获取所有订单（可按状态筛选，游标分页，最新的在前）"""
+    return await orders_page_response(limit, status=status or None, before=before, after=after,
+                                      from_time=from_time, to_time=to_time)
+
+
+@app.get("/api/merchant/orders/changes")
+async def get_order_changes(since: int = 0, epoch: Optional[str] = None):
+    """
+    增量同步：返回修订号 since 之后新建或变更过的订单和新的游标
+    epoch 与服务端不一致（服务重启）时返回全部订单并标记 reset
+    """
+    reset = (epoch is not None and epoch != orders_db.epoch) or since > orders_db.revision
+    if reset:
+        changed, cursor = orders_db.all(), orders_db.revision
+    else:
+        changed, cursor = orders_db.changes_since(since)
+    return json_response({
+        "orders": changed,
+        "cursor": cursor,
+        "epoch": orders_db.epoch,
+        "reset": reset
+    })
 
 
 @app.get("/api/merchant/orders/{order_id}")
 async def get_order_detail(order_id: str):
-    """获取订单详情（包含菜品制作说明）"""
-    order = next((o for o in orders_db if o.id == order_id), None)
+    """获取订单详情（包含菜品制作说明），已移出内存的历史订单从数据库或归档文件读取"""
+    order = await find_order(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
     
     # 为每个订单项添加制作说明
-    order_dict = asdict(order)
-    enhanced_items = []
-    for item in order.items:
-        dish = next((d for d in dishes_db if d.id == item.dish_id), None)
-        item_dict = asdict(item)
+    order_dict = order.to_dict()
+    for item_dict in order_dict["items"]:
+        dish = dishes_by_id.get(item_dict["dish_id"])
         if dish:
             item_dict["cooking_instructions"] = dish.cooking_instructions
             item_dict["description"] = dish.description
-        enhanced_items.append(item_dict)
     
-    order_dict["items"] = enhanced_items
-    return order_dict
+    return json_response(order_dict)
 
 
 @dataclass
@@ -385,6 +828,20 @@ class UpdateOrderStatusRequest:
     """更新订单状态请求"""
     status: str
 
+@app.get("/api/merchant/orders/{order_id}/transitions")
+async def get_order_transitions(order_id: str):
+    """订单的状态流转记录（按时间顺序，含尚未写入数据库的记录）"""
+    # 先取未写入的记录再读库：读库期间完成提交的记录两边都有，按内容去重
+    pending = order_transition_log.pending_for(order_id)
+    entries = await db_executor.run_read(load_transitions, order_id)
+    stored = set(entries)
+    entries += [entry for entry in pending if entry not in stored]
+    return json_response({"order_id": order_id, "transitions": [
+        {"from_status": from_status, "to_status": to_status, "at": at}
+        for _, from_status, to_status, at in entries
+    ]})
+
+
 @app.put("/api/merchant/orders/{order_id}")
 async def update_order_status(order_id: str, request_data: dict):
     """更新订单状态"""
@@ -392,88 +849,263 @@ async def update_order_status(order_id: str, request_data: dict):
     if 'status' not in request_data:
         raise HTTPException(status_code=400, detail="缺少必需字段: status")
     
-    order = next((o for o in orders_db if o.id == order_id), None)
+    status = request_data['status']
+    if status not in OrderStatus._value2member_map_:
+        raise HTTPException(status_code=400, detail=f"未知的订单状态: {status}")
+    
+    order = orders_db.get(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
     
-    order.status = request_data['status']
-    order.updated_at = datetime.now()
+    if order_machine.is_repeat(order, OrderStatus(status)):
+        return json_response({"success": True, "message": "状态更新成功", "order": order})
+    try:
+        order_machine.transition(order, OrderStatus(status))
+    except InvalidTransition as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    print(f"✅ 订单 {order_id} 状态更新为: {request_data['status']}")
+    logger.info(f"✅ 订单 {order_id} 状态更新为: {request_data['status']}")
     
-    return {"success": True, "message": "状态更新成功", "order": dataclass_to_dict(order)}
+    return json_response({"success": True, "message": "状态更新成功", "order": order})
 
 
-@app.post("/api/merchant/orders/{order_id}/accept")
-async def accept_order(order_id: str):
-    """商家接单"""
-    order = next((o for o in orders_db if o.id == order_id), None)
+async def _order_action_response(order_id: str, action_name: str):
+    """单笔订单状态操作"""
+    order = orders_db.get(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
     
-    if order.status != OrderStatus.PENDING:
-        raise HTTPException(status_code=400, detail="订单状态不正确，无法接单")
+    action = ORDER_ACTIONS[action_name]
+    # 重复取消：直接返回当前订单，不修改时间、不记录流转、不再推送
+    if order_machine.is_repeat(order, action.target):
+        return json_response({"success": True, "message": action.message, "order": order})
+    try:
+        order_machine.transition(order, action.target)
+    except InvalidTransition:
+        raise HTTPException(status_code=400, detail=action.error)
+    
+    logger.info(f"{action.log}: {order_id}")
+    
+    return json_response({"success": True, "message": action.message, "order": order})
+
+
+@app.post("/api/merchant/orders/batch")
+async def batch_order_actions(request_data: dict):
+    """
+    批量处理订单（接单/开始制作/完成/取消）
+    请求体: {"items": [{"order_id": "...", "action": "accept"}, ...]}
+    每一项单独检查状态并返回各自结果，失败项不影响其他项；
+    成功的变更合并为一个事件、一条WebSocket推送和一次数据库事务
+    """
+    items = request_data.get("items")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="items必须是非空列表")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多处理 {BATCH_MAX_ITEMS} 项")
     
-    order.status = OrderStatus.ACCEPTED
-    order.updated_at = datetime.now()
+    results = []
+    transitions = []
+    for item in items:
+        order_id = item.get("order_id") if isinstance(item, dict) else None
+        action_name = item.get("action") if isinstance(item, dict) else None
+        result = {"order_id": order_id, "action": action_name, "success": False}
+        results.append(result)
+        action = ORDER_ACTIONS.get(action_name)
+        order = orders_db.get(order_id) if isinstance(order_id, str) else None
+        if action is None:
+            result["message"] = f"未知的操作: {action_name}"
+        elif order is None:
+            result["message"] = "订单不存在"
+        elif order_machine.is_repeat(order, action.target):
+            result.update(success=True, message=action.message, status=action.target.value)
+        elif not order_machine.can_transition(order, action.target):
+            result["message"] = action.error
+            result["status"] = getattr(order.status, "value", order.status)
+        else:
+            transitions.append(order_machine.transition(order, action.target, emit=False))
+            result.update(success=True, message=action.message, status=action.target.value)
     
-    print(f"✅ 商家已接单: {order_id}")
+    order_machine.emit(transitions)
+    succeeded = sum(1 for result in results if result["success"])
+    logger.info(f"📋 批量处理订单: 成功 {succeeded} 项，失败 {len(results) - succeeded} 项")
     
-    return {"success": True, "message": "接单成功", "order": dataclass_to_dict(order)}
+    return json_response({
+        "success": succeeded == len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    })
+
+
+@app.post("/api/merchant/orders/{order_id}/accept")
+async def accept_order(order_id: str):
+    """商家接单"""
+    return await _order_action_response(order_id, "accept")
 
 
 @app.post("/api/merchant/orders/{order_id}/start")
 async def start_preparing(order_id: str):
     """开始制作订单"""
-    order = next((o for o in orders_db if o.id == order_id), None)
-    if not order:
-        raise HTTPException(status_code=404, detail="订单不存在")
-    
-    if order.status != OrderStatus.ACCEPTED:
-        raise HTTPException(status_code=400, detail="订单状态不正确，请先接单")
-    
-    order.status = OrderStatus.PREPARING
-    order.updated_at = datetime.now()
-    
-    print(f"🍳 开始制作订单: {order_id}")
-    
-    return {"success": True, "message": "开始制作", "order": dataclass_to_dict(order)}
+    return await _order_action_response(order_id, "start")
 
 
 @app.post("/api/merchant/orders/{order_id}/complete")
 async def complete_order(order_id: str):
     """完成订单"""
-    order = next((o for o in orders_db if o.id == order_id), None)
-    if not order:
-        raise HTTPException(status_code=404, detail="订单不存在")
-    
-    if order.status != OrderStatus.PREPARING:
-        raise HTTPException(status_code=400, detail="订单状态不正确，请先开始制作")
-    
-    order.status = OrderStatus.COMPLETED
-    order.updated_at = datetime.now()
-    
-    print(f"✅ 订单已完成: {order_id}")
-    
-    return {"success": True, "message": "订单已完成", "order": dataclass_to_dict(order)}
+    return await _order_action_response(order_id, "complete")
 
 
 @app.post("/api/merchant/orders/{order_id}/cancel")
 async def cancel_order(order_id: str):
     """取消订单"""
-    order = next((o for o in orders_db if o.id == order_id), None)
-    if not order:
-        raise HTTPException(status_code=404, detail="订单不存在")
-    
-    if order.status == OrderStatus.COMPLETED:
-        raise HTTPException(status_code=400, detail="订单已完成，无法取消")
-    
-    order.status = OrderStatus.CANCELLED
-    order.updated_at = datetime.now()
-    
-    print(f"❌ 订单已取消: {order_id}")
-    
-    return {"success": True, "message": "订单已取消", "order": dataclass_to_dict(order)}
+    return await _order_action_response(order_id, "cancel")
+
+
+def dish_from_model(db_dish) -> Dish:
+    """由数据库记录创建内存菜品对象"""
+    return Dish(
+        id=db_dish.id,
+        name=db_dish.name,
+        category=db_dish.category,
+        price=db_dish.price,
+        description=db_dish.description,
+        cooking_instructions=db_dish.cooking_instructions,
+        is_available=db_dish.is_available,
+        image_url=db_dish.image_url,
+        thumbnails=json.loads(db_dish.image_thumbnails) if db_dish.image_thumbnails else None,
+        recipe=recipe_from_columns(db_dish.recipe_ingredients, db_dish.recipe_steps, db_dish.recipe_tips)
+    )
+
+
+# 以下数据库操作均在 db_executor 的线程中执行，不占用事件循环
+
+def _db_load_dishes(db) -> List[Dish]:
+    from database import DishModel
+    return [dish_from_model(db_dish) for db_dish in db.query(DishModel).all()]
+
+
+def _db_insert_dish(db, dish_data: dict) -> Dish:
+    from database import DishModel
+    db_dish = DishModel(
+        name=dish_data['name'],
+        category=dish_data['category'],
+        price=dish_data['price'],
+        description=dish_data['description'],
+        cooking_instructions=dish_data.get('cooking_instructions'),
+        is_available=dish_data.get('is_available', True),
+        image_url=dish_data.get('image_url'),
+        **recipe_columns(parse_recipe(dish_data.get('cooking_instructions')))
+    )
+    db.add(db_dish)
+    db.flush()
+    db.refresh(db_dish)
+    return dish_from_model(db_dish)
+
+
+def _db_update_dish(db, dish_id: int, dish_data: dict) -> Optional[Dish]:
+    from database import DishModel
+    db_dish = db.query(DishModel).filter(DishModel.id == dish_id).first()
+    if not db_dish:
+        return None
+    db_dish.name = dish_data['name']
+    db_dish.category = dish_data['category']
+    db_dish.price = dish_data['price']
+    db_dish.description = dish_data['description']
+    db_dish.cooking_instructions = dish_data.get('cooking_instructions')
+    db_dish.is_available = dish_data.get('is_available', True)
+    if db_dish.image_url != dish_data.get('image_url'):
+        # 换了图片，旧的缩略图作废，等后台重新生成
+        db_dish.image_thumbnails = None
+    db_dish.image_url = dish_data.get('image_url')
+    for column, value in recipe_columns(parse_recipe(db_dish.cooking_instructions)).items():
+        setattr(db_dish, column, value)
+    db.flush()
+    db.refresh(db_dish)
+    return dish_from_model(db_dish)
+
+
+def _db_set_dish_image(db, dish_id: int, source_url: str, image_url: str,
+                       thumbnails: dict) -> Optional[Dish]:
+    """保存本地化后的图片；期间菜品已删除或图片又被修改时放弃，返回None"""
+    from database import DishModel
+    db_dish = db.query(DishModel).filter(DishModel.id == dish_id).first()
+    if not db_dish or db_dish.image_url != source_url:
+        return None
+    db_dish.image_url = image_url
+    db_dish.image_thumbnails = json.dumps(thumbnails, ensure_ascii=False) if thumbnails else None
+    db.flush()
+    return dish_from_model(db_dish)
+
+
+def _db_backfill_recipes(db) -> int:
+    """为旧数据中还没有结构化菜谱的菜品补充解析（无法解析的菜品保持为空）"""
+    from database import DishModel
+    rows = db.query(DishModel).filter(DishModel.cooking_instructions.isnot(None),
+                                      DishModel.recipe_ingredients.is_(None),
+                                      DishModel.recipe_steps.is_(None),
+                                      DishModel.recipe_tips.is_(None)).all()
+    count = 0
+    for db_dish in rows:
+        recipe = parse_recipe(db_dish.cooking_instructions)
+        if recipe is None:
+            continue
+        for column, value in recipe_columns(recipe).items():
+            setattr(db_dish, column, value)
+        count += 1
+    if count:
+        logger.info(f"已为 {count} 个菜品补充结构化菜谱")
+    return count
+
+
+def _db_load_dishes_by_id(db, dish_ids: List[int]) -> List[Dish]:
+    from database import DishModel
+    return [dish_from_model(db_dish) for db_dish in db.query(DishModel).filter(DishModel.id.in_(dish_ids))]
+
+
+def _db_set_availability(db, updates: dict) -> List[Dish]:
+    """批量修改菜品可售状态（一个事务），返回实际存在并已修改的菜品"""
+    from database import DishModel
+    rows = db.query(DishModel).filter(DishModel.id.in_(list(updates))).all()
+    for db_dish in rows:
+        db_dish.is_available = updates[db_dish.id]
+    db.flush()
+    return [dish_from_model(db_dish) for db_dish in rows]
+
+
+def _db_delete_dish(db, dish_id: int) -> bool:
+    from database import DishModel
+    db_dish = db.query(DishModel).filter(DishModel.id == dish_id).first()
+    if not db_dish:
+        return False
+    db.delete(db_dish)
+    return True
+
+
+def schedule_image_ingest(dish: Dish):
+    """菜品图片还不是本地图片时，在后台下载并生成缩略图（不阻塞本次请求）"""
+    if not dish.image_url or image_pipeline.is_local(dish.image_url):
+        return
+    task = asyncio.create_task(ingest_dish_image(dish.id, dish.image_url))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def ingest_dish_image(dish_id: int, source_url: str):
+    """图片本地化完成后把菜品的 image_url 换成本地原图，并附上缩略图"""
+    global dishes_db
+    try:
+        image = await image_pipeline.ingest(source_url)
+        updated_dish = await db_executor.write(_db_set_dish_image, dish_id, source_url,
+                                               image.url, image.thumbnails)
+    except Exception as e:
+        logger.warning(f"⚠️ 菜品图片处理失败 (ID: {dish_id}): {e}")
+        return
+    if updated_dish is None:
+        return
+    dishes_db = [updated_dish if d.id == dish_id else d for d in dishes_db]
+    refresh_menu_snapshot()
+    publish_dish_changed(updated_dish)
+    logger.info(f"🖼️ 菜品图片已本地化 (ID: {dish_id})，缩略图 {len(image.thumbnails)} 个")
 
 
 @app.post("/api/merchant/dishes")
@@ -485,44 +1117,20 @@ async def add_dish(dish_data: dict):
         if field not in dish_data:
             raise HTTPException(status_code=400, detail=f"缺少必需字段: {field}")
     
-    from database import SessionLocal, DishModel
-    db = SessionLocal()
     try:
-        # 创建数据库记录
-        db_dish = DishModel(
-            name=dish_data['name'],
-            category=dish_data['category'],
-            price=dish_data['price'],
-            description=dish_data['description'],
-            cooking_instructions=dish_data.get('cooking_instructions'),
-            is_available=dish_data.get('is_available', True),
-            image_url=dish_data.get('image_url')
-        )
-        db.add(db_dish)
-        db.commit()
-        db.refresh(db_dish)
-        
-        # 更新内存中的数据
-        new_dish = Dish(
-            id=db_dish.id,
-            name=db_dish.name,
-            category=db_dish.category,
-            price=db_dish.price,
-            description=db_dish.description,
-            cooking_instructions=db_dish.cooking_instructions,
-            is_available=db_dish.is_available,
-            image_url=db_dish.image_url
-        )
-        dishes_db.append(new_dish)
-        
-        print(f"✅ 新菜品已添加: {new_dish.name} (ID: {new_dish.id})")
-        return dataclass_to_dict(new_dish)
+        new_dish = await db_executor.write(_db_insert_dish, dish_data)
     except Exception as e:
-        db.rollback()
-        print(f"❌ 添加菜品失败: {e}")
+        logger.error(f"❌ 添加菜品失败: {e}")
         raise HTTPException(status_code=500, detail=f"添加失败: {str(e)}")
-    finally:
-        db.close()
+    
+    # 更新内存中的数据
+    dishes_db.append(new_dish)
+    refresh_menu_snapshot()
+    publish_dish_changed(new_dish)
+    schedule_image_ingest(new_dish)
+    
+    logger.info(f"✅ 新菜品已添加: {new_dish.name} (ID: {new_dish.id})")
+    return json_response(new_dish)
 
 
 @app.put("/api/merchant/dishes/{dish_id}")
@@ -533,84 +1141,230 @@ async def update_dish(dish_id: int, dish_data: dict):
     for field in required_fields:
         if field not in dish_data:
             raise HTTPException(status_code=400, detail=f"缺少必需字段: {field}")
-    from database import SessionLocal, DishModel
-    db = SessionLocal()
+    
     try:
-        # 查找数据库记录
-        db_dish = db.query(DishModel).filter(DishModel.id == dish_id).first()
-        if not db_dish:
-            raise HTTPException(status_code=404, detail="菜品不存在")
-        
-        # 更新数据库
-        db_dish.name = dish_data['name']
-        db_dish.category = dish_data['category']
-        db_dish.price = dish_data['price']
-        db_dish.description = dish_data['description']
-        db_dish.cooking_instructions = dish_data.get('cooking_instructions')
-        db_dish.is_available = dish_data.get('is_available', True)
-        db_dish.image_url = dish_data.get('image_url')
-        
-        db.commit()
-        db.refresh(db_dish)
-        
-        # 创建更新后的菜品对象
-        updated_dish = Dish(
-            id=db_dish.id,
-            name=db_dish.name,
-            category=db_dish.category,
-            price=db_dish.price,
-            description=db_dish.description,
-            cooking_instructions=db_dish.cooking_instructions,
-            is_available=db_dish.is_available,
-            image_url=db_dish.image_url
-        )
-        
-        # 更新内存中的数据
-        index = next((i for i, d in enumerate(dishes_db) if d.id == dish_id), None)
-        if index is not None:
-            dishes_db[index] = updated_dish
-        
-        print(f"✅ 菜品已更新: {updated_dish.name} (ID: {dish_id})")
-        return dataclass_to_dict(updated_dish)
-    except HTTPException:
-        raise
+        updated_dish = await db_executor.write(_db_update_dish, dish_id, dish_data)
     except Exception as e:
-        db.rollback()
-        print(f"❌ 更新菜品失败: {e}")
+        logger.error(f"❌ 更新菜品失败: {e}")
         raise HTTPException(status_code=500, detail=f"更新失败: {str(e)}")
-    finally:
-        db.close()
+    if not updated_dish:
+        raise HTTPException(status_code=404, detail="菜品不存在")
+    
+    # 更新内存中的数据
+    index = next((i for i, d in enumerate(dishes_db) if d.id == dish_id), None)
+    if index is not None:
+        dishes_db[index] = updated_dish
+    refresh_menu_snapshot()
+    publish_dish_changed(updated_dish)
+    schedule_image_ingest(updated_dish)
+    
+    logger.info(f"✅ 菜品已更新: {updated_dish.name} (ID: {dish_id})")
+    return json_response(updated_dish)
 
 
 @app.delete("/api/merchant/dishes/{dish_id}")
 async def delete_dish(dish_id: int):
     """删除菜品"""
-    from database import SessionLocal, DishModel
-    db = SessionLocal()
     try:
-        # 查找数据库记录
-        db_dish = db.query(DishModel).filter(DishModel.id == dish_id).first()
-        if not db_dish:
-            raise HTTPException(status_code=404, detail="菜品不存在")
-        
-        # 从数据库删除
-        db.delete(db_dish)
-        db.commit()
-        
-        # 从内存删除
-        global dishes_db
-        dishes_db = [d for d in dishes_db if d.id != dish_id]
-        
-        print(f"✅ 菜品已删除: ID {dish_id}")
-        return {"success": True, "message": "删除成功"}
-    except HTTPException:
-        raise
+        deleted = await db_executor.write(_db_delete_dish, dish_id)
     except Exception as e:
-        db.rollback()
-        print(f"❌ 删除菜品失败: {e}")
+        logger.error(f"❌ 删除菜品失败: {e}")
         raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
-    finally:
-        db.close()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="菜品不存在")
+    
+    # 从内存删除
+    global dishes_db
+    dishes_db = [d for d in dishes_db if d.id != dish_id]
+    refresh_menu_snapshot()
+    publish_dish_changed(deleted_id=dish_id)
+    
+    logger.info(f"✅ 菜品已删除: ID {dish_id}")
+    return {"success": True, "message": "删除成功"}
+
+
+@app.post("/api/merchant/dishes/availability")
+async def batch_dish_availability(request_data: dict):
+    """
+    批量上架/下架菜品
+    请求体: {"items": [{"dish_id": 1, "is_available": false}, ...]}
+    一次数据库事务，菜单快照只重建一次
+    """
+    items = request_data.get("items")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="items必须是非空列表")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多处理 {BATCH_MAX_ITEMS} 项")
+    
+    updates = {}
+    for item in items:
+        if (not isinstance(item, dict) or type(item.get("dish_id")) is not int
+                or not isinstance(item.get("is_available"), bool)):
+            raise HTTPException(status_code=400, detail="每一项必须包含整数 dish_id 和布尔值 is_available")
+        updates[item["dish_id"]] = item["is_available"]
+    
+    try:
+        updated = await db_executor.write(_db_set_availability, updates)
+    except Exception as e:
+        logger.error(f"❌ 批量修改菜品状态失败: {e}")
+        raise HTTPException(status_code=500, detail=f"更新失败: {str(e)}")
+    
+    # 更新内存中的数据
+    global dishes_db
+    changed = {dish.id: dish for dish in updated}
+    dishes_db = [changed.get(d.id, d) for d in dishes_db]
+    if updated:
+        refresh_menu_snapshot()
+        publish_dishes_changed(updated)
+    
+    results = [{
+        "dish_id": dish_id,
+        "success": dish_id in changed,
+        "is_available": is_available,
+        "message": "更新成功" if dish_id in changed else "菜品不存在"
+    } for dish_id, is_available in updates.items()]
+    logger.info(f"✅ 批量修改菜品状态: {len(updated)}/{len(updates)} 项")
+    return json_response({
+        "success": len(updated) == len(updates),
+        "succeeded": len(updated),
+        "failed": len(updates) - len(updated),
+        "results": results
+    })
+
+
+@app.post("/api/merchant/dishes/refresh")
+async def refresh_dishes(request_data: dict):
+    """
+    从数据库重新加载指定菜品（PDF菜谱导入等离线修改数据库后调用，无需重启服务）
+    请求体: {"dish_ids": [1, 2]}；不传 dish_ids 时重新加载全部菜品
+    数据库中已不存在的菜品会从内存中移除
+    """
+    global dishes_db
+    dish_ids = request_data.get("dish_ids")
+    if dish_ids is not None and (not isinstance(dish_ids, list)
+                                 or not all(isinstance(dish_id, int) for dish_id in dish_ids)):
+        raise HTTPException(status_code=400, detail="dish_ids必须是整数列表")
+    
+    try:
+        if dish_ids is None:
+            fresh = await db_executor.read(_db_load_dishes)
+        else:
+            fresh = await db_executor.read(_db_load_dishes_by_id, dish_ids)
+    except Exception as e:
+        logger.error(f"❌ 刷新菜品失败: {e}")
+        raise HTTPException(status_code=500, detail=f"刷新失败: {str(e)}")
+    
+    changed = {dish.id: dish for dish in fresh}
+    if dish_ids is None:
+        removed = [d.id for d in dishes_db if d.id not in changed]
+        dishes_db = fresh
+    else:
+        removed = [dish_id for dish_id in dish_ids if dish_id not in changed and dish_id in dishes_by_id]
+        dishes_db = [changed.pop(d.id, d) for d in dishes_db if d.id not in removed] + list(changed.values())
+    refresh_menu_snapshot()
+    if fresh:
+        publish_dishes_changed(fresh)
+    for dish_id in removed:
+        publish_dish_changed(deleted_id=dish_id)
+    
+    logger.info(f"🔄 已刷新 {len(fresh)} 个菜品，移除 {len(removed)} 个")
+    return {"success": True, "refreshed": len(fresh), "removed": removed}
+
+
+# ==================== 后厨看板 ====================
+
+@app.get("/api/merchant/kitchen")
+async def get_kitchen_board():
+    """
+    后厨看板：按菜品汇总待接单/已接单/制作中的份数
+    制作说明按菜品ID放在 dishes 中，每个菜品只出现一次
+    """
+    return json_response(kitchen_board.snapshot())
+
+
+# ==================== 销售统计 ====================
+
+def _analytics_range(start: Optional[date], end: Optional[date]) -> Tuple[date, date]:
+    """统计日期范围（含首尾两天），默认最近 ANALYTICS_DEFAULT_DAYS 天"""
+    end = end or date.today()
+    start = start or end - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start 不能晚于 end")
+    if (end - start).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"单次最多统计 {ANALYTICS_MAX_DAYS} 天")
+    return start, end
+
+
+def _check_group(group_by: str, allowed: Tuple[str, ...]):
+    if group_by not in allowed:
+        raise HTTPException(status_code=400, detail=f"group_by 只能是: {', '.join(allowed)}")
+
+
+def _dish_info() -> analytics.DishInfo:
+    return {dish.id: (dish.name, dish.category) for dish in dishes_db}
+
+
+@app.get("/api/merchant/analytics/revenue")
+async def get_revenue_report(start: Optional[date] = None, end: Optional[date] = None, group_by: str = "day"):
+    """
+    营业额统计（已取消的订单不计入）
+    group_by: day（按天）/ hour（按下单小时）/ category（按分类）/ dish（按菜品）
+    """
+    _check_group(group_by, analytics.REVENUE_GROUPS)
+    start, end = _analytics_range(start, end)
+    rollups = await sales_analytics.rollups(start, end)
+    return json_response({
+        "start": start.isoformat(), "end": end.isoformat(), "group_by": group_by,
+        "rows": analytics.revenue_report(rollups, group_by, _dish_info())
+    })
+
+
+@app.get("/api/merchant/analytics/items")
+async def get_items_report(start: Optional[date] = None, end: Optional[date] = None, group_by: str = "dish",
+                           limit: int = Query(ANALYTICS_TOP_LIMIT, ge=1, le=1000)):
+    """销量排行（按份数降序），group_by: dish / category"""
+    _check_group(group_by, analytics.ITEM_GROUPS)
+    start, end = _analytics_range(start, end)
+    rollups = await sales_analytics.rollups(start, end)
+    return json_response({
+        "start": start.isoformat(), "end": end.isoformat(), "group_by": group_by,
+        "rows": analytics.items_report(rollups, group_by, _dish_info(), limit)
+    })
+
+
+@app.get("/api/merchant/analytics/durations")
+async def get_durations_report(start: Optional[date] = None, end: Optional[date] = None, group_by: str = "all"):
+    """
+    各状态停留时长的百分位数（秒）：pending 等待接单、accepted 接单到开始制作、
+    preparing 制作、fulfillment 接单到出餐
+    group_by: all / day / hour / category / dish
+    """
+    _check_group(group_by, analytics.DURATION_GROUPS)
+    start, end = _analytics_range(start, end)
+    rollups = await sales_analytics.rollups(start, end)
+    return json_response({
+        "start": start.isoformat(), "end": end.isoformat(), "group_by": group_by,
+        "percentiles": list(analytics.DEFAULT_PERCENTILES),
+        "rows": analytics.durations_report(rollups, group_by, _dish_info())
+    })
+
+
+# ==================== 运行状态 ====================
+
+@app.get("/api/system/stats")
+async def get_runtime_stats():
+    """事件循环延迟和数据库操作耗时（用于确认数据库操作没有阻塞事件循环）"""
+    return {
+        "loop_lag_ms": loop_monitor.stats(),
+        "db": db_executor.stats(),
+        "pending_order_writes": order_writer.pending_count,
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 格式的运行指标（请求延迟、WebSocket、事件循环延迟、SQLite 提交耗时等）"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 
 # ==================== WebSocket ====================
@@ -619,18 +1373,44 @@ async def delete_dish(dish_id: int):
 async def websocket_endpoint(websocket: WebSocket):
     """商家端WebSocket连接（实时接收订单通知）"""
     await manager.connect(websocket)
-    print(f"🔌 商家端WebSocket已连接，当前连接数: {len(manager.active_connections)}")
+    logger.info(f"🔌 商家端WebSocket已连接，当前连接数: {len(manager.active_connections)}")
     try:
         while True:
             # 保持连接，等待客户端消息
             data = await websocket.receive_text()
             # 可以处理客户端发来的消息
-            print(f"📨 收到商家端消息: {data}")
+            logger.debug(f"📨 收到商家端消息: {data}")
     except WebSocketDisconnect:
+        pass
+    finally:
+        # 连接也可能已被发送任务剔除，disconnect 可重复调用
         manager.disconnect(websocket)
-        print(f"❌ 商家端WebSocket断开连接，剩余连接数: {len(manager.active_connections)}")
+        logger.info(f"❌ 商家端WebSocket断开连接，剩余连接数: {len(manager.active_connections)}")
+
+
+@app.websocket("/ws/kitchen")
+async def kitchen_websocket(websocket: WebSocket):
+    """
+    后厨看板WebSocket：连接后先收到完整看板（kitchen_snapshot），
+    之后只收到份数有变化的菜品（kitchen_update，按间隔合并推送）
+    """
+    await kitchen_manager.connect(websocket)
+    kitchen_manager.send(websocket, encode(kitchen_board.snapshot()))
+    logger.info(f"🔌 后厨看板WebSocket已连接，当前连接数: {len(kitchen_manager.active_connections)}")
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        kitchen_manager.disconnect(websocket)
+        logger.info(f"❌ 后厨看板WebSocket断开连接，剩余连接数: {len(kitchen_manager.active_connections)}")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if SERVER_WORKERS > 1:
+        # 多 worker 需要以导入字符串启动，且 EVENT_BUS_BACKEND 应设为 "sqlite"
+        uvicorn.run("Cook_applet:app", host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS)
+    else:
+        uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT)
@@ -0,0 +1,700 @@
+"""
+销售统计模块 - 基于 NumPy 列式数组的订单聚合
+订单（内存中的紧凑订单、OrderModel 表、归档文件）先转成列式数组，
+再用 bincount / unique 一次性按 天 × 小时、菜品 聚合成每日汇总（DayRollup）；
+已汇总的日期常驻内存：当天的订单新增或状态变更直接把该订单的增量加到当天的数组上（LiveDayRollup），
+更早日期的订单变更（以及重算期间发生的变更）才把该日期标记为待重算；
+查询一年的数据也只是把几百个小数组相加，不再逐个订单循环
+"""
+import asyncio
+import json
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from logger import get_logger
+from menu_cache import from_cents, to_cents
+from order_store import to_microseconds
+
+logger = get_logger("analytics")
+
+US_PER_HOUR = 3600 * 1000 * 1000
+US_PER_DAY = 24 * US_PER_HOUR
+_EPOCH_DAY = date(1970, 1, 1)
+
+# 统计用到的状态进入时间（下单时间即进入 pending 的时间），OrderColumns.status_us 的列按这个顺序排列
+TIMED_STATUSES = ("pending", "accepted", "preparing", "completed")
+# 停留时长指标：名称 -> (起始状态, 结束状态)
+DURATION_METRICS = {
+    "pending": ("pending", "accepted"),  # 等待接单
+    "accepted": ("accepted", "preparing"),  # 接单到开始制作
+    "preparing": ("preparing", "completed"),  # 制作
+    "fulfillment": ("accepted", "completed"),  # 接单到出餐
+}
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+UNKNOWN_CATEGORY = "未分类"
+
+REVENUE_GROUPS = ("day", "hour", "category", "dish")
+ITEM_GROUPS = ("category", "dish")
+DURATION_GROUPS = ("all", "day", "hour", "category", "dish")
+
+# 菜品信息：菜品ID -> (菜名, 分类)
+DishInfo = Dict[int, Tuple[str, str]]
+
+
+def day_of(created_us: int) -> date:
+    """下单时间（微秒）所在的日期"""
+    return _EPOCH_DAY + timedelta(days=created_us // US_PER_DAY)
+
+
+def day_bounds(start: date, end: date) -> Tuple[datetime, datetime]:
+    """[start, end] 两天对应的下单时间范围 [起, 止)"""
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+
+# ==================== 列式数组 ====================
+
+class OrderColumns(NamedTuple):
+    """一批订单的列式表示（订单列长度为订单数，订单项列长度为订单项数）"""
+    order_no: List[str]
+    created_us: np.ndarray  # int64
+    total_cents: np.ndarray  # int64
+    cancelled: np.ndarray  # bool
+    status_us: np.ndarray  # int64 (订单数, len(TIMED_STATUSES))，没有进入过的状态为 -1
+    item_order: np.ndarray  # int64，订单项所属订单在本批中的下标
+    item_dish: np.ndarray  # int64
+    item_quantity: np.ndarray  # int64
+    item_cents: np.ndarray  # int64，数量 × 单价（分）
+
+
+class OrderColumnsBuilder:
+    """逐个订单追加，最后一次性转为 NumPy 数组（追加阶段使用 array，内存紧凑）"""
+
+    def __init__(self):
+        self.order_no: List[str] = []
+        self._created = array("q")
+        self._total = array("q")
+        self._cancelled = array("b")
+        self._status = array("q")
+        self._item_order = array("q")
+        self._item_dish = array("q")
+        self._item_quantity = array("q")
+        self._item_cents = array("q")
+
+    def __len__(self) -> int:
+        return len(self.order_no)
+
+    def add(self, order_no: str, created_us: int, total_cents: int, status: str,
+            status_us: Dict[str, int], items: Iterable[Tuple[int, int, int]]):
+        """
+        :param status_us: 各状态的进入时间（微秒）
+        :param items: (菜品ID, 数量, 单价分)
+        """
+        index = len(self.order_no)
+        self.order_no.append(order_no)
+        self._created.append(created_us)
+        self._total.append(total_cents)
+        self._cancelled.append(status == "cancelled")
+        self._status.extend(status_us.get(timed, -1) for timed in TIMED_STATUSES)
+        for dish_id, quantity, price_cents in items:
+            self._item_order.append(index)
+            self._item_dish.append(dish_id)
+            self._item_quantity.append(quantity)
+            self._item_cents.append(quantity * price_cents)
+
+    def add_order(self, order):
+        """追加内存中的紧凑订单（order_model.Order）"""
+        status = order.status
+        self.add(order.id, order.created_us, order.total_cents, getattr(status, "value", status),
+                 order.status_times_us(),
+                 ((dish_id, quantity, price_cents) for dish_id, _, quantity, price_cents in order.iter_items()))
+
+    def add_record(self, record: Dict):
+        """追加订单字典（order_persistence.row_to_dict 或归档文件中的订单）"""
+        created_us = to_microseconds(record["created_at"])
+        status_us = {status: to_microseconds(at) for status, at in (record.get("status_times") or {}).items()}
+        status_us["pending"] = created_us
+        self.add(record["id"], created_us, to_cents(record["total_amount"]), record["status"], status_us,
+                 ((item["dish_id"], item["quantity"], to_cents(item["price"])) for item in record["items"]))
+
+    def build(self) -> OrderColumns:
+        def as_int64(values: array) -> np.ndarray:
+            return np.frombuffer(values, dtype=np.int64) if len(values) else np.zeros(0, dtype=np.int64)
+
+        return OrderColumns(
+            order_no=self.order_no,
+            created_us=as_int64(self._created),
+            total_cents=as_int64(self._total),
+            cancelled=np.frombuffer(self._cancelled, dtype=np.int8).astype(bool),
+            status_us=as_int64(self._status).reshape(-1, len(TIMED_STATUSES)),
+            item_order=as_int64(self._item_order),
+            item_dish=as_int64(self._item_dish),
+            item_quantity=as_int64(self._item_quantity),
+            item_cents=as_int64(self._item_cents),
+        )
+
+
+def load_order_columns(start: date, end: date, archive=None, exclude: Optional[Set[str]] = None) -> OrderColumns:
+    """
+    读取 [start, end] 内下单的已持久化订单（会阻塞，应在线程池中执行）
+    只查询统计需要的列，订单项JSON逐行解析；数据库和归档文件中都有的订单（归档进行中）只计一次
+
+    :param archive: order_archive.OrderArchive，为None时只读数据库
+    :param exclude: 不需要读取的订单号（内存中有更新状态的订单）
+    """
+    from database import ReadSessionLocal, OrderModel
+
+    builder = OrderColumnsBuilder()
+    seen = set(exclude or ())
+    low, high = day_bounds(start, end)
+    status_columns = [OrderModel.created_at, OrderModel.accepted_at, OrderModel.preparing_at,
+                      OrderModel.completed_at]
+    db = ReadSessionLocal()
+    try:
+        rows = (db.query(OrderModel.order_no, OrderModel.total_price, OrderModel.status, OrderModel.items,
+                         *status_columns)
+                .filter(OrderModel.created_at >= low, OrderModel.created_at < high,
+                        OrderModel.order_no.isnot(None))
+                .yield_per(2000))
+        for order_no, total_price, status, items, *entered in rows:
+            if order_no in seen:
+                continue
+            seen.add(order_no)
+            status_us = {timed: to_microseconds(at) for timed, at in zip(TIMED_STATUSES, entered) if at is not None}
+            builder.add(order_no, status_us["pending"], to_cents(total_price), status.value, status_us,
+                        ((item["dish_id"], item["quantity"], to_cents(item["price"]))
+                         for item in json.loads(items or "[]")))
+    finally:
+        db.close()
+
+    if archive is not None:
+        for day in archive.days():
+            if start <= day <= end:
+                for record in archive.read_day(day):
+                    if record["id"] not in seen:
+                        seen.add(record["id"])
+                        builder.add_record(record)
+    return builder.build()
+
+
+def concat_columns(parts: List[OrderColumns]) -> OrderColumns:
+    """合并多批订单（订单项的订单下标随之平移）"""
+    offsets = np.cumsum([0] + [len(part.order_no) for part in parts[:-1]])
+    return OrderColumns(
+        order_no=[order_no for part in parts for order_no in part.order_no],
+        created_us=np.concatenate([part.created_us for part in parts]),
+        total_cents=np.concatenate([part.total_cents for part in parts]),
+        cancelled=np.concatenate([part.cancelled for part in parts]),
+        status_us=np.concatenate([part.status_us for part in parts]),
+        item_order=np.concatenate([part.item_order + offset for part, offset in zip(parts, offsets)]),
+        item_dish=np.concatenate([part.item_dish for part in parts]),
+        item_quantity=np.concatenate([part.item_quantity for part in parts]),
+        item_cents=np.concatenate([part.item_cents for part in parts]),
+    )
+
+
+# ==================== 每日汇总 ====================
+
+class DayRollup(NamedTuple):
+    """
+    一天的订单汇总（已取消的订单不计入订单数、销量和营业额，停留时长按实际发生的状态统计）
+    """
+    day: date
+    orders_by_hour: np.ndarray  # int64[24]
+    revenue_by_hour: np.ndarray  # int64[24]，分
+    items_by_hour: np.ndarray  # int64[24]，份数
+    cancelled: int
+    dish_ids: np.ndarray  # 升序菜品ID
+    dish_quantity: np.ndarray  # 与 dish_ids 对应的份数
+    dish_revenue: np.ndarray  # 分
+    dish_orders: np.ndarray  # 包含该菜品的订单数
+    order_hour: np.ndarray  # int8[订单数]
+    durations: np.ndarray  # float32 (订单数, len(DURATION_METRICS))，秒，未发生为 NaN
+    item_order: np.ndarray  # int32，订单项所属订单在当天的下标（用于按菜品统计停留时长）
+    item_dish: np.ndarray  # int64
+
+
+def _durations(status_us: np.ndarray) -> np.ndarray:
+    result = np.full((len(status_us), len(DURATION_METRICS)), np.nan, dtype=np.float32)
+    for column, (begin, finish) in enumerate(DURATION_METRICS.values()):
+        begin_us = status_us[:, TIMED_STATUSES.index(begin)]
+        finish_us = status_us[:, TIMED_STATUSES.index(finish)]
+        valid = (begin_us >= 0) & (finish_us >= begin_us)
+        result[valid, column] = (finish_us[valid] - begin_us[valid]) / 1e6
+    return result
+
+
+def _rollup(day: date, columns: OrderColumns, orders: np.ndarray, items: np.ndarray,
+            local_order: np.ndarray) -> DayRollup:
+    """
+    :param orders: 当天订单在 columns 中的下标
+    :param items: 当天订单项在 columns 中的下标
+    :param local_order: 当天订单项所属订单在当天的下标
+    """
+    hours = (columns.created_us[orders] % US_PER_DAY) // US_PER_HOUR
+    valid = ~columns.cancelled[orders]
+    item_valid = valid[local_order]
+    item_hours = hours[local_order]
+    quantity = columns.item_quantity[items]
+
+    dish_ids, inverse = np.unique(columns.item_dish[items][item_valid], return_inverse=True)
+    # 同一订单中同一菜品的多行订单项只算一个订单
+    pair_keys = np.unique(inverse.astype(np.int64) * len(orders) + local_order[item_valid])
+    return DayRollup(
+        day=day,
+        orders_by_hour=np.bincount(hours[valid], minlength=24),
+        revenue_by_hour=np.bincount(hours[valid], weights=columns.total_cents[orders][valid],
+                                    minlength=24).astype(np.int64),
+        items_by_hour=np.bincount(item_hours[item_valid], weights=quantity[item_valid],
+                                  minlength=24).astype(np.int64),
+        cancelled=int(len(orders) - valid.sum()),
+        dish_ids=dish_ids,
+        dish_quantity=np.bincount(inverse, weights=quantity[item_valid], minlength=len(dish_ids)).astype(np.int64),
+        dish_revenue=np.bincount(inverse, weights=columns.item_cents[items][item_valid],
+                                 minlength=len(dish_ids)).astype(np.int64),
+        dish_orders=np.bincount(pair_keys // max(len(orders), 1), minlength=len(dish_ids)),
+        order_hour=hours.astype(np.int8),
+        durations=_durations(columns.status_us[orders]),
+        item_order=local_order.astype(np.int32),
+        item_dish=columns.item_dish[items],
+    )
+
+
+def build_rollups(columns: OrderColumns) -> Dict[date, DayRollup]:
+    """按下单日期把一批订单聚合成每日汇总（没有订单的日期不出现在结果中）"""
+    if not columns.order_no:
+        return {}
+    day_index = columns.created_us // US_PER_DAY
+    order_sort = np.argsort(day_index, kind="stable")
+    sorted_days = day_index[order_sort]
+    days, order_starts = np.unique(sorted_days, return_index=True)
+    order_ends = np.append(order_starts[1:], len(order_sort))
+    # 订单在排序后的位置，用于把订单项的订单下标换成当天内的下标
+    rank = np.empty(len(order_sort), dtype=np.int64)
+    rank[order_sort] = np.arange(len(order_sort))
+    item_rank = rank[columns.item_order]
+    item_sort = np.argsort(item_rank, kind="stable")
+    item_bounds = np.searchsorted(item_rank[item_sort], np.append(order_starts, len(order_sort)))
+
+    rollups = {}
+    for position, day in enumerate(days):
+        items = item_sort[item_bounds[position]:item_bounds[position + 1]]
+        current = _EPOCH_DAY + timedelta(days=int(day))
+        rollups[current] = _rollup(current, columns, order_sort[order_starts[position]:order_ends[position]],
+                                   items, item_rank[items] - order_starts[position])
+    return rollups
+
+
+# ==================== 查询 ====================
+
+def _dish_categories(dish_ids: np.ndarray, dish_info: DishInfo) -> Tuple[np.ndarray, List[str]]:
+    """菜品ID数组 -> (分类下标数组, 分类名列表)，已下架或删除的菜品归入"未分类" """
+    categories = sorted({category for _, category in dish_info.values()} | {UNKNOWN_CATEGORY})
+    known_ids = np.array(sorted(dish_info), dtype=np.int64)
+    known_codes = np.array([categories.index(dish_info[dish_id][1]) for dish_id in known_ids.tolist()],
+                           dtype=np.int64)
+    codes = np.full(len(dish_ids), categories.index(UNKNOWN_CATEGORY), dtype=np.int64)
+    if len(known_ids):
+        positions = np.minimum(np.searchsorted(known_ids, dish_ids), len(known_ids) - 1)
+        found = known_ids[positions] == dish_ids
+        codes[found] = known_codes[positions[found]]
+    return codes, categories
+
+
+def _group_sum(keys: np.ndarray, *values: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, [np.bincount(inverse, weights=value, minlength=len(unique)).astype(np.int64)
+                    for value in values]
+
+
+def _sales_by_key(rollups: List[DayRollup], group_by: str, dish_info: DishInfo) -> List[Dict]:
+    """按菜品或分类汇总 订单数/份数/营业额"""
+    if not rollups:
+        return []
+    dish_ids = np.concatenate([rollup.dish_ids for rollup in rollups])
+    quantity = np.concatenate([rollup.dish_quantity for rollup in rollups])
+    revenue = np.concatenate([rollup.dish_revenue for rollup in rollups])
+    orders = np.concatenate([rollup.dish_orders for rollup in rollups])
+    if group_by == "dish":
+        keys, (orders, quantity, revenue) = _group_sum(dish_ids, orders, quantity, revenue)
+        return [{"key": int(dish_id), "name": dish_info.get(int(dish_id), (None,))[0],
+                 "orders": int(count), "quantity": int(total), "revenue": from_cents(int(cents))}
+                for dish_id, count, total, cents in zip(keys, orders, quantity, revenue)]
+    codes, categories = _dish_categories(dish_ids, dish_info)
+    # 分类的订单数按菜品累加，同一订单点了同分类的多个菜品时会重复计数，因此不返回
+    keys, (quantity, revenue) = _group_sum(codes, quantity, revenue)
+    return [{"key": categories[code], "quantity": int(total), "revenue": from_cents(int(cents))}
+            for code, total, cents in zip(keys, quantity, revenue)]
+
+
+def revenue_report(rollups: List[DayRollup], group_by: str, dish_info: DishInfo) -> List[Dict]:
+    """
+    营业额统计
+
+    :param group_by: day / hour / category / dish
+    :return: [{"key", "orders", "quantity", "revenue"}]；day、hour 按时间顺序，category、dish 按营业额降序
+    """
+    if group_by == "day":
+        return [{"key": rollup.day.isoformat(), "orders": int(rollup.orders_by_hour.sum()),
+                 "quantity": int(rollup.items_by_hour.sum()), "revenue": from_cents(int(rollup.revenue_by_hour.sum())),
+                 "cancelled": rollup.cancelled}
+                for rollup in rollups]
+    if group_by == "hour":
+        orders = np.zeros(24, dtype=np.int64)
+        quantity = np.zeros(24, dtype=np.int64)
+        revenue = np.zeros(24, dtype=np.int64)
+        for rollup in rollups:
+            orders += rollup.orders_by_hour
+            quantity += rollup.items_by_hour
+            revenue += rollup.revenue_by_hour
+        return [{"key": hour, "orders": int(orders[hour]), "quantity": int(quantity[hour]),
+                 "revenue": from_cents(int(revenue[hour]))} for hour in range(24)]
+    rows = _sales_by_key(rollups, group_by, dish_info)
+    rows.sort(key=lambda row: row["revenue"], reverse=True)
+    return rows
+
+
+def items_report(rollups: List[DayRollup], group_by: str, dish_info: DishInfo, limit: int) -> List[Dict]:
+    """
+    销量排行
+
+    :param group_by: category / dish
+    :return: 按份数降序的前 limit 项
+    """
+    rows = _sales_by_key(rollups, group_by, dish_info)
+    rows.sort(key=lambda row: row["quantity"], reverse=True)
+    return rows[:limit]
+
+
+def grouped_percentiles(codes: np.ndarray, values: np.ndarray, group_count: int,
+                        percentiles: Iterable[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    分组百分位数（线性插值，与 np.percentile 默认方法一致），NaN 不参与统计
+
+    :param codes: 每个数值所属的分组号（0 到 group_count - 1）
+    :param values: 非负数值
+    :return: (各组样本数, 百分位数 (group_count, 百分位数个数))，没有样本的组为 NaN
+    """
+    valid = ~np.isnan(values)
+    codes, values = codes[valid], values[valid].astype(np.float64)
+    percentiles = np.asarray(list(percentiles), dtype=np.float64)
+    counts = np.bincount(codes, minlength=group_count)
+    result = np.full((group_count, len(percentiles)), np.nan)
+    if not len(values):
+        return counts, result
+    # 分组号作高位、数值作低位合成一个浮点键，一次 np.sort 完成分组内排序（比 lexsort 快约一个数量级）
+    span = values.max() + 1.0
+    values = np.sort(codes * span + values) - np.repeat(np.arange(group_count) * span, counts)
+    starts = np.cumsum(counts) - counts
+    present = counts > 0
+    positions = starts[present, None] + (counts[present, None] - 1) * percentiles[None, :] / 100
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, (starts + counts - 1)[present, None])
+    fraction = positions - lower
+    result[present] = values[lower] * (1 - fraction) + values[upper] * fraction
+    return counts, result
+
+
+def durations_report(rollups: List[DayRollup], group_by: str, dish_info: DishInfo,
+                     percentiles: Iterable[float] = DEFAULT_PERCENTILES) -> List[Dict]:
+    """
+    各状态停留时长的百分位数（秒）
+
+    :param group_by: all / day / hour / category / dish（按菜品、分类统计时，订单的时长计入其中每个菜品）
+    :return: [{"key", "<指标>": {"count", "p50", ...}}]
+    """
+    percentiles = tuple(percentiles)
+    if not rollups:
+        return []
+    durations = np.concatenate([rollup.durations for rollup in rollups])
+    if group_by in ("category", "dish"):
+        offsets = np.cumsum([0] + [len(rollup.durations) for rollup in rollups[:-1]])
+        item_order = np.concatenate([rollup.item_order + offset for rollup, offset in zip(rollups, offsets)])
+        durations = durations[item_order]
+        dish_ids = np.concatenate([rollup.item_dish for rollup in rollups])
+        if group_by == "category":
+            codes, labels = _dish_categories(dish_ids, dish_info)
+        else:
+            keys, codes = np.unique(dish_ids, return_inverse=True)
+            labels = keys.tolist()
+    elif group_by == "day":
+        codes = np.repeat(np.arange(len(rollups)), [len(rollup.durations) for rollup in rollups])
+        labels = [rollup.day.isoformat() for rollup in rollups]
+    elif group_by == "hour":
+        codes = np.concatenate([rollup.order_hour for rollup in rollups]).astype(np.int64)
+        labels = list(range(24))
+    else:
+        codes = np.zeros(len(durations), dtype=np.int64)
+        labels = ["all"]
+
+    rows: Dict[int, Dict] = {}
+    for column, metric in enumerate(DURATION_METRICS):
+        counts, values = grouped_percentiles(codes, durations[:, column], len(labels), percentiles)
+        for code in np.flatnonzero(counts).tolist():
+            row = rows.get(code)
+            if row is None:
+                row = rows[code] = {"key": labels[code]}
+                if group_by == "dish":
+                    row["name"] = dish_info.get(labels[code], (None,))[0]
+            row[metric] = dict({"count": int(counts[code])},
+                               **{f"p{pct:g}": round(value, 3) for pct, value in zip(percentiles, values[code].tolist())})
+    return [rows[code] for code in sorted(rows)]
+
+
+# ==================== 增量维护 ====================
+
+def contiguous_runs(days: List[date]) -> List[List[date]]:
+    """把升序的日期列表切分为连续日期段"""
+    runs: List[List[date]] = []
+    for day in days:
+        if runs and (day - runs[-1][-1]).days == 1:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _grow(values: np.ndarray, size: int) -> np.ndarray:
+    """保证数组第一维至少有 size 个位置（容量倍增，摊还 O(1)）"""
+    if len(values) >= size:
+        return values
+    grown = np.zeros((max(size, len(values) * 2, 64),) + values.shape[1:], dtype=values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+
+class LiveDayRollup:
+    """
+    当天汇总的可变版本（只在事件循环中读写）
+    订单新增或状态变更时把该订单的增量直接加到当天的数组上，代价只与该订单的订单项数有关：
+    按小时、按菜品的汇总原地加减，订单和订单项维度的数组预留容量，对外的 DayRollup 是已用部分的视图
+    """
+
+    def __init__(self, day: date, rollup: Optional[DayRollup], order_nos: List[str], cancelled: np.ndarray):
+        """
+        :param rollup: 当天的完整汇总（没有订单时为None）
+        :param order_nos: 汇总中各订单的订单号（与 rollup 中的订单下标对应）
+        :param cancelled: 汇总中各订单是否已取消
+        """
+        self.day = day
+        self._index: Dict[str, int] = {order_no: index for index, order_no in enumerate(order_nos)}
+        self._orders = len(order_nos)
+        if rollup is None:
+            rollup = DayRollup(day, *(np.zeros(24, dtype=np.int64) for _ in range(3)), 0,
+                               *(np.zeros(0, dtype=np.int64) for _ in range(4)), np.zeros(0, dtype=np.int8),
+                               np.zeros((0, len(DURATION_METRICS)), dtype=np.float32),
+                               np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64))
+        self.orders_by_hour = rollup.orders_by_hour.astype(np.int64)
+        self.revenue_by_hour = rollup.revenue_by_hour.astype(np.int64)
+        self.items_by_hour = rollup.items_by_hour.astype(np.int64)
+        self.cancelled = rollup.cancelled
+        self.dish_ids = rollup.dish_ids.astype(np.int64)
+        self.dish_quantity = rollup.dish_quantity.astype(np.int64)
+        self.dish_revenue = rollup.dish_revenue.astype(np.int64)
+        self.dish_orders = rollup.dish_orders.astype(np.int64)
+        self._cancelled = _grow(np.asarray(cancelled, dtype=bool).copy(), self._orders)
+        self._order_hour = _grow(rollup.order_hour.copy(), self._orders)
+        self._durations = _grow(rollup.durations.copy(), self._orders)
+        self._items = len(rollup.item_order)
+        self._item_order = _grow(rollup.item_order.copy(), self._items)
+        self._item_dish = _grow(rollup.item_dish.copy(), self._items)
+
+    def apply(self, order):
+        """登记订单（order_model.Order）的当前状态：新订单追加，已有订单按是否取消的变化加减"""
+        status = order.status
+        cancelled = getattr(status, "value", status) == "cancelled"
+        index = self._index.get(order.id)
+        if index is None:
+            index = self._append(order)
+            self._cancelled[index] = cancelled
+            if cancelled:
+                self.cancelled += 1
+            else:
+                self._add_sales(order, 1)
+        elif self._cancelled[index] != cancelled:
+            self._cancelled[index] = cancelled
+            self.cancelled += 1 if cancelled else -1
+            self._add_sales(order, -1 if cancelled else 1)
+        status_us = order.status_times_us()
+        row = np.array([[status_us.get(timed, -1) for timed in TIMED_STATUSES]], dtype=np.int64)
+        self._durations[index] = _durations(row)[0]
+
+    def _append(self, order) -> int:
+        index = self._orders
+        self._orders += 1
+        self._index[order.id] = index
+        self._cancelled = _grow(self._cancelled, self._orders)
+        self._order_hour = _grow(self._order_hour, self._orders)
+        self._durations = _grow(self._durations, self._orders)
+        self._order_hour[index] = (order.created_us % US_PER_DAY) // US_PER_HOUR
+        self._durations[index] = np.nan
+        dish_ids = [dish_id for dish_id, _, _, _ in order.iter_items()]
+        start, self._items = self._items, self._items + len(dish_ids)
+        self._item_order = _grow(self._item_order, self._items)
+        self._item_dish = _grow(self._item_dish, self._items)
+        self._item_order[start:self._items] = index
+        self._item_dish[start:self._items] = dish_ids
+        return index
+
+    def _add_sales(self, order, sign: int):
+        """把一个订单计入（sign=1）或移出（sign=-1）订单数、销量和营业额"""
+        hour = (order.created_us % US_PER_DAY) // US_PER_HOUR
+        self.orders_by_hour[hour] += sign
+        self.revenue_by_hour[hour] += sign * order.total_cents
+        by_dish: Dict[int, List[int]] = {}
+        for dish_id, _, quantity, price_cents in order.iter_items():
+            totals = by_dish.setdefault(dish_id, [0, 0])
+            totals[0] += quantity
+            totals[1] += quantity * price_cents
+        self.items_by_hour[hour] += sign * sum(quantity for quantity, _ in by_dish.values())
+        for dish_id, (quantity, cents) in by_dish.items():
+            position = int(np.searchsorted(self.dish_ids, dish_id))
+            if position == len(self.dish_ids) or self.dish_ids[position] != dish_id:
+                self.dish_ids = np.insert(self.dish_ids, position, dish_id)
+                self.dish_quantity = np.insert(self.dish_quantity, position, 0)
+                self.dish_revenue = np.insert(self.dish_revenue, position, 0)
+                self.dish_orders = np.insert(self.dish_orders, position, 0)
+            self.dish_quantity[position] += sign * quantity
+            self.dish_revenue[position] += sign * cents
+            self.dish_orders[position] += sign
+        # 与完整汇总一致：没有有效订单的菜品不出现
+        if sign < 0 and (self.dish_orders == 0).any():
+            keep = self.dish_orders != 0
+            self.dish_ids, self.dish_quantity, self.dish_revenue, self.dish_orders = (
+                self.dish_ids[keep], self.dish_quantity[keep], self.dish_revenue[keep], self.dish_orders[keep])
+
+    def rollup(self) -> Optional[DayRollup]:
+        """当前的汇总（数组为内部数组的视图，下一次 apply 之前有效）；没有订单时为None"""
+        if not self._orders:
+            return None
+        return DayRollup(
+            day=self.day,
+            orders_by_hour=self.orders_by_hour,
+            revenue_by_hour=self.revenue_by_hour,
+            items_by_hour=self.items_by_hour,
+            cancelled=self.cancelled,
+            dish_ids=self.dish_ids,
+            dish_quantity=self.dish_quantity,
+            dish_revenue=self.dish_revenue,
+            dish_orders=self.dish_orders,
+            order_hour=self._order_hour[:self._orders],
+            durations=self._durations[:self._orders],
+            item_order=self._item_order[:self._items],
+            item_dish=self._item_dish[:self._items],
+        )
+
+
+class SalesAnalytics:
+    """
+    每日汇总缓存（只在事件循环中读写）
+    当天的汇总算好后转为 LiveDayRollup，当天订单的变更直接增量更新；
+    其他日期的订单变更把该日期标记为待重算，查询时只重算缺失和待重算的日期：
+    内存中的订单直接转为列，其余订单在读线程中从数据库和归档文件读取
+    """
+
+    def __init__(self, load_columns: Callable[[date, date, Set[str]], OrderColumns],
+                 hot_orders: Callable[[], Iterable], executor, warm_days: int = 0):
+        """
+        :param load_columns: load_columns(start, end, exclude) 读取已持久化的订单（在读线程中执行）
+        :param hot_orders: 返回内存中的全部订单
+        :param executor: db_executor.DBExecutor
+        :param warm_days: 启动后在后台预先汇总最近多少天
+        """
+        self.load_columns = load_columns
+        self.hot_orders = hot_orders
+        self.executor = executor
+        self.warm_days = warm_days
+        # 日期 -> 汇总（没有订单的日期为None）
+        self._days: Dict[date, Optional[DayRollup]] = {}
+        self._dirty: Set[date] = set()
+        # 当天的可变汇总（当天还没有汇总过、或正在重算时为None）
+        self._live: Optional[LiveDayRollup] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def on_order_change(self, order, old_status, new_status):
+        """订单仓库的变更回调：移出内存（new_status 为None）不改变统计结果"""
+        if new_status is None:
+            return
+        day = day_of(order.created_us)
+        live = self._live
+        if live is not None and live.day == day and day not in self._dirty:
+            live.apply(order)
+            self._days[day] = live.rollup()
+        else:
+            self._dirty.add(day)
+
+    async def start(self):
+        if self._task is None and self.warm_days > 0:
+            self._task = asyncio.create_task(self._warm())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _warm(self):
+        today = date.today()
+        try:
+            await self.rollups(today - timedelta(days=self.warm_days - 1), today)
+            logger.info(f"已预先汇总最近 {self.warm_days} 天的订单")
+        except Exception as e:
+            logger.error(f"❌ 订单统计预汇总失败: {e}")
+
+    async def rollups(self, start: date, end: date) -> List[DayRollup]:
+        """[start, end] 内有订单的日期的汇总（按日期升序）"""
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        if any(day not in self._days or day in self._dirty for day in days):
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                # 等锁期间其他请求可能已经算好
+                stale = [day for day in days if day not in self._days or day in self._dirty]
+                if stale:
+                    await self._rebuild(stale)
+        return [rollup for rollup in (self._days.get(day) for day in days) if rollup is not None]
+
+    async def _rebuild(self, days: List[date]):
+        """
+        重算一组日期（升序）的汇总
+        按连续的日期分段读取，相隔很远的两天不会把中间的整段历史一起读出来
+        """
+        # 先清除标记、取内存订单快照，重算期间发生的变更会重新标记
+        self._dirty.difference_update(days)
+        if self._live is not None and self._live.day in days:
+            self._live = None
+        runs = contiguous_runs(days)
+        run_of = {day: position for position, run in enumerate(runs) for day in run}
+        builders = [OrderColumnsBuilder() for _ in runs]
+        for order in self.hot_orders():
+            position = run_of.get(day_of(order.created_us))
+            if position is not None:
+                builders[position].add_order(order)
+        for position, (run, builder) in enumerate(zip(runs, builders)):
+            try:
+                await self._rebuild_run(run, builder.build())
+            except Exception:
+                for failed in runs[position:]:
+                    self._dirty.update(failed)
+                raise
+
+    async def _rebuild_run(self, days: List[date], hot: OrderColumns):
+        """重算一段连续日期的汇总（hot 为其中的内存订单）"""
+        today = date.today()
+        stored = await self.executor.run_read(self.load_columns, days[0], days[-1], set(hot.order_no))
+        columns = concat_columns([hot, stored])
+        rollups = build_rollups(columns)
+        for day in days:
+            self._days[day] = rollups.get(day)
+        # 当天的汇总转为可变版本（重算期间当天又有变更时保持待重算，下次查询再转）
+        if today in days and today not in self._dirty:
+            # build_rollups 按下单日期稳定排序，当天订单在汇总中的下标与其在 columns 中的先后顺序一致
+            positions = np.flatnonzero(columns.created_us // US_PER_DAY == (today - _EPOCH_DAY).days)
+            self._live = LiveDayRollup(today, rollups.get(today), [columns.order_no[i] for i in positions.tolist()],
+                                       columns.cancelled[positions])
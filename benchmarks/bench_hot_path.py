@@ -0,0 +1,289 @@
+"""
+点餐热路径压测 - 在进程内直接驱动 ASGI 应用（不经过网络）
+1. 在临时目录中建库，写入 N 个菜品和 M 条历史订单
+2. 并发模拟顾客（浏览菜单 GET /api/user/dishes、下单 POST /api/user/orders）
+   和商家（接单/开始制作/完成 + WebSocket 监听新订单）
+3. 以 JSON 输出各接口 p50/p95/p99 延迟、吞吐量和新订单通知延迟，便于前后对比
+
+依赖 httpx（pip install httpx）
+用法: python benchmarks/bench_hot_path.py --customers 20 --orders-per-customer 20 --output result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+CATEGORIES = ["川菜", "家常菜", "海鲜", "粤菜", "湘菜"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": round(max(samples), 3) if samples else 0.0,
+    }
+
+
+# ==================== 数据准备 ====================
+
+def seed_database(dish_count: int, history_count: int) -> List[int]:
+    """写入菜品（与 init_data.create_sample_dishes 相同的字段）和历史订单，返回菜品ID"""
+    from database import SessionLocal, DishModel, init_database
+    from order_persistence import write_order_batch
+
+    init_database()
+    db = SessionLocal()
+    try:
+        for i in range(dish_count):
+            db.add(DishModel(
+                name=f"测试菜品{i}",
+                price=round(random.uniform(12, 88), 1),
+                description="鸡肉、花生、干辣椒、花椒",
+                image_url=f"https://example.com/images/dish{i}.jpg",
+                cooking_instructions=f"【测试菜品{i}】\n\n📋 所需食材：\n  • 鸡胸肉 300g\n\n"
+                                     "👨‍🍳 制作步骤：\n  1. 切丁腌制\n  2. 翻炒出锅",
+                category=CATEGORIES[i % len(CATEGORIES)],
+                is_available=True,
+            ))
+        db.commit()
+        dish_ids = [row.id for row in db.query(DishModel.id).all()]
+    finally:
+        db.close()
+
+    # 历史订单直接批量写库（已完成状态，启动时不会被恢复到内存）
+    start = datetime.now() - timedelta(days=30)
+    batch = []
+    for i in range(history_count):
+        created = start + timedelta(seconds=i * 30)
+        items = [SimpleNamespace(dish_id=random.choice(dish_ids), dish_name="测试菜品",
+                                 quantity=random.randint(1, 3), price=28.0)
+                 for _ in range(random.randint(1, 4))]
+        batch.append({
+            "order_no": f"ORD{int(created.timestamp() * 1000)}{i:06d}",
+            "user_id": f"history_user_{i % 500}",
+            "user_name": "历史顾客",
+            "total_price": sum(item.price * item.quantity for item in items),
+            "status": "completed",
+            "items": items,
+            "note": None,
+            "created_at": created,
+            "updated_at": created,
+        })
+        if len(batch) >= 2000:
+            write_order_batch(batch)
+            batch = []
+    if batch:
+        write_order_batch(batch)
+    return dish_ids
+
+
+# ==================== 进程内 WebSocket 客户端 ====================
+
+class InProcessWebSocket:
+    """直接调用 ASGI 应用的最小 WebSocket 客户端"""
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self._accepted = asyncio.Event()
+        self._task = None
+
+    async def connect(self):
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws",
+            "path": self.path, "raw_path": self.path.encode(), "root_path": "",
+            "query_string": b"", "headers": [], "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80), "subprotocols": [],
+        }
+        await self._to_app.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._to_app.get, self._send))
+        await asyncio.wait_for(self._accepted.wait(), 5)
+
+    async def _send(self, message):
+        if message["type"] == "websocket.accept":
+            self._accepted.set()
+        elif message["type"] == "websocket.send":
+            await self.messages.put((time.perf_counter(), message.get("text")))
+
+    async def close(self):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except Exception:
+            pass
+
+
+# ==================== 压测场景 ====================
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client, label: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[label].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        # 进程内调用没有真实网络IO，不主动让出的话WebSocket发送任务会一直等不到调度
+        await asyncio.sleep(0)
+        return response
+
+
+async def customer(client, recorder: Recorder, dish_ids: List[int], user_no: int,
+                   order_count: int, order_started: Dict[str, float], merchant_queue: asyncio.Queue):
+    user_id = f"bench_user_{user_no}"
+    for _ in range(order_count):
+        await recorder.call(client, "GET /api/user/dishes", "GET", "/api/user/dishes")
+        items = [{"dish_id": dish_id, "dish_name": "测试菜品", "quantity": random.randint(1, 3), "price": 28.0}
+                 for dish_id in random.sample(dish_ids, k=min(len(dish_ids), random.randint(1, 4)))]
+        started = time.perf_counter()
+        response = await recorder.call(client, "POST /api/user/orders", "POST", "/api/user/orders", json={
+            "user_id": user_id, "user_name": f"顾客{user_no}", "items": items, "note": "压测",
+        })
+        if response.status_code == 200:
+            order_id = response.json()["id"]
+            order_started.setdefault(order_id, started)
+            await merchant_queue.put(order_id)
+
+
+async def merchant(client, recorder: Recorder, merchant_queue: asyncio.Queue):
+    while True:
+        order_id = await merchant_queue.get()
+        if order_id is None:
+            return
+        for action in ("accept", "start", "complete"):
+            await recorder.call(client, f"POST /api/merchant/orders/{{id}}/{action}", "POST",
+                                f"/api/merchant/orders/{order_id}/{action}")
+
+
+async def listener(ws: InProcessWebSocket, order_started: Dict[str, float], lags: List[float],
+                   counters: Dict[str, int], expected: int):
+    received = 0
+    while received < expected:
+        received_at, text = await ws.messages.get()
+        data = json.loads(text)
+        counters[data.get("type", "unknown")] += 1
+        if data.get("type") != "new_order":
+            continue
+        received += 1
+        started = order_started.get(data["order"]["id"])
+        if started is not None:
+            lags.append((received_at - started) * 1000)
+
+
+async def run(args) -> Dict:
+    import logging
+    import httpx
+    from Cook_applet import app
+    from logger import ROOT_LOGGER_NAME
+
+    # 每个请求一条的业务日志会混进JSON输出，压测时只保留警告以上
+    logging.getLogger(ROOT_LOGGER_NAME).setLevel(logging.WARNING)
+
+    dish_ids = seed_database(args.dishes, args.history)
+    recorder = Recorder()
+    order_started: Dict[str, float] = {}
+    lags: List[float] = []
+    counters: Dict[str, int] = defaultdict(int)
+    merchant_queue: asyncio.Queue = asyncio.Queue()
+    total_orders = args.customers * args.orders_per_customer
+
+    async with app.router.lifespan_context(app):
+        sockets = [InProcessWebSocket(app, "/ws/merchant") for _ in range(args.listeners)]
+        for ws in sockets:
+            await ws.connect()
+        listeners = [asyncio.create_task(listener(ws, order_started, lags, counters, total_orders)) for ws in sockets]
+
+        async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+            # 历史订单分页查询（深翻页）
+            await recorder.call(client, "GET /api/merchant/orders", "GET", "/api/merchant/orders")
+
+            started = time.perf_counter()
+            merchants = [asyncio.create_task(merchant(client, recorder, merchant_queue))
+                         for _ in range(args.merchants)]
+            await asyncio.gather(*(
+                customer(client, recorder, dish_ids, i, args.orders_per_customer, order_started, merchant_queue)
+                for i in range(args.customers)
+            ))
+            for _ in merchants:
+                await merchant_queue.put(None)
+            await asyncio.gather(*merchants)
+            elapsed = time.perf_counter() - started
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*listeners), 10)
+        except asyncio.TimeoutError:
+            for task in listeners:
+                task.cancel()
+        for ws in sockets:
+            await ws.close()
+
+    request_count = sum(len(samples) for samples in recorder.latencies.values())
+    return {
+        "config": vars(args),
+        "elapsed_s": round(elapsed, 3),
+        "requests": request_count,
+        "throughput_rps": round(request_count / elapsed, 1) if elapsed else 0.0,
+        "orders_per_s": round(total_orders / elapsed, 1) if elapsed else 0.0,
+        "endpoints": {label: summarize(samples) for label, samples in sorted(recorder.latencies.items())},
+        "errors": dict(recorder.errors),
+        "notification_lag": summarize(lags),
+        # 各类推送消息的接收数量；出现 resync 说明推送队列溢出被合并
+        "ws_messages": dict(counters),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="点餐热路径压测")
+    parser.add_argument("--dishes", type=int, default=50, help="菜品数量")
+    parser.add_argument("--history", type=int, default=10000, help="历史订单数量")
+    parser.add_argument("--customers", type=int, default=20, help="并发顾客数")
+    parser.add_argument("--orders-per-customer", type=int, default=10, help="每个顾客下单次数")
+    parser.add_argument("--merchants", type=int, default=2, help="并发处理订单的商家数")
+    parser.add_argument("--listeners", type=int, default=3, help="商家端WebSocket连接数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--output", help="结果JSON输出文件")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    output = os.path.abspath(args.output) if args.output else None
+
+    # 在临时目录中运行，数据库使用相对路径 ./cook_applet.db
+    workdir = tempfile.mkdtemp(prefix="cook_bench_")
+    os.chdir(workdir)
+    result = asyncio.run(run(args))
+    result["workdir"] = workdir
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
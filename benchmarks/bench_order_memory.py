@@ -0,0 +1,95 @@
+"""
+订单内存占用对比 - 旧表示（带 __dict__ 的 dataclass，订单项为对象列表）
+与新表示（order_model.Order：__slots__ + 打包的订单项 + 整数时间/金额/状态）
+
+用法: python benchmarks/bench_order_memory.py [订单数量]
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_model import Order, OrderItem, OrderStatus
+
+DISH_NAMES = ["宫保鸡丁", "鱼香肉丝", "麻婆豆腐", "回锅肉", "水煮鱼", "清炒时蔬"]
+
+
+@dataclass
+class LegacyOrderItem:
+    """旧订单项模型"""
+    dish_id: int
+    dish_name: str
+    quantity: int
+    price: float
+
+
+@dataclass
+class LegacyOrder:
+    """旧订单模型"""
+    id: str
+    user_id: str
+    user_name: str
+    total_amount: float
+    status: OrderStatus
+    items: List[LegacyOrderItem]
+    created_at: datetime
+    updated_at: datetime
+    note: Optional[str] = None
+
+
+def make_orders(order_cls, item_cls, count: int):
+    start = datetime(2024, 1, 1, 11, 0)
+    statuses = list(OrderStatus)
+    orders = []
+    for i in range(count):
+        # 模拟真实请求：每个订单的字符串和时间都是新对象
+        created_at = start + timedelta(seconds=i)
+        items = [item_cls(dish_id=j + 1, dish_name="".join(DISH_NAMES[(i + j) % len(DISH_NAMES)]),
+                          quantity=j % 3 + 1, price=28.0 + j)
+                 for j in range(i % 4 + 1)]
+        orders.append(order_cls(
+            id=f"ORD{1704078000000 + i * 1000}{i:06d}",
+            user_id=f"user_{i % 97}",
+            user_name="测试用户" + str(i % 97),
+            total_amount=round(sum(item.quantity * item.price for item in items), 2),
+            status=statuses[i % len(statuses)],
+            items=items,
+            created_at=created_at,
+            updated_at=created_at + timedelta(minutes=5),
+            note="不要太辣" + str(i) if i % 2 else None,
+        ))
+    return orders
+
+
+def measure(order_cls, item_cls, count: int) -> int:
+    """构建 count 个订单后仍然存活的内存（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    orders = make_orders(order_cls, item_cls, count)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del orders
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    legacy = measure(LegacyOrder, LegacyOrderItem, count)
+    compact = measure(Order, OrderItem, count)
+    print(json.dumps({
+        "orders": count,
+        "legacy_bytes_per_order": round(legacy / count, 1),
+        "compact_bytes_per_order": round(compact / count, 1),
+        "reduction": round(1 - compact / legacy, 3),
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
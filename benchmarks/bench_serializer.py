@@ -0,0 +1,78 @@
+"""
+序列化性能对比 - 旧路径（asdict + datetime递归转换 + jsonable_encoder + json.dumps）
+与新路径（serializer 预生成编码函数直接输出JSON）
+
+用法: python benchmarks/bench_serializer.py [订单数量] [重复次数]
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from order_model import Order, OrderItem, OrderStatus
+from serializer import dumps
+
+
+def _convert_datetime_in_dict(data):
+    """旧实现：递归转换字典中的datetime对象"""
+    if isinstance(data, dict):
+        return {key: _convert_datetime_in_dict(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [_convert_datetime_in_dict(item) for item in data]
+    elif isinstance(data, datetime):
+        return data.isoformat()
+    return data
+
+
+def legacy_dumps(orders) -> bytes:
+    """旧路径：dataclass_to_dict 后交给 FastAPI 的 JSONResponse（订单已改为紧凑表示，用 to_dict 代替 asdict）"""
+    content = jsonable_encoder([_convert_datetime_in_dict(order.to_dict()) for order in orders])
+    return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def make_orders(count: int):
+    now = datetime.now()
+    return [
+        Order(
+            id=f"ORD{1700000000000 + i}{i % 1000000:06d}",
+            user_id=f"user_{i % 97}",
+            user_name="测试用户",
+            total_amount=round(28.0 * (i % 5 + 1), 2),
+            status=list(OrderStatus)[i % len(OrderStatus)],
+            items=[OrderItem(dish_id=j + 1, dish_name="宫保鸡丁", quantity=j + 1, price=28.0)
+                   for j in range(3)],
+            created_at=now,
+            updated_at=now,
+            note="不要太辣" if i % 2 else None,
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    orders = make_orders(count)
+
+    # 两条路径输出的JSON必须等价
+    assert json.loads(legacy_dumps(orders)) == json.loads(dumps(orders))
+
+    legacy = min(timeit.repeat(lambda: legacy_dumps(orders), number=1, repeat=repeat))
+    fast = min(timeit.repeat(lambda: dumps(orders), number=1, repeat=repeat))
+
+    print(json.dumps({
+        "orders": count,
+        "legacy_ms": round(legacy * 1000, 3),
+        "serializer_ms": round(fast * 1000, 3),
+        "speedup": round(legacy / fast, 2),
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,80 @@ FilePath: \cook_applet\config.py
 # 数据库配置
 DATABASE_URL = "sqlite:///./cook_applet.db"
 
+# SQLite 调优参数（每个连接建立时通过 PRAGMA 设置）
+SQLITE_JOURNAL_MODE = "WAL"  # WAL 模式下读写互不阻塞
+SQLITE_SYNCHRONOUS = "NORMAL"  # WAL 下 NORMAL 既安全又省去每次提交的 fsync
+SQLITE_BUSY_TIMEOUT_MS = 5000  # 遇到锁时等待而不是立即报 database is locked
+SQLITE_CACHE_SIZE_KB = 64000  # 每个连接的页缓存大小
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # 内存映射读取的最大字节数
+
 # 服务器配置
 SERVER_HOST = "0.0.0.0"
 SERVER_PORT = 8000
 
 # 替换为你的服务器域名或IP
 BASE_URL = "http://72.11.140.254:8000"
+
+# 订单持久化配置（后台批量写入）
+ORDER_FLUSH_INTERVAL_MS = 200  # 最长攒批时间（毫秒）
+ORDER_FLUSH_BATCH_SIZE = 200  # 攒够多少条立即提交
+ORDER_TRANSITION_LOG_CAPACITY = 4096  # 状态流转日志环形缓冲区条数（写满一半立即提交）
+
+# 下单幂等配置（小程序弱网重试时用同一个幂等键，有效期内只创建一次订单）
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600  # 幂等键有效期（秒）
+IDEMPOTENCY_MAX_ENTRIES = 20000  # 内存中最多保留的幂等键数
+
+# WebSocket推送配置
+WS_QUEUE_SIZE = 100  # 每个连接最多积压的消息数
+WS_OVERFLOW_POLICY = "coalesce"  # 积压溢出策略: drop_oldest / drop_newest / coalesce / disconnect
+WS_SEND_TIMEOUT = 5.0  # 单条消息发送超时（秒），超时的连接会被剔除
+
+# 多进程部署配置
+SERVER_WORKERS = 1  # uvicorn worker 数量
+EVENT_BUS_BACKEND = "local"  # 单进程用 "local"，多 worker 时改为 "sqlite"
+EVENT_JOURNAL_PATH = "./cook_applet_events.db"  # sqlite 事件日志文件
+EVENT_POLL_INTERVAL_MS = 50  # 各 worker 轮询事件日志的间隔（毫秒）
+
+# 数据库执行线程配置
+DB_READ_THREADS = 4  # 读操作线程数，同时也是只读连接池大小（写操作固定单线程单连接）
+LOOP_LAG_INTERVAL_MS = 100  # 事件循环延迟采样间隔（毫秒）
+
+# 订单列表分页配置
+ORDER_PAGE_DEFAULT_LIMIT = 100  # 默认每页条数
+ORDER_PAGE_MAX_LIMIT = 500  # 每页最大条数
+
+# 订单分层保留配置（内存 → SQLite → 按天压缩的归档文件）
+ORDER_HOT_RETENTION_MINUTES = 60  # 已完成/已取消的订单在内存中保留的分钟数，之后只在数据库中
+ORDER_ARCHIVE_AFTER_DAYS = 30  # 已结束订单在数据库中保留的天数，之后移入归档文件
+ORDER_ARCHIVE_DIR = "./archive/orders"  # 归档文件目录
+ORDER_RETENTION_INTERVAL_S = 60  # 内存淘汰检查间隔（秒）
+ORDER_ARCHIVE_INTERVAL_S = 3600  # 归档检查间隔（秒）
+ORDER_ARCHIVE_BATCH_SIZE = 2000  # 每个归档事务处理的订单数
+
+# 销售统计配置
+ANALYTICS_DEFAULT_DAYS = 7  # 未指定日期范围时统计最近多少天
+ANALYTICS_MAX_DAYS = 366  # 单次查询最多跨越的天数
+ANALYTICS_WARM_DAYS = 366  # 启动后在后台预先汇总最近多少天的订单（0 表示首次查询时再汇总）
+ANALYTICS_TOP_LIMIT = 20  # 销量排行默认返回的条数
+
+# 菜品搜索分页配置
+SEARCH_PAGE_DEFAULT_LIMIT = 20  # 默认每页条数
+SEARCH_PAGE_MAX_LIMIT = 100  # 每页最大条数
+
+# 日志配置
+LOG_LEVEL = "INFO"  # DEBUG / INFO / WARNING / ERROR
+
+# 批量接口配置
+BATCH_MAX_ITEMS = 200  # 批量处理订单/菜品时单次最多的条目数
+
+# 后厨看板配置
+KITCHEN_PUSH_INTERVAL_MS = 200  # 看板增量推送的合并间隔（毫秒）
+
+# 菜品图片与静态资源配置
+IMAGE_DIR = "./uploads/images"  # 本地化后的菜品图片和缩略图存储目录
+IMAGE_THUMBNAIL_WIDTHS = (160, 320, 640)  # 缩略图宽度档位（像素）
+IMAGE_WORKERS = 2  # 下载图片和生成缩略图的后台线程数
+IMAGE_MAX_BYTES = 10 * 1024 * 1024  # 单张原图最大字节数
+IMAGE_FETCH_TIMEOUT = 10.0  # 下载图片超时（秒）
+IMAGE_FETCH_ALLOWED_HOSTS = ()  # 允许下载图片的主机（含子域名），为空时允许任意公网主机；内网地址始终拒绝
+STATIC_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 菜品图片内存缓存上限（页面和图标常驻内存，不计入）
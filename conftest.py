@@ -0,0 +1,23 @@
+"""
+测试公共夹具
+"""
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def temp_database(tmp_path, monkeypatch):
+    """把 database 模块的读写会话指向临时目录中的新数据库（各模块在调用时才导入会话工厂）"""
+    import database
+
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    write_engine = database.create_db_engine(url, pool_size=1)
+    read_engine = database.create_db_engine(url, pool_size=2, read_only=True)
+    database.Base.metadata.create_all(bind=write_engine)
+    monkeypatch.setattr(database, "engine", write_engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=write_engine))
+    monkeypatch.setattr(database, "ReadSessionLocal",
+                        sessionmaker(autocommit=False, autoflush=False, bind=read_engine))
+    yield database
+    write_engine.dispose()
+    read_engine.dispose()
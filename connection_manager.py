@@ -0,0 +1,145 @@
+"""
+WebSocket连接管理模块 - 非阻塞广播
+每个商家端连接有自己的有界发送队列和发送任务，广播只是把消息放进队列，
+慢连接不会拖慢下单请求；发送失败、超时或队列溢出的连接会被自动剔除
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from fastapi import WebSocket
+
+from logger import get_logger
+from metrics import WS_BROADCAST_SECONDS, WS_DROPPED_MESSAGES, WS_EVICTIONS
+
+logger = get_logger("ws")
+
+# 队列满时的处理策略
+DROP_OLDEST = "drop_oldest"  # 丢弃最旧的消息
+DROP_NEWEST = "drop_newest"  # 丢弃新消息
+COALESCE = "coalesce"  # 清空积压，合并为一条"请重新拉取"消息
+DISCONNECT = "disconnect"  # 直接断开该连接
+
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE, DISCONNECT)
+
+# COALESCE 策略下替代积压消息的通知，客户端收到后应重新拉取订单列表
+RESYNC_MESSAGE = '{"type":"resync"}'
+
+
+class _Connection:
+    """单个连接的发送队列"""
+    __slots__ = ("websocket", "queue", "ready", "task", "dropped", "closing")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: Deque[str] = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.closing = False  # 已开始剔除，不再接收新消息
+
+
+class ConnectionManager:
+    """WebSocket连接管理器（用于实时通知商家）"""
+
+    def __init__(self, queue_size: int = 100, overflow_policy: str = COALESCE,
+                 send_timeout: float = 5.0):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的队列溢出策略: {overflow_policy}")
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[WebSocket, _Connection] = {}
+        self.evicted_count = 0
+        # 正在进行的剔除任务（持有引用，避免任务未完成就被回收）
+        self._tasks = set()
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        conn = _Connection(websocket)
+        conn.task = asyncio.create_task(self._sender(conn))
+        self.active_connections[websocket] = conn
+
+    def disconnect(self, websocket: WebSocket):
+        """移除连接（可重复调用）"""
+        conn = self.active_connections.pop(websocket, None)
+        if conn is not None and conn.task is not None:
+            if conn.task is not asyncio.current_task():
+                conn.task.cancel()
+
+    def broadcast(self, message: str):
+        """把消息放进每个连接的发送队列，不等待发送完成"""
+        start = time.perf_counter()
+        for conn in list(self.active_connections.values()):
+            self._enqueue(conn, message)
+        WS_BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+    def send(self, websocket: WebSocket, message: str):
+        """把消息放进单个连接的发送队列（如连接建立后的首屏快照）"""
+        conn = self.active_connections.get(websocket)
+        if conn is not None:
+            self._enqueue(conn, message)
+
+    def queue_depth(self) -> int:
+        """所有连接中积压最多的队列长度"""
+        return max((len(conn.queue) for conn in self.active_connections.values()), default=0)
+
+    async def close_all(self):
+        """关闭全部连接（应用退出时调用）"""
+        for websocket in list(self.active_connections):
+            await self._evict(self.active_connections.get(websocket))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _enqueue(self, conn: _Connection, message: str):
+        if conn.closing:
+            return
+        if len(conn.queue) >= self.queue_size:
+            conn.dropped += 1
+            WS_DROPPED_MESSAGES.inc(policy=self.overflow_policy)
+            if self.overflow_policy == DROP_NEWEST:
+                return
+            if self.overflow_policy == DROP_OLDEST:
+                conn.queue.popleft()
+            elif self.overflow_policy == COALESCE:
+                conn.queue.clear()
+                conn.queue.append(RESYNC_MESSAGE)
+                conn.ready.set()
+                return
+            else:
+                # 每个连接只启动一次剔除任务，剔除完成前后续消息直接丢弃
+                conn.closing = True
+                task = asyncio.create_task(self._evict(conn))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                return
+        conn.queue.append(message)
+        conn.ready.set()
+
+    async def _sender(self, conn: _Connection):
+        """逐条发送队列中的消息，出错或超时即剔除连接"""
+        try:
+            while True:
+                await conn.ready.wait()
+                while conn.queue:
+                    message = conn.queue.popleft()
+                    await asyncio.wait_for(conn.websocket.send_text(message), self.send_timeout)
+                conn.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ WebSocket发送失败，剔除连接: {e!r}")
+            await self._evict(conn)
+
+    async def _evict(self, conn: Optional[_Connection]):
+        if conn is None or conn.websocket not in self.active_connections:
+            return
+        conn.closing = True
+        self.disconnect(conn.websocket)
+        self.evicted_count += 1
+        WS_EVICTIONS.inc()
+        try:
+            await conn.websocket.close()
+        except Exception:
+            pass
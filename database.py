@@ -1,12 +1,19 @@
 """
 数据库模型定义（使用SQLAlchemy 1.4）
 """
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, Enum as SQLEnum
+from sqlalchemy import create_engine, event, inspect, text, Index, Column, Integer, String, Float, Boolean, DateTime, Text, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from datetime import datetime
 import enum
 
+from config import (DATABASE_URL, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS,
+                    SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, DB_READ_THREADS)
+from logger import get_logger
+
+logger = get_logger("database")
+
 Base = declarative_base()
 
 
@@ -28,7 +35,12 @@ class DishModel(Base):
     price = Column(Float, nullable=False)
     description = Column(Text)
     image_url = Column(String(500))
+    image_thumbnails = Column(Text)  # 缩略图 {"宽度": URL}（JSON文本，见 image_pipeline.py）
     cooking_instructions = Column(Text)  # 制作说明（从PDF解析）
+    # 由制作说明解析出的结构化菜谱（JSON文本，见 recipe_parser.py）
+    recipe_ingredients = Column(Text)  # [{"name": 食材, "quantity": 用量}]
+    recipe_steps = Column(Text)  # [步骤]
+    recipe_tips = Column(Text)  # [小贴士]
     category = Column(String(50), index=True)
     is_available = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.now)
@@ -39,6 +51,7 @@ class OrderModel(Base):
     __tablename__ = "orders"
     
     id = Column(Integer, primary_key=True, index=True)
+    order_no = Column(String(50), unique=True, index=True)  # 业务订单号（ORD...）
     user_id = Column(String(100), nullable=False, index=True)
     user_name = Column(String(100))
     total_price = Column(Float, nullable=False)
@@ -48,6 +61,71 @@ class OrderModel(Base):
     payment_status = Column(String(20), default="pending")
     created_at = Column(DateTime, default=datetime.now, index=True)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # 进入各状态的时间（下单时间即进入 pending 的时间），用于统计各状态的停留时长
+    accepted_at = Column(DateTime)
+    preparing_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    cancelled_at = Column(DateTime)
+
+    # 订单列表按 (created_at, order_no) 游标分页，按用户/状态筛选时使用组合索引
+    __table_args__ = (
+        Index("ix_orders_created_order_no", "created_at", "order_no"),
+        Index("ix_orders_user_created", "user_id", "created_at", "order_no"),
+        Index("ix_orders_status_created", "status", "created_at", "order_no"),
+    )
+
+
+class OrderTransitionModel(Base):
+    """订单状态流转日志（只追加，见 order_state_machine.py）"""
+    __tablename__ = "order_transitions"
+
+    id = Column(Integer, primary_key=True)
+    order_no = Column(String(50), nullable=False)
+    from_status = Column(String(20), nullable=False)
+    to_status = Column(String(20), nullable=False)
+    created_at = Column(DateTime, nullable=False)  # 流转时间
+
+    __table_args__ = (
+        Index("ix_order_transitions_order_no", "order_no", "id"),
+    )
+
+
+class IdempotencyKeyModel(Base):
+    """下单幂等键：键对应的第一次响应，有效期内的重试直接返回（见 idempotency.py）"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)  # 用户ID:幂等键
+    fingerprint = Column(String(64), nullable=False)  # 请求体指纹
+    status_code = Column(Integer, nullable=False)
+    body = Column(Text, nullable=False)  # 响应JSON
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+
+class PdfPageManifestModel(Base):
+    """PDF菜谱页面清单：每页内容的哈希和提取出的文本，重新导入时未变化的页面不再提取"""
+    __tablename__ = "pdf_page_manifest"
+
+    source = Column(String(500), primary_key=True)  # PDF文件绝对路径
+    page_no = Column(Integer, primary_key=True)  # 页码（从0开始）
+    content_hash = Column(String(64), nullable=False)  # 页面内容流字节的哈希
+    text = Column(Text)  # 提取出的页面文本
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class PdfDishManifestModel(Base):
+    """PDF菜谱菜品清单：每个菜品制作说明的哈希，重新导入时只更新内容变化的菜品"""
+    __tablename__ = "pdf_dish_manifest"
+
+    source = Column(String(500), primary_key=True)
+    dish_name = Column(String(100), primary_key=True)
+    content_hash = Column(String(64), nullable=False)  # cooking_instructions 的哈希
+    dish_id = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
 
 class UserModel(Base):
@@ -62,15 +140,75 @@ class UserModel(Base):
 
 
 # 数据库连接
-DATABASE_URL = "sqlite:///./cook_applet.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def create_db_engine(url: str = DATABASE_URL, pool_size: int = 1, read_only: bool = False):
+    """
+    创建数据库引擎，SQLite 连接建立时应用调优参数
+
+    :param url: 数据库地址
+    :param pool_size: 连接池大小（不允许溢出，超出时排队等待）
+    :param read_only: 是否为只读连接（写操作会直接报错）
+    :return: Engine
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_size=pool_size, max_overflow=0, pool_pre_ping=True)
+
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return engine
+
+
+# 单写者：写连接池只有一个连接，所有写事务在这里排队，避免 database is locked
+engine = create_db_engine(pool_size=1)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 多读者：WAL 模式下只读连接可与写连接并发
+read_engine = create_db_engine(pool_size=DB_READ_THREADS, read_only=True)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 
 def init_database():
     """初始化数据库（创建所有表）"""
     Base.metadata.create_all(bind=engine)
-    print("数据库表创建成功！")
+    _add_missing_columns()
+    logger.info("数据库表创建成功！")
+
+
+def _add_missing_columns():
+    """为已存在的旧表补充新增的列和索引（create_all 不会修改已有表）"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+                logger.info(f"数据表 {table.name} 已新增列: {column.name}")
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
 
 
 if __name__ == "__main__":
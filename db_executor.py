@@ -0,0 +1,156 @@
+"""
+数据库执行模块 - 把同步的 SQLAlchemy 操作放到线程池中执行
+写操作走单线程写入池（SQLite 同一时刻只允许一个写者），读操作走有界读取池，
+事件循环只负责等待结果，fsync 不再卡住其他请求和 WebSocket 推送
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from metrics import DB_OPERATION_SECONDS, EVENT_LOOP_LAG_SECONDS, SQLITE_COMMIT_SECONDS
+
+
+class _Timing:
+    """执行耗时统计（同时记录到 metrics 直方图）"""
+
+    def __init__(self, histogram=None, **labels):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        self._histogram = histogram
+        self._labels = labels
+
+    def record(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.last_ms = elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        if self._histogram is not None:
+            self._histogram.observe(elapsed_ms / 1000, **self._labels)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "last_ms": round(self.last_ms, 3),
+        }
+
+
+class DBExecutor:
+    """数据库操作执行器"""
+
+    def __init__(self, read_threads: int = 4, write_session_factory=None, read_session_factory=None):
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=read_threads, thread_name_prefix="db-reader")
+        self._write_session_factory = write_session_factory
+        self._read_session_factory = read_session_factory
+        self.write_timing = _Timing(DB_OPERATION_SECONDS, pool="write")
+        self.read_timing = _Timing(DB_OPERATION_SECONDS, pool="read")
+
+    async def write(self, fn: Callable, *args) -> Any:
+        """
+        在写入线程中执行 fn(session, *args)，成功后提交事务
+
+        :return: fn 的返回值（不要返回未加载的ORM对象，离开线程后不可再访问数据库）
+        """
+        return await self._submit(self._writer, self.write_timing,
+                                  self._in_session, self._write_factory(), fn, True, args)
+
+    async def read(self, fn: Callable, *args) -> Any:
+        """在读取线程中执行 fn(session, *args)，不提交事务"""
+        return await self._submit(self._readers, self.read_timing,
+                                  self._in_session, self._read_factory(), fn, False, args)
+
+    async def run_write(self, fn: Callable, *args) -> Any:
+        """在写入线程中执行自行管理会话的函数 fn(*args)"""
+        return await self._submit(self._writer, self.write_timing, fn, *args)
+
+    async def run_read(self, fn: Callable, *args) -> Any:
+        """在读取线程中执行自行管理会话的函数 fn(*args)"""
+        return await self._submit(self._readers, self.read_timing, fn, *args)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {"write": self.write_timing.snapshot(), "read": self.read_timing.snapshot()}
+
+    def shutdown(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+
+    async def _submit(self, pool: ThreadPoolExecutor, timing: _Timing, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, self._timed, timing, fn, args)
+
+    @staticmethod
+    def _timed(timing: _Timing, fn: Callable, args) -> Any:
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timing.record((time.perf_counter() - start) * 1000)
+
+    @staticmethod
+    def _in_session(session_factory, fn: Callable, commit: bool, args) -> Any:
+        db = session_factory()
+        try:
+            result = fn(db, *args)
+            if commit:
+                with SQLITE_COMMIT_SECONDS.time(source="executor"):
+                    db.commit()
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_factory(self):
+        if self._write_session_factory is None:
+            from database import SessionLocal
+            return SessionLocal
+        return self._write_session_factory
+
+    def _read_factory(self):
+        if self._read_session_factory is None:
+            from database import ReadSessionLocal
+            return ReadSessionLocal
+        return self._read_session_factory
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控
+    定时 sleep 固定间隔，实际醒来时间与预期的差值即为事件循环被阻塞的时长
+    """
+
+    def __init__(self, interval_ms: int = 100):
+        self.interval = interval_ms / 1000
+        self.timing = _Timing(EVENT_LOOP_LAG_SECONDS)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            self.timing.record(max(lag, 0.0) * 1000)
+
+    def stats(self) -> Dict[str, float]:
+        return self.timing.snapshot()
@@ -0,0 +1,164 @@
+"""
+事件总线模块 - 在多个 uvicorn worker 之间同步订单和菜品变更
+local  后端：进程内直接分发，单 worker 时使用
+sqlite 后端：事件追加写入 SQLite 日志表，每个 worker 轮询读取其他 worker 的事件，
+            无需 Redis 等外部服务
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from logger import get_logger
+
+logger = get_logger("event_bus")
+
+# 事件处理函数: handler(event_type, data, local)
+# local 为 True 表示事件由本进程发布（本地状态已更新），False 表示来自其他 worker
+EventHandler = Callable[[str, Dict, bool], None]
+
+
+class EventBus:
+    """事件总线基类（进程内分发）"""
+
+    def __init__(self):
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers: List[EventHandler] = []
+
+    def subscribe(self, handler: EventHandler):
+        """注册事件处理函数"""
+        self._handlers.append(handler)
+
+    def publish(self, event_type: str, data: Dict):
+        """发布事件，本进程的处理函数立即执行"""
+        self._dispatch(event_type, data, True)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def _dispatch(self, event_type: str, data: Dict, local: bool):
+        for handler in self._handlers:
+            try:
+                handler(event_type, data, local)
+            except Exception as e:
+                logger.exception(f"❌ 处理事件 {event_type} 失败: {e!r}")
+
+
+class LocalEventBus(EventBus):
+    """进程内事件总线"""
+
+
+class SQLiteJournalEventBus(EventBus):
+    """基于SQLite日志表的跨进程事件总线"""
+
+    def __init__(self, path: str, poll_interval_ms: int = 50, retention_seconds: int = 3600):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval_ms / 1000
+        self.retention_seconds = retention_seconds
+        self._outbox: List[tuple] = []
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def publish(self, event_type: str, data: Dict):
+        super().publish(event_type, data)
+        self._outbox.append((self.origin, event_type,
+                             json.dumps(data, ensure_ascii=False), time.time()))
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._open)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._task
+        self._task = None
+        # 最后一个轮询间隔内发布的事件也要写入日志，否则其他 worker 收不到
+        outbox, self._outbox = self._outbox, []
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._sync, outbox)
+        except Exception as e:
+            logger.error(f"❌ 关闭时写入事件日志失败，丢弃 {len(outbox)} 个事件: {e!r}")
+        self._conn.close()
+
+    def _open(self):
+        # 只在后台线程中使用该连接（同一时刻只有一个线程访问）
+        self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS event_journal ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, "
+            "type TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        # 只接收启动之后的事件，历史状态由数据库恢复
+        row = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM event_journal").fetchone()
+        self._last_id = row[0]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_prune = time.time()
+        while not self._stopping:
+            outbox, self._outbox = self._outbox, []
+            try:
+                remote = await loop.run_in_executor(None, self._sync, outbox)
+            except Exception as e:
+                logger.error(f"❌ 事件日志同步失败: {e!r}")
+                self._outbox[:0] = outbox
+                remote = []
+            for event_type, payload in remote:
+                self._dispatch(event_type, json.loads(payload), False)
+            if time.time() - last_prune > 60:
+                last_prune = time.time()
+                await loop.run_in_executor(None, self._prune)
+            await asyncio.sleep(self.poll_interval)
+
+    def _sync(self, outbox: List[tuple]):
+        """写入本进程的新事件，并读取其他进程的新事件"""
+        if outbox:
+            self._conn.executemany(
+                "INSERT INTO event_journal (origin, type, payload, created_at) VALUES (?, ?, ?, ?)",
+                outbox
+            )
+            self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT id, origin, type, payload FROM event_journal WHERE id > ? ORDER BY id",
+            (self._last_id,)
+        ).fetchall()
+        if rows:
+            self._last_id = rows[-1][0]
+        return [(event_type, payload) for _, origin, event_type, payload in rows
+                if origin != self.origin]
+
+    def _prune(self):
+        self._conn.execute("DELETE FROM event_journal WHERE created_at < ?",
+                           (time.time() - self.retention_seconds,))
+        self._conn.commit()
+
+
+def create_event_bus(backend: str = "local", **options) -> EventBus:
+    """
+    按配置创建事件总线
+
+    :param backend: local 或 sqlite
+    :param options: sqlite 后端的参数（path、poll_interval_ms、retention_seconds）
+    """
+    if backend == "local":
+        return LocalEventBus()
+    if backend == "sqlite":
+        return SQLiteJournalEventBus(**options)
+    raise ValueError(f"未知的事件总线后端: {backend}")
@@ -0,0 +1,229 @@
+"""
+幂等模块 - 下单请求的幂等键去重缓存
+小程序在弱网下重试 wx.request 时会带上同一个幂等键（Idempotency-Key 请求头或 idempotency_key 字段），
+服务端按键缓存第一次成功的响应字节，重试直接原样返回，不再生成新订单、不再通知后厨：
+- 内存中是按写入顺序排列的有序字典，超过有效期或超过条数上限时从最早的一端淘汰
+- 新写入的键由后台任务批量写入 idempotency_keys 表，启动时加载仍在有效期内的键，重启后去重依然有效
+- 同一个键配上内容不同的请求体视为客户端错误，不返回缓存的响应
+- 键按用户隔离（用户ID:幂等键），不同用户碰巧使用相同的键互不影响，也拿不到别人的订单
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from logger import get_logger
+
+logger = get_logger("idempotency")
+
+# 幂等键的最大长度（客户端一般使用 UUID 或 时间戳+随机串）
+MAX_KEY_LENGTH = 128
+# 请求体中的幂等键字段（不参与请求指纹计算）
+KEY_FIELD = "idempotency_key"
+
+
+class IdempotencyRecord(NamedTuple):
+    """一个幂等键对应的第一次响应"""
+    fingerprint: str  # 请求体指纹
+    status_code: int
+    body: bytes
+    created_at: float  # 时间戳（秒）
+    expires_at: float
+
+
+def normalize_key(value) -> Optional[str]:
+    """
+    校验并规范化幂等键
+
+    :return: 去掉首尾空白后的键；未提供时返回None
+    :raises ValueError: 键不是字符串、过长或包含不可见字符
+    """
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("幂等键必须是字符串")
+    key = value.strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise ValueError(f"幂等键不能超过 {MAX_KEY_LENGTH} 个字符且不能包含不可见字符")
+    return key
+
+
+def scoped_key(user_id, key: str) -> str:
+    """按用户隔离的缓存键"""
+    return f"{user_id}:{key}"
+
+
+def request_fingerprint(data: Dict) -> str:
+    """请求体指纹（字段顺序无关，不含幂等键字段）"""
+    canonical = json.dumps({k: v for k, v in data.items() if k != KEY_FIELD},
+                           ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class IdempotencyCache:
+    """幂等键缓存（只在事件循环中读写）"""
+
+    def __init__(self, ttl_seconds: int = 86400, max_entries: int = 10000,
+                 flush_interval_ms: int = 200, executor=None):
+        """
+        :param ttl_seconds: 幂等键的有效期（秒）
+        :param max_entries: 内存中最多保留的键数
+        :param flush_interval_ms: 写入数据库的间隔（毫秒）
+        :param executor: db_executor.DBExecutor，在其线程中读写；为None时使用默认线程池
+        """
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval_ms / 1000
+        self.executor = executor
+        # 键 -> 记录，按写入顺序排列：所有键的有效期相同，最早写入的也最早过期
+        self._records: "OrderedDict[str, IdempotencyRecord]" = OrderedDict()
+        # 等待写入数据库的键
+        self._pending: Dict[str, IdempotencyRecord] = {}
+        self.hits = 0
+        self.evicted = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[IdempotencyRecord]:
+        """查找仍在有效期内的记录"""
+        self._expire(now or time.time())
+        record = self._records.get(key)
+        if record is not None:
+            self.hits += 1
+        return record
+
+    def put(self, key: str, fingerprint: str, status_code: int, body: bytes,
+            now: Optional[float] = None, expires_at: Optional[float] = None,
+            persist: bool = True) -> IdempotencyRecord:
+        """
+        登记一个键的响应，O(1)且不做任何IO
+
+        :param expires_at: 过期时间戳；其他 worker 同步过来的记录沿用原来的过期时间
+        :param persist: 是否写入数据库（同步自其他 worker 的记录由原 worker 写入）
+        """
+        now = now or time.time()
+        record = IdempotencyRecord(fingerprint, status_code, body, now, expires_at or now + self.ttl)
+        self._records.pop(key, None)
+        self._records[key] = record
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+            self.evicted += 1
+        if persist:
+            self._pending[key] = record
+        return record
+
+    def _expire(self, now: float):
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record.expires_at > now:
+                break
+            del self._records[key]
+
+    async def load(self):
+        """加载数据库中仍在有效期内的键（启动时调用）"""
+        if self.executor is not None:
+            rows = await self.executor.run_read(load_idempotency_keys, datetime.now(), self.max_entries)
+        else:
+            rows = await asyncio.get_running_loop().run_in_executor(
+                None, load_idempotency_keys, datetime.now(), self.max_entries)
+        for key, record in rows:
+            self._records[key] = record
+        logger.info(f"已加载 {len(rows)} 个有效期内的幂等键")
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，并把剩余的键全部写入"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """把新登记的键作为一个批次写入，并删除数据库中已过期的键"""
+        if not self._pending:
+            return
+        batch = self._pending
+        self._pending = {}
+        entries = list(batch.items())
+        try:
+            if self.executor is not None:
+                await self.executor.run_write(write_idempotency_keys, entries, datetime.now())
+            else:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, write_idempotency_keys, entries, datetime.now())
+        except Exception as e:
+            logger.error(f"❌ 幂等键写入失败，稍后重试: {e}")
+            for key, record in batch.items():
+                self._pending.setdefault(key, record)
+
+
+def write_idempotency_keys(entries: List, now: datetime):
+    """插入或覆盖一批幂等键，同时清理过期的键（在工作线程中执行）"""
+    from database import SessionLocal, IdempotencyKeyModel
+
+    table = IdempotencyKeyModel.__table__
+    db = SessionLocal()
+    try:
+        db.execute(table.insert().prefix_with("OR REPLACE"), [
+            {"key": key, "fingerprint": record.fingerprint, "status_code": record.status_code,
+             "body": record.body.decode("utf-8"),
+             "created_at": datetime.fromtimestamp(record.created_at),
+             "expires_at": datetime.fromtimestamp(record.expires_at)}
+            for key, record in entries
+        ])
+        db.execute(table.delete().where(table.c.expires_at <= now))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def load_idempotency_keys(now: datetime, limit: int) -> List:
+    """读取未过期的键（最多 limit 个最新的），按写入顺序返回 [(键, 记录)]"""
+    from database import ReadSessionLocal, IdempotencyKeyModel
+
+    db = ReadSessionLocal()
+    try:
+        rows = (db.query(IdempotencyKeyModel)
+                .filter(IdempotencyKeyModel.expires_at > now)
+                .order_by(IdempotencyKeyModel.created_at.desc())
+                .limit(limit)
+                .all())
+        return [(row.key, IdempotencyRecord(row.fingerprint, row.status_code, row.body.encode("utf-8"),
+                                            row.created_at.timestamp(), row.expires_at.timestamp()))
+                for row in reversed(rows)]
+    finally:
+        db.close()
@@ -0,0 +1,265 @@
+"""
+菜品图片处理模块 - 图片本地化和缩略图
+新增或修改菜品时，把 image_url 指向的图片（http(s) 地址或 data: URL）下载到本地，
+按内容哈希命名，并在后台线程池中按宽度档位生成缩略图，菜单列表只需下载小图；
+生成缩略图依赖 Pillow，未安装时只保存原图
+
+菜品接口没有鉴权，下载 http(s) 图片时防止借服务器访问内网（SSRF）：
+建立连接时检查实际连接的IP，拒绝回环、内网、链路本地、保留等非公网地址（解析后再连接，不受DNS重绑定影响），
+不跟随重定向、不走环境变量中的代理，并可通过主机白名单进一步限制
+"""
+import asyncio
+import base64
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import re
+import socket
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from logger import get_logger
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时不生成缩略图
+    Image = None
+
+logger = get_logger("image_pipeline")
+
+# 本地图片文件名：内容哈希[_宽度].扩展名
+IMAGE_NAME_RE = re.compile(r'^[0-9a-f]{32}(?:_\d+)?\.(?:jpg|png|gif|webp)$')
+DATA_URL_RE = re.compile(r'^data:image/[\w.+-]+;base64,', re.IGNORECASE)
+
+# 文件头 -> 扩展名
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+
+# ==================== 安全下载 ====================
+
+def check_public_address(address: str):
+    """
+    检查是否为公网地址
+
+    :raises ValueError: 回环、内网、链路本地、保留、组播等地址
+    """
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    if not ip.is_global or ip.is_multicast:
+        raise ValueError(f"不允许访问非公网地址: {ip}")
+
+
+def _public_create_connection(address: Tuple[str, int], timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                              source_address=None) -> socket.socket:
+    """与 socket.create_connection 相同，但解析出的地址中有非公网地址时拒绝连接"""
+    host, port = address
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    for *_, sockaddr in infos:
+        check_public_address(sockaddr[0])
+    error: Optional[OSError] = None
+    for family, sock_type, proto, _, sockaddr in infos:
+        sock = socket.socket(family, sock_type, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            error = e
+            sock.close()
+    raise error or OSError(f"无法连接 {host}:{port}")
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_create_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_create_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        raise ValueError(f"图片地址发生了重定向，不予跟随: {newurl[:100]}")
+
+
+def _build_opener() -> urllib.request.OpenerDirector:
+    # ProxyHandler({}) 关闭环境变量中的代理，否则实际连接的是代理而不是图片服务器
+    return urllib.request.build_opener(urllib.request.ProxyHandler({}), _PublicHTTPHandler,
+                                       _PublicHTTPSHandler, _NoRedirectHandler)
+
+
+class ImageSet(NamedTuple):
+    """本地化后的图片"""
+    url: str  # 原图URL
+    thumbnails: Dict[str, str]  # 宽度 -> 缩略图URL（原图不比该档位宽时直接使用原图）
+
+
+def detect_extension(data: bytes) -> Optional[str]:
+    """根据文件头识别图片格式，不是支持的图片时返回None"""
+    for signature, ext in _SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class ImagePipeline:
+    """图片处理流水线（下载和缩放都在专用线程池中执行，不占用事件循环）"""
+
+    def __init__(self, image_dir: str, url_prefix: str = "/static/images",
+                 widths: Iterable[int] = (160, 320, 640), workers: int = 2,
+                 max_bytes: int = 10 * 1024 * 1024, fetch_timeout: float = 10.0,
+                 allowed_hosts: Iterable[str] = ()):
+        """
+        :param image_dir: 图片存储目录
+        :param url_prefix: 图片对外的URL前缀
+        :param widths: 缩略图宽度档位（像素）
+        :param workers: 后台线程数
+        :param max_bytes: 单张原图最大字节数
+        :param fetch_timeout: 下载超时（秒）
+        :param allowed_hosts: 允许下载的主机（含其子域名）；为空时允许任意公网主机
+        """
+        self.image_dir = image_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.widths = tuple(sorted(widths))
+        self.max_bytes = max_bytes
+        self.fetch_timeout = fetch_timeout
+        self.allowed_hosts = tuple(host.lower().strip(".") for host in allowed_hosts)
+        self._opener = _build_opener()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+        if Image is None:
+            logger.warning("未安装 Pillow，菜品图片只保存原图，不生成缩略图")
+
+    def is_local(self, url: Optional[str]) -> bool:
+        """是否已经是本地化后的图片"""
+        return bool(url) and url.startswith(self.url_prefix + "/")
+
+    def path_for(self, name: str) -> Optional[str]:
+        """图片文件名对应的本地路径（文件名不合法时返回None，防止路径穿越）"""
+        if not IMAGE_NAME_RE.match(name):
+            return None
+        return os.path.join(self.image_dir, name)
+
+    async def ingest(self, source_url: str) -> ImageSet:
+        """
+        下载并本地化图片、生成缩略图
+
+        :param source_url: http(s) 地址或 data: URL
+        :raises ValueError: 地址不支持、内容过大或不是图片
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._ingest_sync, source_url)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def _ingest_sync(self, source_url: str) -> ImageSet:
+        data = self._fetch(source_url)
+        ext = detect_extension(data)
+        if ext is None:
+            raise ValueError("不是支持的图片格式（PNG/JPEG/GIF/WebP）")
+        # 内容相同的图片只保存一份，重复提交同一张图不会重复处理
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        os.makedirs(self.image_dir, exist_ok=True)
+        name = f"{digest}.{ext}"
+        self._write(name, data)
+        original_url = f"{self.url_prefix}/{name}"
+        return ImageSet(original_url, self._thumbnails(data, digest, original_url))
+
+    def _fetch(self, source_url: str) -> bytes:
+        if DATA_URL_RE.match(source_url):
+            data = base64.b64decode(source_url.split(",", 1)[1], validate=False)
+        elif source_url.startswith(("http://", "https://")):
+            self._check_host(source_url)
+            try:
+                with self._opener.open(source_url, timeout=self.fetch_timeout) as response:
+                    data = response.read(self.max_bytes + 1)
+            except urllib.error.HTTPError as e:
+                raise ValueError(f"下载图片失败: HTTP {e.code}")
+        else:
+            raise ValueError(f"不支持的图片地址: {source_url[:100]}")
+        if len(data) > self.max_bytes:
+            raise ValueError(f"图片超过 {self.max_bytes} 字节")
+        return data
+
+    def _check_host(self, source_url: str):
+        """主机白名单检查（是否为公网地址在建立连接时检查）"""
+        host = (urllib.parse.urlsplit(source_url).hostname or "").lower().strip(".")
+        if not host:
+            raise ValueError(f"不支持的图片地址: {source_url[:100]}")
+        if self.allowed_hosts and not any(host == allowed or host.endswith("." + allowed)
+                                          for allowed in self.allowed_hosts):
+            raise ValueError(f"不允许从该主机下载图片: {host}")
+
+    def _write(self, name: str, data: bytes):
+        path = os.path.join(self.image_dir, name)
+        if os.path.exists(path):
+            return
+        # 先写临时文件再改名，读取方不会读到写了一半的图片；
+        # 临时文件名唯一，同一张图被并发提交时各写各的，改名时以后完成的为准（内容相同）
+        fd, tmp_path = tempfile.mkstemp(dir=self.image_dir, prefix=name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _thumbnails(self, data: bytes, digest: str, original_url: str) -> Dict[str, str]:
+        if Image is None or not self.widths:
+            return {}
+        thumbnails = {}
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            has_alpha = image.mode in ("RGBA", "LA", "P")
+            for width in self.widths:
+                if image.width <= width:
+                    thumbnails[str(width)] = original_url
+                    continue
+                ext = "png" if has_alpha else "jpg"
+                name = f"{digest}_{width}.{ext}"
+                if not os.path.exists(os.path.join(self.image_dir, name)):
+                    resized = image.copy()
+                    resized.thumbnail((width, width * 10))
+                    buffer = io.BytesIO()
+                    if has_alpha:
+                        resized.save(buffer, "PNG", optimize=True)
+                    else:
+                        resized.convert("RGB").save(buffer, "JPEG", quality=80, optimize=True, progressive=True)
+                    self._write(name, buffer.getvalue())
+                thumbnails[str(width)] = f"{self.url_prefix}/{name}"
+        return thumbnails
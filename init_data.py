@@ -2,6 +2,7 @@
 数据初始化脚本 - 创建示例菜品数据
 """
 from database import SessionLocal, DishModel, init_database
+from recipe_parser import parse_recipe, recipe_columns
 
 
 def create_sample_dishes():
@@ -189,7 +190,7 @@ def create_sample_dishes():
         # 检查是否已存在
         existing = db.query(DishModel).filter(DishModel.name == dish_data["name"]).first()
         if not existing:
-            dish = DishModel(**dish_data)
+            dish = DishModel(**dish_data, **recipe_columns(parse_recipe(dish_data["cooking_instructions"])))
             db.add(dish)
     
     db.commit()
@@ -0,0 +1,140 @@
+"""
+后厨看板模块 - 按菜品汇总"现在要做什么"
+维护每个菜品在待接单/已接单/制作中三种状态下的份数，订单每次新增或状态变更时
+只对该订单的订单项做增减，不重新扫描全部订单；
+变更的菜品先记为脏数据，由后台任务按固定间隔合并成一条推送
+"""
+import asyncio
+from typing import Callable, Dict, List, Optional, Set
+
+# 看板统计的订单状态（其余状态的订单不占用后厨）
+BOARD_STATUSES = ("pending", "accepted", "preparing")
+
+# 菜品信息查询函数：dish_id -> 菜品对象（不存在时返回None）
+DishLookup = Callable[[int], Optional[object]]
+
+
+def _status_value(status) -> Optional[str]:
+    """订单状态统一转为字符串值（枚举和字符串混用时字典键才一致）"""
+    if status is None:
+        return None
+    return getattr(status, "value", status)
+
+
+class KitchenBoard:
+    """后厨看板"""
+
+    def __init__(self, dish_lookup: DishLookup, push_interval_ms: int = 200):
+        """
+        :param dish_lookup: 按菜品ID查询菜品（用于附带制作说明）
+        :param push_interval_ms: 推送合并间隔（毫秒）
+        """
+        self.dish_lookup = dish_lookup
+        self.push_interval = push_interval_ms / 1000
+        # 菜品ID -> {"dish_name", "pending", "accepted", "preparing"}
+        self._counts: Dict[int, Dict] = {}
+        self.version = 0
+        # 自上次推送以来份数变化的菜品、新出现在看板上的菜品
+        self._dirty: Set[int] = set()
+        self._entered: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def on_order_change(self, order, old_status, new_status):
+        """
+        订单仓库的变更回调：订单新增时 old_status 为None，移除时 new_status 为None
+        """
+        old_status, new_status = _status_value(old_status), _status_value(new_status)
+        if old_status == new_status:
+            return
+        for item in order.items:
+            if old_status in BOARD_STATUSES:
+                self._add(item, old_status, -item.quantity)
+            if new_status in BOARD_STATUSES:
+                self._add(item, new_status, item.quantity)
+
+    def _add(self, item, status: str, quantity: int):
+        entry = self._counts.get(item.dish_id)
+        if entry is None:
+            entry = self._counts[item.dish_id] = {
+                "dish_name": item.dish_name, "pending": 0, "accepted": 0, "preparing": 0
+            }
+            self._entered.add(item.dish_id)
+        entry[status] += quantity
+        self._dirty.add(item.dish_id)
+        self.version += 1
+
+    def snapshot(self) -> Dict:
+        """完整看板，每个菜品的制作说明只在 dishes 中出现一次"""
+        dish_ids = [dish_id for dish_id, entry in self._counts.items() if self._total(entry)]
+        return {
+            "type": "kitchen_snapshot",
+            "version": self.version,
+            "items": self._items(dish_ids),
+            "dishes": self._dish_info(dish_ids),
+        }
+
+    def drain(self) -> Optional[Dict]:
+        """
+        取出自上次调用以来的增量（没有变化时返回None）
+        份数归零的菜品以全0条目下发后从看板移除，再次出现时重新附带制作说明
+        """
+        if not self._dirty:
+            return None
+        dirty, entered = self._dirty, self._entered
+        self._dirty, self._entered = set(), set()
+        items = self._items(dirty)
+        for dish_id in dirty:
+            if not self._total(self._counts[dish_id]):
+                del self._counts[dish_id]
+        return {
+            "type": "kitchen_update",
+            "version": self.version,
+            "items": items,
+            "dishes": self._dish_info([dish_id for dish_id in entered if dish_id in self._counts]),
+        }
+
+    async def start(self, push: Callable[[Dict], None]):
+        """启动合并推送任务，push(message) 负责把消息发给后厨连接"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(push))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, push: Callable[[Dict], None]):
+        while True:
+            await asyncio.sleep(self.push_interval)
+            message = self.drain()
+            if message is not None:
+                push(message)
+
+    @staticmethod
+    def _total(entry: Dict) -> int:
+        return entry["pending"] + entry["accepted"] + entry["preparing"]
+
+    def _items(self, dish_ids) -> List[Dict]:
+        items = []
+        for dish_id in dish_ids:
+            entry = self._counts[dish_id]
+            items.append({"dish_id": dish_id, **entry, "total": self._total(entry)})
+        # 制作中的排在最前，其次是已接单份数多的
+        items.sort(key=lambda item: (-item["preparing"], -item["accepted"], -item["total"], item["dish_id"]))
+        return items
+
+    def _dish_info(self, dish_ids) -> Dict[int, Dict]:
+        info = {}
+        for dish_id in dish_ids:
+            dish = self.dish_lookup(dish_id)
+            if dish is not None:
+                info[dish_id] = {
+                    "name": dish.name,
+                    "description": dish.description,
+                    "cooking_instructions": dish.cooking_instructions,
+                }
+        return info
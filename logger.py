@@ -0,0 +1,71 @@
+"""
+日志模块 - 非阻塞的队列日志
+业务代码只把日志记录放进内存队列，由后台线程负责格式化后写到标准输出，
+事件循环不会因为终端或管道写入变慢而被卡住
+"""
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import LOG_LEVEL
+
+# 本项目所有日志都挂在这个根日志器下，不影响 uvicorn 等第三方库自己的日志配置
+ROOT_LOGGER_NAME = "cook_applet"
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    入队前只合并消息参数，时间、级别和异常堆栈的格式化都留给后台线程
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level: str = LOG_LEVEL):
+    """安装队列日志（重复调用无副作用）"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    root.propagate = False
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """停止后台线程，并输出队列中剩余的日志"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    获取模块日志器
+
+    :param name: 模块名，日志中显示为 cook_applet.<name>
+    """
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
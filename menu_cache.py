@@ -0,0 +1,128 @@
+"""
+菜单快照模块 - 预序列化的菜单 JSON 缓存
+菜单只在商家增删改菜品时变化，每次变化重建一次快照（版本号递增），
+用户端请求直接返回缓存的字节串，并支持 ETag / If-None-Match 协商缓存；
+同时维护菜品ID -> (名称, 价格(分), 是否可售) 的价格表，下单时按它计价和校验
+"""
+import hashlib
+import json
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+# (响应体, ETag)
+CachedBody = Tuple[bytes, str]
+
+
+class PriceEntry(NamedTuple):
+    """价格表条目"""
+    name: str
+    price_cents: int
+    is_available: bool
+
+
+def to_cents(price) -> int:
+    """金额（元）转为整数分，按十进制四舍五入，避免 28.1 * 100 这类浮点误差"""
+    return int(Decimal(str(price)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents: int) -> float:
+    """整数分转为金额（元）"""
+    return cents / 100
+
+
+def _make_etag(body: bytes) -> str:
+    """根据内容生成强ETag（内容相同则ETag相同，跨重启和多进程一致）"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中当前ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+class MenuSnapshot:
+    """菜单快照"""
+
+    def __init__(self):
+        self.version = 0
+        self.dishes: CachedBody = (b"[]", _make_etag(b"[]"))
+        empty_categories = encode_categories([])
+        self.categories: CachedBody = (empty_categories, _make_etag(empty_categories))
+        self._dish_bodies: Dict[int, CachedBody] = {}
+        self.prices: Dict[int, PriceEntry] = {}
+        # 菜品ID -> (菜品对象, 列表中的编码, 详情缓存)；菜品对象没被替换就直接复用上次的编码
+        self._encoded: Dict[int, Tuple[object, str, CachedBody]] = {}
+
+    def rebuild(self, dishes: Iterable, encode_dish: Callable[[object], str],
+                encode_detail: Optional[Callable[[object], str]] = None):
+        """
+        重建菜单快照（仅在菜品变更时调用）
+        菜品更新时会替换为新对象，未被替换的菜品复用上次的JSON和ETag，只重新编码变化的菜品
+
+        :param dishes: 全部菜品
+        :param encode_dish: 把单个菜品编码为列表中的JSON字符串的函数
+        :param encode_detail: 菜品详情的编码函数（详情比列表多带字段时使用），默认与列表相同
+        """
+        dish_bodies = {}
+        prices = {}
+        encoded_cache = {}
+        parts = []
+        categories = {}
+        for dish in dishes:
+            categories.setdefault(dish.category, None)
+            prices[dish.id] = PriceEntry(dish.name, to_cents(dish.price), bool(dish.is_available))
+            if not dish.is_available:
+                continue
+            cached = self._encoded.get(dish.id)
+            if cached is None or cached[0] is not dish:
+                encoded = encode_dish(dish)
+                body = (encode_detail(dish) if encode_detail else encoded).encode("utf-8")
+                cached = (dish, encoded, (body, _make_etag(body)))
+            encoded_cache[dish.id] = cached
+            parts.append(cached[1])
+            dish_bodies[dish.id] = cached[2]
+
+        dishes_body = ("[" + ",".join(parts) + "]").encode("utf-8")
+        categories_body = encode_categories(list(categories))
+
+        # 整体替换引用，读请求不会看到半成品
+        self._dish_bodies = dish_bodies
+        self._encoded = encoded_cache
+        self.prices = prices
+        self.dishes = (dishes_body, _make_etag(dishes_body))
+        self.categories = (categories_body, _make_etag(categories_body))
+        self.version += 1
+
+    def encoded_dish(self, dish_id: int) -> Optional[str]:
+        """获取可用菜品在列表中的JSON（用于拼接搜索结果等其他响应），不存在或已下架时返回None"""
+        cached = self._encoded.get(dish_id)
+        return cached[1] if cached else None
+
+    def get_dish(self, dish_id: int) -> Optional[CachedBody]:
+        """获取单个可用菜品的缓存，不存在或已下架时返回None"""
+        return self._dish_bodies.get(dish_id)
+
+    def respond(self, request: Request, cached: CachedBody) -> Response:
+        """返回缓存内容，ETag命中时返回304且不带响应体"""
+        body, etag = cached
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "X-Menu-Version": str(self.version),
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def encode_categories(categories) -> bytes:
+    """编码分类列表"""
+    return json.dumps({"categories": categories}, ensure_ascii=False).encode("utf-8")
@@ -78,7 +78,20 @@ Page({
         wx.showLoading({ title: '加载中...' })
       }
       
-      const orders = await api.getOrders()
+      // 首次加载和手动刷新拉取全部订单，自动刷新只拉取游标之后的变更
+      const incremental = silent && this.ordersEpoch
+      const changes = incremental
+        ? await api.getOrderChanges(this.ordersCursor, this.ordersEpoch)
+        : await api.getOrderChanges(0)
+      if (!incremental || changes.reset) {
+        this.ordersById = {}
+      }
+      changes.orders.forEach(order => {
+        this.ordersById[order.id] = order
+      })
+      this.ordersCursor = changes.cursor
+      this.ordersEpoch = changes.epoch
+      const orders = Object.values(this.ordersById)
       
       // 按创建时间倒序
       orders.sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
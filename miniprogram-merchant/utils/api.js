@@ -55,6 +55,12 @@ export function getOrders(status = null) {
   return request(url)
 }
 
+// 增量获取订单变更（since 为上次返回的 cursor，epoch 用于识别服务重启）
+export function getOrderChanges(since = 0, epoch = null) {
+  const query = epoch ? `since=${since}&epoch=${epoch}` : `since=${since}`
+  return request(`/api/merchant/orders/changes?${query}`)
+}
+
 // 获取订单详情（包含制作说明）
 export function getOrderDetail(orderId) {
   return request(`/api/merchant/orders/${orderId}`)
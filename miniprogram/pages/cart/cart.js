@@ -120,10 +120,17 @@ Page({
       note: this.data.note || null
     }
 
+    // 上次提交失败后原样再次提交时沿用同一个幂等键，避免上次其实已经下单成功而重复下单
+    const payload = JSON.stringify(orderData)
+    if (!this.pendingSubmit || this.pendingSubmit.payload !== payload) {
+      this.pendingSubmit = { payload, key: api.createIdempotencyKey() }
+    }
+
     try {
       wx.showLoading({ title: '提交中...' })
-      const order = await api.createOrder(orderData)
+      const order = await api.createOrder(orderData, this.pendingSubmit.key)
       wx.hideLoading()
+      this.pendingSubmit = null
 
       // 清空收藏
       this.setData({ cart: [], note: '' })
@@ -114,14 +114,21 @@ Page({
   },
 
   // 查看菜品详情
-  viewDishDetail(e) {
+  async viewDishDetail(e) {
     const dish = e.currentTarget.dataset.dish
     
     // 构建详情内容
     let content = `${dish.description || '暂无描述'}\n\n价格：¥${dish.price}`
     
-    if (dish.cooking_instructions) {
-      content += `\n\n制作方式：\n${dish.cooking_instructions}`
+    // 制作方式来自菜品详情中的结构化菜谱
+    try {
+      const detail = await api.getDish(dish.id)
+      const recipe = this.formatRecipe(detail.recipe)
+      if (recipe) {
+        content += `\n\n制作方式：\n${recipe}`
+      }
+    } catch (error) {
+      console.error('加载菜谱失败:', error)
     }
     
     wx.showModal({
@@ -137,6 +144,23 @@ Page({
     })
   },
 
+  // 结构化菜谱转为展示文本
+  formatRecipe(recipe) {
+    if (!recipe) return ''
+    const sections = []
+    if (recipe.ingredients && recipe.ingredients.length) {
+      sections.push('食材：' + recipe.ingredients
+        .map(item => item.quantity ? `${item.name} ${item.quantity}` : item.name).join('、'))
+    }
+    if (recipe.steps && recipe.steps.length) {
+      sections.push(recipe.steps.map((step, i) => `${i + 1}. ${step}`).join('\n'))
+    }
+    if (recipe.tips && recipe.tips.length) {
+      sections.push('小贴士：' + recipe.tips.join('；'))
+    }
+    return sections.join('\n')
+  },
+
   // 显示购物车弹窗
   showCart() {
     if (this.data.cart.length === 0) {
@@ -6,7 +6,14 @@ const API_BASE = 'http://yxcmqx.top:8000'
 
 console.log('当前API地址:', API_BASE)
 
+// 生成幂等键：同一次下单的所有重试使用同一个键，服务端只会创建一次订单
+function createIdempotencyKey() {
+  const random = Math.random().toString(36).slice(2, 10)
+  return `${Date.now().toString(36)}-${random}-${Math.random().toString(36).slice(2, 10)}`
+}
+
 // 封装请求方法
+// options.retries: 网络错误或服务端5xx时的重试次数（只用于带幂等键、可以安全重试的请求）
 function request(url, options = {}) {
   return new Promise((resolve, reject) => {
     wx.showLoading({
@@ -14,7 +21,19 @@ function request(url, options = {}) {
       mask: true
     })
 
-    wx.request({
+    let retriesLeft = options.retries || 0
+    const retryOrFail = (onFail) => {
+      if (retriesLeft > 0) {
+        const delay = 1000 * Math.pow(2, (options.retries || 0) - retriesLeft)
+        retriesLeft -= 1
+        setTimeout(send, delay)
+        return
+      }
+      wx.hideLoading()
+      onFail()
+    }
+
+    const send = () => wx.request({
       url: API_BASE + url,
       method: options.method || 'GET',
       data: options.data || {},
@@ -25,6 +44,16 @@ function request(url, options = {}) {
         ...options.header
       },
       success: (res) => {
+        if (res.statusCode >= 500) {
+          retryOrFail(() => {
+            wx.showToast({
+              title: '请求失败',
+              icon: 'none'
+            })
+            reject(res)
+          })
+          return
+        }
         wx.hideLoading()
         if (res.statusCode === 200) {
           // 检查是否是HTML（ngrok警告页）
@@ -48,16 +77,19 @@ function request(url, options = {}) {
         }
       },
       fail: (err) => {
-        wx.hideLoading()
         console.error('请求失败详情:', err)
-        wx.showToast({
-          title: `网络错误: ${err.errMsg}`,
-          icon: 'none',
-          duration: 3000
+        retryOrFail(() => {
+          wx.showToast({
+            title: `网络错误: ${err.errMsg}`,
+            icon: 'none',
+            duration: 3000
+          })
+          reject(err)
         })
-        reject(err)
       }
     })
+
+    send()
   })
 }
 
@@ -73,14 +105,19 @@ module.exports = {
     return request(`/api/user/dishes/${dishId}`)
   },
 
-  // 创建订单
-  createOrder: (orderData) => {
+  // 创建订单（弱网下自动重试，所有重试带同一个幂等键；调用方自己重新提交时可传入上次的 idempotencyKey）
+  createOrder: (orderData, idempotencyKey) => {
+    const key = idempotencyKey || orderData.idempotency_key || createIdempotencyKey()
     return request('/api/user/orders', {
       method: 'POST',
-      data: orderData
+      data: { ...orderData, idempotency_key: key },
+      header: { 'Idempotency-Key': key },
+      retries: 2
     })
   },
 
+  createIdempotencyKey,
+
   // 获取用户订单列表
   getUserOrders: (userId) => {
     return request(`/api/user/orders/${userId}`)
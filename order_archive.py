@@ -0,0 +1,401 @@
+"""
+订单归档模块 - 分层保留历史订单
+已结束的订单在内存中保留一段时间后移出（数据库中仍有），
+更早的已结束订单再从数据库移入按天压缩的归档文件；
+查询依次读取 内存 → SQLite → 归档文件，查询长时间范围的历史也不会让内存膨胀
+
+归档文件格式（orders-YYYY-MM-DD.jsonl.gz，按下单日期分文件）：
+gzip 压缩的 JSON Lines，第一行为文件头 {"format": "cook_applet.orders", "version": 1, "fields": [...]}，
+之后每行一个订单，按 fields 的顺序存为数组（不重复写字段名），
+订单项存为 [菜品ID, 菜名, 数量, 单价]，订单按 (下单时间, 订单号) 升序排列；
+各状态进入时间 status_times 存为 {状态: 时间}，较早的文件头中没有这个字段，读取时视为空
+
+每个归档文件旁有一个索引文件（orders-YYYY-MM-DD.index.json），记录当天每个用户各状态的订单数；
+按用户或状态分页时先查索引，当天没有匹配订单的文件不解压。索引中记录了归档文件的字节数，
+与归档文件不一致（写入中断或旧版本没有索引）时忽略索引，直接读取归档文件
+"""
+import asyncio
+import gzip
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from logger import get_logger
+from order_persistence import TERMINAL_STATUSES, row_to_dict
+
+logger = get_logger("order_archive")
+
+ARCHIVE_FORMAT = "cook_applet.orders"
+ARCHIVE_VERSION = 1
+ARCHIVE_FIELDS = ("id", "user_id", "user_name", "total_amount", "status", "items", "note",
+                  "created_at", "updated_at", "status_times")
+ARCHIVE_NAME_RE = re.compile(r'^orders-(\d{4}-\d{2}-\d{2})\.jsonl\.gz$')
+INDEX_FORMAT = "cook_applet.orders.index"
+
+# 订单号中的毫秒时间戳（ORD + 13位时间戳 + 随机数），用于定位归档文件
+ORDER_NO_RE = re.compile(r'^ORD(\d{13})')
+
+# (下单时间, 订单号)
+OrderKey = Tuple[datetime, str]
+
+
+def _order_key(order: Dict) -> OrderKey:
+    return order["created_at"], order["id"]
+
+
+def _encode_order(order: Dict) -> str:
+    row = []
+    for field in ARCHIVE_FIELDS:
+        if field == "status_times":
+            row.append({status: at.isoformat() for status, at in (order.get(field) or {}).items()})
+            continue
+        value = order[field]
+        if field == "items":
+            value = [[item["dish_id"], item["dish_name"], item["quantity"], item["price"]] for item in value]
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        row.append(value)
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode_order(fields: List[str], row: List) -> Dict:
+    order = dict(zip(fields, row))
+    order["items"] = [{"dish_id": item[0], "dish_name": item[1], "quantity": item[2], "price": item[3]}
+                      for item in order["items"]]
+    order["created_at"] = datetime.fromisoformat(order["created_at"])
+    order["updated_at"] = datetime.fromisoformat(order["updated_at"])
+    order["status_times"] = {status: datetime.fromisoformat(at)
+                             for status, at in (order.get("status_times") or {}).items()}
+    return order
+
+
+def _build_index(orders: Iterable[Dict]) -> Dict[str, Dict[str, int]]:
+    """用户 -> {状态: 订单数}"""
+    users: Dict[str, Dict[str, int]] = {}
+    for order in orders:
+        statuses = users.setdefault(order["user_id"], {})
+        statuses[order["status"]] = statuses.get(order["status"], 0) + 1
+    return users
+
+
+def _in_range(order: Dict, user_id: Optional[str], status: Optional[str],
+              before: Optional[OrderKey], after: Optional[OrderKey],
+              start: Optional[datetime], end: Optional[datetime]) -> bool:
+    key = _order_key(order)
+    return ((user_id is None or order["user_id"] == user_id)
+            and (status is None or order["status"] == status)
+            and (before is None or key < before)
+            and (after is None or key > after)
+            and (start is None or key[0] >= start)
+            and (end is None or key[0] <= end))
+
+
+class OrderArchive:
+    """
+    按天分文件的订单归档（文件读写会阻塞，应在线程池中调用）
+    最近读取过的几天的订单缓存在内存中，文件被重写后自动失效
+    """
+
+    def __init__(self, directory: str, cache_days: int = 8):
+        """
+        :param directory: 归档目录
+        :param cache_days: 内存中最多缓存多少天的订单
+        """
+        self.directory = directory
+        self.cache_days = cache_days
+        # 日期 -> (文件修改时间, 当天订单)；读取线程和写入线程都会访问，需要加锁
+        self._cache: "OrderedDict[date, Tuple[float, List[Dict]]]" = OrderedDict()
+        # 日期 -> (索引文件修改时间, 索引)；索引很小，全部缓存
+        self._index_cache: Dict[date, Tuple[float, Optional[Dict]]] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, day: date) -> str:
+        return os.path.join(self.directory, f"orders-{day.isoformat()}.jsonl.gz")
+
+    def index_path_for(self, day: date) -> str:
+        return os.path.join(self.directory, f"orders-{day.isoformat()}.index.json")
+
+    def days(self) -> List[date]:
+        """已归档的日期（升序）"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        days = []
+        for name in names:
+            match = ARCHIVE_NAME_RE.match(name)
+            if match:
+                days.append(date.fromisoformat(match.group(1)))
+        return sorted(days)
+
+    def upper_bound(self) -> Optional[datetime]:
+        """归档订单的下单时间一定早于这个时间；没有归档时返回None"""
+        days = self.days()
+        return datetime.combine(days[-1] + timedelta(days=1), datetime.min.time()) if days else None
+
+    def read_day(self, day: date) -> List[Dict]:
+        """读取某一天的全部归档订单（按下单时间升序）"""
+        path = self.path_for(day)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            cached = self._cache.get(day)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(day)
+                return cached[1]
+
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            header = json.loads(file.readline())
+            if header.get("format") != ARCHIVE_FORMAT or header.get("version") != ARCHIVE_VERSION:
+                raise ValueError(f"不支持的归档文件: {path}")
+            fields = header["fields"]
+            orders = [_decode_order(fields, json.loads(line)) for line in file if line.strip()]
+        with self._lock:
+            self._cache[day] = (mtime, orders)
+            self._cache.move_to_end(day)
+            while len(self._cache) > self.cache_days:
+                self._cache.popitem(last=False)
+        return orders
+
+    def read_index(self, day: date) -> Optional[Dict[str, Dict[str, int]]]:
+        """
+        读取某一天的索引（用户 -> {状态: 订单数}）
+
+        :return: 索引不存在、无法解析或与归档文件不一致时返回None
+        """
+        path = self.index_path_for(day)
+        try:
+            mtime = os.path.getmtime(path)
+            data_size = os.path.getsize(self.path_for(day))
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._index_cache.get(day)
+        if cached is None or cached[0] != mtime:
+            try:
+                with open(path, encoding="utf-8") as file:
+                    index = json.load(file)
+                if index.get("format") != INDEX_FORMAT or index.get("version") != ARCHIVE_VERSION:
+                    index = None
+            except (OSError, ValueError):
+                index = None
+            cached = (mtime, index)
+            with self._lock:
+                self._index_cache[day] = cached
+        index = cached[1]
+        if index is None or index.get("data_size") != data_size:
+            return None
+        return index["users"]
+
+    def may_contain(self, day: date, user_id: Optional[str] = None, status: Optional[str] = None) -> bool:
+        """某一天的归档文件中是否可能有该用户/状态的订单（没有可用索引时返回True）"""
+        if user_id is None and status is None:
+            return True
+        users = self.read_index(day)
+        if users is None:
+            return True
+        candidates = [users.get(user_id, {})] if user_id is not None else users.values()
+        return any(counts.get(status) if status is not None else counts for counts in candidates)
+
+    def write_day(self, day: date, orders: Iterable[Dict]):
+        """
+        把订单合并写入某一天的归档文件（同一订单以新写入的为准）
+        先写临时文件再替换，中途失败不会损坏已有归档
+        """
+        merged = {order["id"]: order for order in self.read_day(day)}
+        merged.update((order["id"], order) for order in orders)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(day)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        header = {"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "fields": list(ARCHIVE_FIELDS)}
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=9) as file:
+            file.write(json.dumps(header) + "\n")
+            for order in sorted(merged.values(), key=_order_key):
+                file.write(_encode_order(order) + "\n")
+        # 索引在归档文件替换后写入，中途中断时索引中的字节数对不上，查询会回退为读取归档文件
+        index = {"format": INDEX_FORMAT, "version": ARCHIVE_VERSION, "data_size": os.path.getsize(tmp_path),
+                 "users": _build_index(merged.values())}
+        os.replace(tmp_path, path)
+        index_path = self.index_path_for(day)
+        tmp_index_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_index_path, "w", encoding="utf-8") as file:
+            json.dump(index, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_index_path, index_path)
+        with self._lock:
+            self._cache.pop(day, None)
+            self._index_cache.pop(day, None)
+
+    def get(self, order_no: str) -> Optional[Dict]:
+        """按订单号查找归档订单（根据订单号中的时间戳定位到当天和次日的文件）"""
+        match = ORDER_NO_RE.match(order_no)
+        if not match:
+            return None
+        day = datetime.fromtimestamp(int(match.group(1)) / 1000).date()
+        for candidate in (day, day + timedelta(days=1)):
+            for order in self.read_day(candidate):
+                if order["id"] == order_no:
+                    return order
+        return None
+
+    def query_page(self, limit: int, user_id: Optional[str] = None, status: Optional[str] = None,
+                   before: Optional[OrderKey] = None, after: Optional[OrderKey] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> Tuple[List[Dict], bool]:
+        """
+        与 order_persistence.query_orders_page 相同语义的游标分页（结果按时间倒序）
+        只打开时间范围内、且索引显示有匹配订单的日期文件，凑够 limit + 1 条就停止
+
+        :return: (订单字典列表, 是否还有更多)
+        """
+        forward = after is not None and before is None
+        days = self.days()
+        low = max(filter(None, (start, after[0] if after else None)), default=None)
+        high = min(filter(None, (end, before[0] if before else None)), default=None)
+        days = [day for day in days
+                if (low is None or day >= low.date()) and (high is None or day <= high.date())]
+        if not forward:
+            days.reverse()
+
+        selected: List[Dict] = []
+        for day in days:
+            if not self.may_contain(day, user_id, status):
+                continue
+            orders = self.read_day(day)
+            for order in (orders if forward else reversed(orders)):
+                if _in_range(order, user_id, status, before, after, start, end):
+                    selected.append(order)
+                    if len(selected) > limit:
+                        break
+            if len(selected) > limit:
+                break
+        has_more = len(selected) > limit
+        selected = selected[:limit]
+        if forward:
+            selected.reverse()
+        return selected, has_more
+
+
+# ==================== 数据库 → 归档文件 ====================
+
+def archive_old_orders(archive: OrderArchive, cutoff: datetime, batch_size: int = 2000) -> int:
+    """
+    把下单时间早于 cutoff 的已结束订单从数据库移入归档文件（在工作线程中执行）
+    归档文件写完才提交删除；提交前中断时订单会同时存在于两处，查询时以数据库为准，下次归档会覆盖
+
+    :return: 本次移入归档的订单数（最多 batch_size 条，调用方可循环调用直到返回0）
+    """
+    from database import SessionLocal, OrderModel, OrderStatusEnum
+
+    terminal = [OrderStatusEnum(status) for status in TERMINAL_STATUSES]
+    db = SessionLocal()
+    try:
+        rows = (db.query(OrderModel)
+                .filter(OrderModel.status.in_(terminal), OrderModel.created_at < cutoff,
+                        OrderModel.order_no.isnot(None))
+                .order_by(OrderModel.created_at)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            return 0
+        by_day: Dict[date, List[Dict]] = {}
+        for row in rows:
+            by_day.setdefault(row.created_at.date(), []).append(row_to_dict(row))
+        # 先执行删除以取得 SQLite 写锁：多个 worker 同时归档时只有一个能继续写归档文件，
+        # 其余的在删除时失败回滚，不会互相覆盖同一天的文件
+        db.query(OrderModel).filter(OrderModel.id.in_([row.id for row in rows])
+                                    ).delete(synchronize_session=False)
+        for day, orders in by_day.items():
+            archive.write_day(day, orders)
+        db.commit()
+        return len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class OrderRetention:
+    """
+    订单保留策略的后台任务
+    按 retention_interval 把内存中超过保留时长的已结束订单移出，
+    按 archive_interval 把数据库中超过归档天数的已结束订单移入归档文件
+    """
+
+    def __init__(self, archive: OrderArchive, evict_hot: Callable[[datetime], int], executor,
+                 hot_retention_minutes: float = 60, archive_after_days: float = 30,
+                 retention_interval: float = 60, archive_interval: float = 3600, batch_size: int = 2000):
+        """
+        :param archive: 归档文件
+        :param evict_hot: evict_hot(cutoff) 移出内存中更新时间早于 cutoff 的已结束订单，返回移出数量
+        :param executor: db_executor.DBExecutor，归档在其写入线程中执行
+        :param hot_retention_minutes: 已结束订单在内存中保留的分钟数
+        :param archive_after_days: 已结束订单在数据库中保留的天数
+        :param retention_interval: 内存淘汰检查间隔（秒）
+        :param archive_interval: 归档检查间隔（秒）
+        :param batch_size: 每个归档事务处理的订单数
+        """
+        self.archive = archive
+        self.evict_hot = evict_hot
+        self.executor = executor
+        self.hot_retention = timedelta(minutes=hot_retention_minutes)
+        self.archive_after = timedelta(days=archive_after_days)
+        self.retention_interval = retention_interval
+        self.archive_interval = archive_interval
+        self.batch_size = batch_size
+        self.evicted = 0
+        self.archived = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        next_archive = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self.run_eviction()
+                if loop.time() >= next_archive:
+                    next_archive = loop.time() + self.archive_interval
+                    await self.run_archive()
+            except Exception as e:
+                logger.error(f"❌ 订单保留任务执行失败: {e}")
+            await asyncio.sleep(self.retention_interval)
+
+    def run_eviction(self) -> int:
+        """移出内存中超过保留时长的已结束订单"""
+        count = self.evict_hot(datetime.now() - self.hot_retention)
+        if count:
+            self.evicted += count
+            logger.info(f"已从内存移出 {count} 个已结束的订单")
+        return count
+
+    async def run_archive(self) -> int:
+        """把数据库中超过归档天数的已结束订单分批移入归档文件"""
+        cutoff = datetime.now() - self.archive_after
+        total = 0
+        while True:
+            count = await self.executor.run_write(archive_old_orders, self.archive, cutoff, self.batch_size)
+            total += count
+            if count < self.batch_size:
+                break
+        if total:
+            self.archived += total
+            logger.info(f"已归档 {total} 个 {cutoff:%Y-%m-%d} 之前的订单")
+        return total
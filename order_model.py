@@ -0,0 +1,209 @@
+"""
+订单模型 - 紧凑的订单内存表示
+一天的订单全部常驻内存时，每个订单的对象开销比订单内容本身还大，所以订单不再使用带 __dict__ 的 dataclass：
+- Order 使用 __slots__，金额存为整数分，时间存为整数微秒（与 order_store 的排序键一致），状态存为小整数
+- 每次状态变更追加一条 (状态, 时间) 打包记录，用于统计各状态的停留时长（见 analytics.py）
+- 订单项打包成一段 bytes（每项 菜品ID、数量、单价(分) 共20字节），菜名作为驻留字符串共享
+- created_at / items 等属性在访问时才转换为 datetime、OrderItem，JSON 由专用编码函数直接从紧凑字段生成
+对外的属性名和构造参数与原来的 dataclass 保持一致
+"""
+import struct
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from json.encoder import encode_basestring
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import serializer
+from menu_cache import from_cents, to_cents
+from order_store import from_microseconds, to_microseconds
+
+
+class OrderStatus(str, Enum):
+    """订单状态枚举"""
+    PENDING = "pending"  # 待接单（用户刚下单）
+    ACCEPTED = "accepted"  # 已接单（商家已接单）
+    PREPARING = "preparing"  # 制作中（商家正在制作）
+    COMPLETED = "completed"  # 已完成（制作完成）
+    CANCELLED = "cancelled"  # 已取消
+
+
+@dataclass
+class OrderItem:
+    """订单项模型"""
+    __slots__ = ("dish_id", "dish_name", "quantity", "price")
+    dish_id: int
+    dish_name: str
+    quantity: int
+    price: float
+
+
+# 状态编码表：编码 -> 状态；不在枚举中的状态字符串第一次出现时追加编码
+_STATUS_VALUES: List[Union[OrderStatus, str]] = list(OrderStatus)
+_STATUS_CODES: Dict[str, int] = {status.value: code for code, status in enumerate(_STATUS_VALUES)}
+
+# 订单项打包格式：菜品ID(int64)、数量(int32)、单价分(int64)
+ITEM_STRUCT = struct.Struct("<qiq")
+# 状态时间打包格式：状态编码(uint16)、进入该状态的时间微秒(int64)
+STATUS_TIME_STRUCT = struct.Struct("<Hq")
+
+# JSON 字段顺序（与原 dataclass 的字段顺序一致）
+ORDER_FIELDS = ("id", "user_id", "user_name", "total_amount", "status", "items",
+                "created_at", "updated_at", "note")
+
+
+def status_code(status) -> int:
+    """状态（枚举或字符串）转为编码"""
+    value = getattr(status, "value", status)
+    code = _STATUS_CODES.get(value)
+    if code is None:
+        code = _STATUS_CODES[value] = len(_STATUS_VALUES)
+        _STATUS_VALUES.append(sys.intern(value))
+    return code
+
+
+def status_value(code: int) -> str:
+    """编码转为状态字符串"""
+    status = _STATUS_VALUES[code]
+    return getattr(status, "value", status)
+
+
+def pack_items(items: Iterable) -> Tuple[Tuple[str, ...], bytes]:
+    """
+    打包订单项
+
+    :param items: OrderItem 或 {"dish_id", "dish_name", "quantity", "price"} 字典
+    :return: (菜名元组, 打包后的字节串)
+    """
+    names = []
+    packed = bytearray()
+    for item in items:
+        if isinstance(item, dict):
+            dish_id, dish_name, quantity, price = item["dish_id"], item["dish_name"], item["quantity"], item["price"]
+        else:
+            dish_id, dish_name, quantity, price = item.dish_id, item.dish_name, item.quantity, item.price
+        names.append(sys.intern(dish_name))
+        packed += ITEM_STRUCT.pack(dish_id, quantity, to_cents(price))
+    return tuple(names), bytes(packed)
+
+
+class Order:
+    """
+    订单模型
+
+    注意：订单状态必须通过 OrderStore.update_status 修改，直接给 order.status 赋值会导致状态索引失效
+    """
+    __slots__ = ("id", "user_id", "user_name", "note", "total_cents", "status_code",
+                 "created_us", "updated_us", "_item_names", "_item_data", "_status_times")
+
+    def __init__(self, id: str, user_id: str, user_name: str, total_amount: float, status,
+                 items: Iterable, created_at: datetime, updated_at: datetime, note: Optional[str] = None,
+                 status_times: Optional[Dict[str, datetime]] = None):
+        """
+        :param status_times: 已知的各状态进入时间 {状态: 时间}（从数据库或归档恢复时传入）
+        """
+        self.id = id
+        self.user_id = user_id
+        self.user_name = user_name
+        self.note = note
+        self.total_cents = to_cents(total_amount)
+        self.status_code = status_code(status)
+        self.created_us = to_microseconds(created_at)
+        self.updated_us = to_microseconds(updated_at)
+        self._item_names, self._item_data = pack_items(items)
+        self._status_times = b"".join(
+            STATUS_TIME_STRUCT.pack(status_code(entered), to_microseconds(at))
+            for entered, at in sorted((status_times or {}).items(), key=lambda entry: entry[1]))
+
+    @property
+    def total_amount(self) -> float:
+        return from_cents(self.total_cents)
+
+    @property
+    def status(self) -> Union[OrderStatus, str]:
+        return _STATUS_VALUES[self.status_code]
+
+    @status.setter
+    def status(self, value):
+        self.status_code = status_code(value)
+
+    @property
+    def created_at(self) -> datetime:
+        return from_microseconds(self.created_us)
+
+    @property
+    def updated_at(self) -> datetime:
+        return from_microseconds(self.updated_us)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        self.updated_us = to_microseconds(value)
+
+    def record_status(self, code: int, at_us: int):
+        """记下进入某个状态的时间（由 OrderStore.update_status 在状态变更时调用）"""
+        self._status_times += STATUS_TIME_STRUCT.pack(code, at_us)
+
+    def _logged_status_times(self) -> Iterator[Tuple[str, int]]:
+        for code, at in STATUS_TIME_STRUCT.iter_unpack(self._status_times):
+            status = _STATUS_VALUES[code]
+            yield getattr(status, "value", status), at
+
+    def status_times_us(self) -> Dict[str, int]:
+        """各状态的进入时间（微秒），同一状态多次进入时取最后一次；下单时间即进入 pending 的时间"""
+        times = {OrderStatus.PENDING.value: self.created_us}
+        times.update(self._logged_status_times())
+        return times
+
+    def status_times(self) -> Dict[str, datetime]:
+        """状态变更记录的各状态进入时间（用于持久化，不含下单时间）"""
+        return {status: from_microseconds(at) for status, at in self._logged_status_times()}
+
+    def iter_items(self) -> Iterator[Tuple[int, str, int, int]]:
+        """逐项产出 (菜品ID, 菜名, 数量, 单价分)，不创建 OrderItem 对象"""
+        for name, (dish_id, quantity, price_cents) in zip(self._item_names,
+                                                          ITEM_STRUCT.iter_unpack(self._item_data)):
+            yield dish_id, name, quantity, price_cents
+
+    @property
+    def items(self) -> List[OrderItem]:
+        """订单项（每次访问时解包）"""
+        return [OrderItem(dish_id, name, quantity, from_cents(price_cents))
+                for dish_id, name, quantity, price_cents in self.iter_items()]
+
+    def to_dict(self) -> Dict:
+        """转为与JSON结构相同的字典（订单项为字典，时间仍为 datetime）"""
+        data = {name: getattr(self, name) for name in ORDER_FIELDS}
+        data["items"] = [{"dish_id": dish_id, "dish_name": name, "quantity": quantity,
+                          "price": from_cents(price_cents)}
+                         for dish_id, name, quantity, price_cents in self.iter_items()]
+        return data
+
+    def __repr__(self) -> str:
+        return f"Order(id={self.id!r}, status={getattr(self.status, 'value', self.status)!r})"
+
+
+def _encode_str(value: Optional[str]) -> str:
+    return "null" if value is None else encode_basestring(value)
+
+
+def encode_order(order: Order) -> str:
+    """直接由紧凑字段生成订单JSON（与原 dataclass 的输出完全相同）"""
+    status = order.status
+    items = ",".join(
+        '{"dish_id":' + int.__repr__(dish_id) + ',"dish_name":' + encode_basestring(name)
+        + ',"quantity":' + int.__repr__(quantity) + ',"price":' + float.__repr__(from_cents(price_cents)) + "}"
+        for dish_id, name, quantity, price_cents in order.iter_items()
+    )
+    return ('{"id":' + _encode_str(order.id)
+            + ',"user_id":' + _encode_str(order.user_id)
+            + ',"user_name":' + _encode_str(order.user_name)
+            + ',"total_amount":' + float.__repr__(from_cents(order.total_cents))
+            + ',"status":' + encode_basestring(getattr(status, "value", status))
+            + ',"items":[' + items + "]"
+            + ',"created_at":"' + from_microseconds(order.created_us).isoformat() + '"'
+            + ',"updated_at":"' + from_microseconds(order.updated_us).isoformat() + '"'
+            + ',"note":' + _encode_str(order.note) + "}")
+
+
+serializer.register(Order, encode_order)
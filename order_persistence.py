@@ -0,0 +1,293 @@
+"""
+订单持久化模块 - 后台批量写入（write-behind）
+请求处理只把订单快照放进待写缓冲区，由后台任务按时间或数量攒批，
+在线程池中一次事务提交到 OrderModel 表，不阻塞事件循环
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Container, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_
+
+from logger import get_logger
+from metrics import SQLITE_COMMIT_SECONDS
+
+logger = get_logger("order_persistence")
+
+# 终态订单不需要在启动时恢复到内存
+TERMINAL_STATUSES = ("completed", "cancelled")
+
+# 状态 -> 记录进入该状态时间的列
+STATUS_TIME_COLUMNS = {
+    "accepted": "accepted_at",
+    "preparing": "preparing_at",
+    "completed": "completed_at",
+    "cancelled": "cancelled_at",
+}
+
+
+def order_to_record(order) -> Dict:
+    """提取订单当前状态的快照（订单项创建后不再修改，直接引用）"""
+    return {
+        "order_no": order.id,
+        "user_id": order.user_id,
+        "user_name": order.user_name,
+        "total_price": order.total_amount,
+        "status": getattr(order.status, "value", order.status),
+        "items": tuple(order.items),
+        "note": order.note,
+        "created_at": order.created_at,
+        "updated_at": order.updated_at,
+        "status_times": order.status_times(),
+    }
+
+
+def _items_to_json(items) -> str:
+    return json.dumps([
+        {"dish_id": item.dish_id, "dish_name": item.dish_name,
+         "quantity": item.quantity, "price": item.price}
+        for item in items
+    ], ensure_ascii=False)
+
+
+class OrderWriteBehind:
+    """订单后台批量写入器"""
+
+    def __init__(self, flush_interval_ms: int = 200, batch_size: int = 200, executor=None):
+        """
+        :param executor: db_executor.DBExecutor，批次在其写入线程中提交；为None时使用默认线程池
+        """
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.executor = executor
+        # 订单号 -> 最新快照；同一订单多次变更在一个批次内合并为一次写入
+        self._pending: Dict[str, Dict] = {}
+        # 正在提交的批次中的订单号
+        self._in_flight: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def is_pending(self, order_id: str) -> bool:
+        """订单是否还有未写入数据库（含正在提交）的变更"""
+        return order_id in self._pending or order_id in self._in_flight
+
+    def submit(self, order):
+        """登记订单的新状态，O(1)且不做任何IO"""
+        self._pending[order.id] = order_to_record(order)
+        if self._wakeup is not None and len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        """启动后台写入任务"""
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，并把剩余数据全部写入"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """把当前缓冲区作为一个批次提交"""
+        if not self._pending:
+            return
+        batch = list(self._pending.values())
+        self._pending = {}
+        self._in_flight = {record["order_no"] for record in batch}
+        try:
+            if self.executor is not None:
+                await self.executor.run_write(write_order_batch, batch)
+            else:
+                await asyncio.get_running_loop().run_in_executor(None, write_order_batch, batch)
+        except Exception as e:
+            logger.error(f"❌ 订单批量写入失败，稍后重试: {e}")
+            # 放回缓冲区，但不覆盖期间产生的更新快照
+            for record in batch:
+                self._pending.setdefault(record["order_no"], record)
+        finally:
+            self._in_flight = set()
+
+
+def write_order_batch(records: List[Dict]):
+    """在一个事务内插入或更新一批订单（在工作线程中执行）"""
+    from database import SessionLocal, OrderModel, OrderStatusEnum
+
+    db = SessionLocal()
+    try:
+        order_nos = [r["order_no"] for r in records]
+        existing = {
+            row.order_no: row
+            for row in db.query(OrderModel).filter(OrderModel.order_no.in_(order_nos))
+        }
+        for record in records:
+            try:
+                status = OrderStatusEnum(record["status"])
+            except ValueError:
+                logger.warning(f"⚠️ 订单 {record['order_no']} 状态非法，跳过持久化: {record['status']}")
+                continue
+            row = existing.get(record["order_no"])
+            if row is None:
+                row = OrderModel(order_no=record["order_no"], user_id=record["user_id"],
+                                 items=_items_to_json(record["items"]))
+                db.add(row)
+            row.user_name = record["user_name"]
+            row.total_price = record["total_price"]
+            row.status = status
+            row.note = record["note"]
+            row.created_at = record["created_at"]
+            row.updated_at = record["updated_at"]
+            for entered, at in record["status_times"].items():
+                column = STATUS_TIME_COLUMNS.get(entered)
+                if column is not None:
+                    setattr(row, column, at)
+        with SQLITE_COMMIT_SECONDS.time(source="order_batch"):
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def load_active_orders() -> List[Dict]:
+    """
+    读取所有未结束的订单（走 status 索引，启动耗时与历史订单量无关）
+
+    :return: 订单字典列表，items 已解析为字典列表
+    """
+    from database import ReadSessionLocal, OrderModel, OrderStatusEnum
+
+    active = [s for s in OrderStatusEnum if s.value not in TERMINAL_STATUSES]
+    db = ReadSessionLocal()
+    try:
+        rows = (db.query(OrderModel)
+                .filter(OrderModel.status.in_(active), OrderModel.order_no.isnot(None))
+                .order_by(OrderModel.created_at)
+                .all())
+        return [row_to_dict(row) for row in rows]
+    finally:
+        db.close()
+
+
+def load_order(order_no: str) -> Optional[Dict]:
+    """按订单号读取已持久化的订单，不存在时返回None"""
+    from database import ReadSessionLocal, OrderModel
+
+    db = ReadSessionLocal()
+    try:
+        row = db.query(OrderModel).filter(OrderModel.order_no == order_no).first()
+        return row_to_dict(row) if row is not None else None
+    finally:
+        db.close()
+
+
+def query_orders_page(limit: int, user_id: Optional[str] = None, status: Optional[str] = None,
+                      before: Optional[Tuple[datetime, str]] = None,
+                      after: Optional[Tuple[datetime, str]] = None,
+                      start: Optional[datetime] = None,
+                      end: Optional[datetime] = None,
+                      exclude: Optional[Container[str]] = None) -> Tuple[List[Dict], bool]:
+    """
+    按 (created_at, order_no) 游标分页查询已持久化的订单，走 created_at 相关索引，
+    翻到多深都只读取 limit + 1 行；结果按时间倒序
+
+    :param exclude: 跳过的订单号（内存中已有的订单，由内存层返回）；跳过后继续往后读，
+                    "是否还有更多"只统计其余的订单，不会因为重复的订单多翻出一个空页
+    :return: (订单字典列表, 是否还有更多)
+    """
+    from database import ReadSessionLocal, OrderModel, OrderStatusEnum
+
+    forward = after is not None and before is None
+    db = ReadSessionLocal()
+    try:
+        base = db.query(OrderModel).filter(OrderModel.order_no.isnot(None))
+        if user_id is not None:
+            base = base.filter(OrderModel.user_id == user_id)
+        if status is not None:
+            try:
+                base = base.filter(OrderModel.status == OrderStatusEnum(status))
+            except ValueError:
+                return [], False
+        if start is not None:
+            base = base.filter(OrderModel.created_at >= start)
+        if end is not None:
+            base = base.filter(OrderModel.created_at <= end)
+
+        orders: List[Dict] = []
+        has_more = False
+        while True:
+            query = base
+            if after is not None:
+                query = query.filter(or_(
+                    OrderModel.created_at > after[0],
+                    and_(OrderModel.created_at == after[0], OrderModel.order_no > after[1])
+                ))
+            if before is not None:
+                query = query.filter(or_(
+                    OrderModel.created_at < before[0],
+                    and_(OrderModel.created_at == before[0], OrderModel.order_no < before[1])
+                ))
+            if forward:
+                query = query.order_by(OrderModel.created_at, OrderModel.order_no)
+            else:
+                query = query.order_by(OrderModel.created_at.desc(), OrderModel.order_no.desc())
+            rows = query.limit(limit + 1).all()
+            for row in rows:
+                if exclude is not None and row.order_no in exclude:
+                    continue
+                if len(orders) == limit:
+                    has_more = True
+                    break
+                orders.append(row_to_dict(row))
+            if has_more or len(rows) <= limit:
+                break
+            # 这一批里有被跳过的订单，从最后一行之后继续读
+            last = (rows[-1].created_at, rows[-1].order_no)
+            if forward:
+                after = last
+            else:
+                before = last
+        if forward:
+            orders.reverse()
+        return orders, has_more
+    finally:
+        db.close()
+
+
+def row_to_dict(row) -> Dict:
+    return {
+        "id": row.order_no,
+        "user_id": row.user_id,
+        "user_name": row.user_name,
+        "total_amount": row.total_price,
+        "status": row.status.value,
+        "items": json.loads(row.items or "[]"),
+        "note": row.note,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "status_times": {status: getattr(row, column) for status, column in STATUS_TIME_COLUMNS.items()
+                         if getattr(row, column) is not None},
+    }
@@ -0,0 +1,243 @@
+"""
+订单状态机模块 - 表驱动的订单状态流转和流转日志
+所有状态变更都经过 OrderStateMachine：按流转表检查是否允许（整数编码查集合，O(1)），
+修改订单仓库中的状态，把 (订单号, 原状态, 新状态, 时间) 追加到定长环形缓冲区，
+再把本次的全部流转作为一个事件交给订阅者（持久化、WebSocket 推送）；
+环形缓冲区由后台任务定期批量写入 order_transitions 表，写满时覆盖最早未写入的记录
+"""
+import asyncio
+from array import array
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from logger import get_logger
+from order_model import OrderStatus, status_code, status_value
+from order_store import from_microseconds, to_microseconds
+
+logger = get_logger("order_state_machine")
+
+# 状态流转表：起始状态 -> 允许的目标状态
+TRANSITIONS: Dict[OrderStatus, Tuple[OrderStatus, ...]] = {
+    OrderStatus.PENDING: (OrderStatus.ACCEPTED, OrderStatus.CANCELLED),
+    OrderStatus.ACCEPTED: (OrderStatus.PREPARING, OrderStatus.CANCELLED),
+    OrderStatus.PREPARING: (OrderStatus.COMPLETED, OrderStatus.CANCELLED),
+    OrderStatus.COMPLETED: (),
+    OrderStatus.CANCELLED: (),
+}
+
+# 重复执行视为成功的目标状态：订单已处于该状态时调用方直接返回当前订单，不再流转、记录和通知
+IDEMPOTENT_TARGETS = frozenset({OrderStatus.CANCELLED})
+
+
+class InvalidTransition(ValueError):
+    """流转表不允许的状态变更"""
+
+    def __init__(self, order_id: str, from_status, to_status):
+        self.order_id = order_id
+        self.from_status = getattr(from_status, "value", from_status)
+        self.to_status = getattr(to_status, "value", to_status)
+        super().__init__(f"订单 {order_id} 状态不能从 {self.from_status} 变更为 {self.to_status}")
+
+
+class OrderTransition(NamedTuple):
+    """一次状态流转"""
+    order: object
+    from_status: str
+    to_status: str
+    at: datetime
+
+
+# 流转事件订阅者：listener(本次的全部流转)，批量操作的多笔流转合并为一次回调
+TransitionListener = Callable[[List[OrderTransition]], None]
+
+
+class TransitionLog:
+    """
+    流转日志的环形缓冲区（只在事件循环中读写）
+    每条记录占用订单号引用 + 两个状态编码 + 一个微秒时间戳，容量固定，追加不分配新的数组
+    """
+
+    def __init__(self, capacity: int = 4096, flush_interval_ms: int = 200, executor=None):
+        """
+        :param capacity: 缓冲区条数
+        :param flush_interval_ms: 写入数据库的间隔（毫秒）
+        :param executor: db_executor.DBExecutor，在其写入线程中提交；为None时使用默认线程池
+        """
+        self.capacity = capacity
+        self.flush_interval = flush_interval_ms / 1000
+        self.executor = executor
+        self._order_ids: List[Optional[str]] = [None] * capacity
+        self._from = array("H", [0]) * capacity
+        self._to = array("H", [0]) * capacity
+        self._at = array("q", [0]) * capacity
+        # 追加和已写入的总条数（单调递增），缓冲区中的位置为 序号 % capacity
+        self._appended = 0
+        self._flushed = 0
+        # 未写入就被覆盖的条数
+        self.dropped = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def pending_count(self) -> int:
+        return self._appended - self._flushed
+
+    def append(self, order_id: str, from_code: int, to_code: int, at_us: int):
+        if self._appended - self._flushed >= self.capacity:
+            self._flushed += 1
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"⚠️ 流转日志缓冲区已满，累计丢弃 {self.dropped} 条未写入的记录")
+        slot = self._appended % self.capacity
+        self._order_ids[slot] = order_id
+        self._from[slot] = from_code
+        self._to[slot] = to_code
+        self._at[slot] = at_us
+        self._appended += 1
+        if self._wakeup is not None and self.pending_count >= self.capacity // 2:
+            self._wakeup.set()
+
+    def _entries(self, start: int, end: int) -> List[Tuple[str, str, str, datetime]]:
+        entries = []
+        for sequence in range(start, end):
+            slot = sequence % self.capacity
+            entries.append((self._order_ids[slot], status_value(self._from[slot]),
+                            status_value(self._to[slot]), from_microseconds(self._at[slot])))
+        return entries
+
+    def pending_for(self, order_id: str) -> List[Tuple[str, str, str, datetime]]:
+        """某个订单尚未写入数据库的流转记录（按时间顺序）"""
+        return [entry for entry in self._entries(self._flushed, self._appended) if entry[0] == order_id]
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，并把剩余记录全部写入"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """把未写入的记录作为一个批次提交（失败时保留在缓冲区中下次重试）"""
+        start, end = self._flushed, self._appended
+        if start == end:
+            return
+        entries = self._entries(start, end)
+        try:
+            if self.executor is not None:
+                await self.executor.run_write(write_transitions, entries)
+            else:
+                await asyncio.get_running_loop().run_in_executor(None, write_transitions, entries)
+        except Exception as e:
+            logger.error(f"❌ 流转日志写入失败，稍后重试: {e}")
+            return
+        # 提交期间缓冲区写满时 _flushed 已经被推进
+        self._flushed = max(self._flushed, end)
+
+
+def write_transitions(entries: List[Tuple[str, str, str, datetime]]):
+    """批量插入流转记录（在工作线程中执行）"""
+    from database import SessionLocal, OrderTransitionModel
+
+    db = SessionLocal()
+    try:
+        db.execute(OrderTransitionModel.__table__.insert(), [
+            {"order_no": order_no, "from_status": from_status, "to_status": to_status, "created_at": at}
+            for order_no, from_status, to_status, at in entries
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def load_transitions(order_no: str) -> List[Tuple[str, str, str, datetime]]:
+    """读取订单已写入数据库的流转记录（按写入顺序）"""
+    from database import ReadSessionLocal, OrderTransitionModel
+
+    db = ReadSessionLocal()
+    try:
+        rows = (db.query(OrderTransitionModel)
+                .filter(OrderTransitionModel.order_no == order_no)
+                .order_by(OrderTransitionModel.id)
+                .all())
+        return [(row.order_no, row.from_status, row.to_status, row.created_at) for row in rows]
+    finally:
+        db.close()
+
+
+class OrderStateMachine:
+    """订单状态机（只在事件循环中调用）"""
+
+    def __init__(self, store, log: TransitionLog):
+        """
+        :param store: order_store.OrderStore
+        :param log: 流转日志
+        """
+        self.store = store
+        self.log = log
+        # 允许的 (起始状态编码, 目标状态编码)
+        self._allowed: Set[Tuple[int, int]] = {
+            (status_code(source), status_code(target))
+            for source, targets in TRANSITIONS.items() for target in targets
+        }
+        self._listeners: List[TransitionListener] = []
+
+    def subscribe(self, listener: TransitionListener):
+        self._listeners.append(listener)
+
+    def is_repeat(self, order, to_status) -> bool:
+        """订单是否已处于可重复执行的目标状态（如重复取消）"""
+        return to_status in IDEMPOTENT_TARGETS and order.status_code == status_code(to_status)
+
+    def can_transition(self, order, to_status) -> bool:
+        return (order.status_code, status_code(to_status)) in self._allowed
+
+    def transition(self, order, to_status: OrderStatus, at: Optional[datetime] = None,
+                   emit: bool = True) -> OrderTransition:
+        """
+        执行一次状态流转
+
+        :param to_status: 目标状态
+        :param at: 流转时间，默认为当前时间
+        :param emit: 是否立即通知订阅者；批量操作传 False，全部完成后调用 emit 一次性通知
+        :raises InvalidTransition: 流转表不允许时，订单保持不变
+        """
+        from_code, to_code = order.status_code, status_code(to_status)
+        if (from_code, to_code) not in self._allowed:
+            raise InvalidTransition(order.id, order.status, to_status)
+        at = at or datetime.now()
+        self.store.update_status(order, to_status, at)
+        self.log.append(order.id, from_code, to_code, to_microseconds(at))
+        transition = OrderTransition(order, status_value(from_code), status_value(to_code), at)
+        if emit:
+            self.emit([transition])
+        return transition
+
+    def emit(self, transitions: List[OrderTransition]):
+        """把一组流转作为一个事件通知订阅者"""
+        if not transitions:
+            return
+        for listener in self._listeners:
+            listener(transitions)
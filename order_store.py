@@ -0,0 +1,258 @@
+"""
+订单存储模块 - 带索引的内存订单仓库
+按订单号建立主索引，按用户ID和订单状态建立按下单时间排序的二级索引，
+查询和分页耗时只与结果数量相关，与历史订单总量无关；
+每次新增或变更订单都会分配递增的修订号，用于增量同步
+"""
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 订单变更回调: listener(order, old_status, new_status)，新增时 old_status 为None，移除时 new_status 为None
+OrderListener = Callable[[object, object, object], None]
+
+# 排序键：(下单时间的微秒时间戳, 订单号)，同一时间下单的订单按订单号排序
+SortKey = Tuple[int, str]
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_microseconds(value: datetime) -> int:
+    """datetime 转为整数微秒（精确整数运算，不经过浮点）"""
+    return (value - _EPOCH) // _ONE_MICROSECOND
+
+
+def from_microseconds(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def sort_key(order) -> SortKey:
+    # 紧凑订单（order_model.Order）直接保存了微秒时间戳，省去 datetime 转换
+    created_us = getattr(order, "created_us", None)
+    if created_us is None:
+        created_us = to_microseconds(order.created_at)
+    return created_us, order.id
+
+
+def encode_cursor(key: SortKey) -> str:
+    """分页游标：<下单时间微秒>:<订单号>"""
+    return f"{key[0]}:{key[1]}"
+
+
+def decode_cursor(cursor: str) -> SortKey:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    micros, order_id = cursor.split(":", 1)
+    return int(micros), order_id
+
+
+def page_keys(keys: List[SortKey], limit: int, before: Optional[SortKey] = None,
+              after: Optional[SortKey] = None, start: Optional[int] = None,
+              end: Optional[int] = None) -> Tuple[List[SortKey], bool]:
+    """
+    在升序排序键列表上做游标分页，结果按时间倒序（最新的在前）
+
+    :param before: 只返回早于该游标的订单（向更早翻页）
+    :param after: 只返回晚于该游标的订单（向更新翻页）
+    :param start: 下单时间下限（微秒，含）
+    :param end: 下单时间上限（微秒，含）
+    :return: (本页排序键, 是否还有更多)
+    """
+    lo, hi = 0, len(keys)
+    if start is not None:
+        lo = bisect_left(keys, (start, ""))
+    if end is not None:
+        hi = bisect_left(keys, (end + 1, ""))
+    if after is not None:
+        lo = max(lo, bisect_right(keys, after))
+    if before is not None:
+        hi = min(hi, bisect_left(keys, before))
+    if hi <= lo:
+        return [], False
+    if after is not None and before is None:
+        # 向更新翻页：取紧挨着游标的一段
+        selected = keys[lo:min(hi, lo + limit)]
+        has_more = lo + limit < hi
+    else:
+        selected = keys[max(lo, hi - limit):hi]
+        has_more = hi - limit > lo
+    selected.reverse()
+    return selected, has_more
+
+
+class OrderStore:
+    """
+    内存订单仓库
+
+    注意：订单状态必须通过 update_status 修改，直接给 order.status 赋值会导致状态索引失效
+    """
+
+    def __init__(self):
+        # 主索引：订单号 -> 订单
+        self._by_id: Dict[str, object] = {}
+        # 全部订单的排序键（升序）
+        self._sorted: List[SortKey] = []
+        # 二级索引：用户ID -> 排序键列表
+        self._by_user: Dict[str, List[SortKey]] = {}
+        # 二级索引：订单状态 -> 排序键列表
+        self._by_status: Dict[str, List[SortKey]] = {}
+        # 变更日志：订单号 -> 最后一次变更的修订号，按修订号升序排列
+        self._changes: "OrderedDict[str, int]" = OrderedDict()
+        self.revision = 0
+        # 进程启动标识，修订号只在同一个 epoch 内可比较
+        self.epoch = uuid.uuid4().hex[:12]
+        self._listeners: List[OrderListener] = []
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator:
+        return iter(self.all())
+
+    def __contains__(self, order_id) -> bool:
+        return order_id in self._by_id
+
+    def subscribe(self, listener: OrderListener):
+        """注册订单变更回调（用于维护后厨看板等增量统计）"""
+        self._listeners.append(listener)
+
+    def add(self, order):
+        """添加订单并写入全部索引"""
+        if order.id in self._by_id:
+            self.remove(order.id)
+        key = sort_key(order)
+        self._by_id[order.id] = order
+        self._insert(self._sorted, key)
+        self._insert(self._by_user.setdefault(order.user_id, []), key)
+        self._insert(self._by_status.setdefault(order.status, []), key)
+        self._touch(order.id)
+        self._notify(order, None, order.status)
+
+    def get(self, order_id: str):
+        """按订单号查找订单，不存在时返回None"""
+        return self._by_id.get(order_id)
+
+    def remove(self, order_id: str):
+        """移除订单并清理全部索引，返回被移除的订单"""
+        order = self._by_id.pop(order_id, None)
+        if order is None:
+            return None
+        key = sort_key(order)
+        self._delete(self._sorted, key)
+        self._discard(self._by_user, order.user_id, key)
+        self._discard(self._by_status, order.status, key)
+        self._changes.pop(order_id, None)
+        self._notify(order, order.status, None)
+        return order
+
+    def update_status(self, order, status, updated_at: Optional[datetime] = None):
+        """
+        修改订单状态并同步状态索引
+
+        :param order: 订单对象（必须已在仓库中）
+        :param status: 新状态
+        :param updated_at: 更新时间，默认为当前时间
+        :return: 修改前的状态
+        """
+        old_status = order.status
+        if old_status != status:
+            key = sort_key(order)
+            self._discard(self._by_status, old_status, key)
+            self._insert(self._by_status.setdefault(status, []), key)
+        order.status = status
+        order.updated_at = updated_at or datetime.now()
+        # 紧凑订单模型记录各状态的进入时间（见 order_model.Order.record_status）
+        record_status = getattr(order, "record_status", None)
+        if record_status is not None:
+            record_status(order.status_code, order.updated_us)
+        self._touch(order.id)
+        self._notify(order, old_status, status)
+        return old_status
+
+    def by_user(self, user_id: str) -> List:
+        """获取某个用户的全部订单（按下单时间升序）"""
+        return self._resolve(self._by_user.get(user_id, ()))
+
+    def by_status(self, status) -> List:
+        """获取某个状态下的全部订单（按下单时间升序）"""
+        return self._resolve(self._by_status.get(status, ()))
+
+    def count_by_status(self, status) -> int:
+        """统计某个状态下的订单数量"""
+        return len(self._by_status.get(status, ()))
+
+    def all(self) -> List:
+        """获取全部订单（按下单时间升序）"""
+        return self._resolve(self._sorted)
+
+    def page(self, limit: int, user_id: Optional[str] = None, status=None,
+             **bounds) -> Tuple[List, bool]:
+        """
+        游标分页查询（最新的在前），bounds 参数见 page_keys
+
+        :return: (本页订单, 是否还有更多)
+        """
+        if user_id is not None:
+            keys = self._by_user.get(user_id, [])
+            if status is not None:
+                keys = [key for key in keys if self._by_id[key[1]].status == status]
+        elif status is not None:
+            keys = self._by_status.get(status, [])
+        else:
+            keys = self._sorted
+        selected, has_more = page_keys(keys, limit, **bounds)
+        return self._resolve(selected), has_more
+
+    def changes_since(self, since: int) -> Tuple[List, int]:
+        """
+        获取修订号大于 since 的订单（新建或变更过的），耗时只与变更数量相关
+
+        :param since: 客户端上次拿到的修订号
+        :return: (按修订号升序的订单列表, 当前修订号)
+        """
+        changed = []
+        for order_id, revision in reversed(self._changes.items()):
+            if revision <= since:
+                break
+            changed.append(self._by_id[order_id])
+        changed.reverse()
+        return changed, self.revision
+
+    def _touch(self, order_id: str):
+        """为订单分配新的修订号并移到变更日志末尾"""
+        self.revision += 1
+        self._changes[order_id] = self.revision
+        self._changes.move_to_end(order_id)
+
+    def _notify(self, order, old_status, new_status):
+        for listener in self._listeners:
+            listener(order, old_status, new_status)
+
+    def _resolve(self, keys) -> List:
+        by_id = self._by_id
+        return [by_id[key[1]] for key in keys]
+
+    @staticmethod
+    def _insert(keys: List[SortKey], key: SortKey):
+        """插入排序键；新订单通常是最新的，直接追加"""
+        if not keys or keys[-1] < key:
+            keys.append(key)
+        else:
+            insort(keys, key)
+
+    @staticmethod
+    def _delete(keys: List[SortKey], key: SortKey):
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            del keys[index]
+
+    def _discard(self, index: Dict[str, List[SortKey]], bucket_key, key: SortKey):
+        """从二级索引中删除排序键，空桶一并删除"""
+        keys = index.get(bucket_key)
+        if keys is None:
+            return
+        self._delete(keys, key)
+        if not keys:
+            del index[bucket_key]
@@ -1,126 +1,447 @@
 """
 PDF解析模块 - 用于从PDF文件中提取菜品制作说明
+按页流式解析：页面文本在进程池中并行提取，菜品以【菜名】开头，
+一个菜品的内容跨页时会一直累积到下一个【】出现再输出，不会把整本书拼成一个大字符串；
+导入数据库时按清单表做增量：内容没变的页面直接复用上次提取的文本，
+制作说明没变的菜品不写库，导入完成后通知API刷新受影响的菜品
 """
-import PyPDF2
-from typing import List, Dict
+import argparse
+import hashlib
+import json
+import os
 import re
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+from config import BASE_URL
+from logger import get_logger
+from recipe_parser import parse_recipe, recipe_columns
+
+logger = get_logger("pdf_parser")
+
+# 预编译的正则（整本书解析时每页、每个菜品都要用到）
+DISH_HEADER_RE = re.compile(r'【(.+?)】')
+
+# 菜名的最大长度；页尾出现未闭合的【且后面不超过这个长度时，认为菜名被分页截断
+MAX_HEADER_LENGTH = 50
+
+# 每个进程一次提取的页数
+DEFAULT_CHUNK_PAGES = 16
+
+
+# ==================== 页面文本提取 ====================
+
+def count_pages(pdf_path: str) -> int:
+    """PDF总页数"""
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def content_hash(data) -> str:
+    """内容哈希（页面字节或菜品文本）"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _page_hash(page) -> str:
+    """页面内容流字节的哈希，计算代价远小于文本提取"""
+    contents = page.get_contents()
+    return content_hash(contents.get_data() if contents is not None else b"")
+
+
+def _extract_pages(pdf_path: str, start: int, end: int,
+                   known_hashes: Optional[List[Optional[str]]] = None) -> List[Tuple[str, Optional[str]]]:
+    """
+    提取 [start, end) 页的 (内容哈希, 文本)（在子进程中执行，每个进程自行打开文件）
+    哈希与 known_hashes 中对应页相同的页面不提取文本，返回的文本为None
+    """
+    results = []
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for offset, index in enumerate(range(start, end)):
+            page = reader.pages[index]
+            page_hash = _page_hash(page)
+            if known_hashes is not None and known_hashes[offset] == page_hash:
+                results.append((page_hash, None))
+            else:
+                results.append((page_hash, page.extract_text() or ""))
+    return results
+
+
+def iter_pages(pdf_path: str, workers: Optional[int] = None, chunk_pages: int = DEFAULT_CHUNK_PAGES,
+               known_hashes: Optional[Dict[int, str]] = None) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """
+    按页序依次产出 (页码, 内容哈希, 页面文本)，页码从0开始
+
+    :param workers: 提取进程数，默认为CPU核数；为1时在当前进程中顺序提取
+    :param chunk_pages: 每个任务提取的页数
+    :param known_hashes: 页码 -> 上次导入时的内容哈希；哈希未变的页面文本为None（由调用方复用缓存）
+    """
+    total = count_pages(pdf_path)
+    chunks = [(start, min(start + chunk_pages, total)) for start in range(0, total, chunk_pages)]
+
+    def task_args(chunk):
+        if known_hashes is None:
+            return (pdf_path, chunk[0], chunk[1])
+        return (pdf_path, chunk[0], chunk[1], [known_hashes.get(page) for page in range(*chunk)])
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            for offset, (page_hash, text) in enumerate(_extract_pages(*task_args(chunk))):
+                yield chunk[0] + offset, page_hash, text
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 最多同时提交 2 倍进程数的任务，按提交顺序取结果，内存中只保留这一小段页面
+        remaining = iter(chunks)
+        pending = deque()
+        for chunk in remaining:
+            pending.append((chunk[0], pool.submit(_extract_pages, *task_args(chunk))))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            start, future = pending.popleft()
+            results = future.result()
+            next_chunk = next(remaining, None)
+            if next_chunk is not None:
+                pending.append((next_chunk[0], pool.submit(_extract_pages, *task_args(next_chunk))))
+            for offset, (page_hash, text) in enumerate(results):
+                yield start + offset, page_hash, text
+
+
+# ==================== 菜品切分 ====================
+
+def build_dish(name: str, content: str, page: Optional[int] = None) -> Dict:
+    """由菜名和正文生成菜品信息"""
+    content = content.strip()
+    return {
+        'name': name.strip(),
+        'cooking_instructions': content,
+        'recipe': parse_recipe(content),
+        'page': page,
+    }
+
+
+class DishBlockSplitter:
+    """
+    流式菜品切分器：逐页喂入文本，每遇到下一个【菜名】就输出上一个完整菜品
+    第一个【】之前的文本（目录、前言等）会被丢弃
+    """
+
+    def __init__(self):
+        self._name: Optional[str] = None
+        self._parts: List[str] = []
+        self._start_page: Optional[int] = None
+        # 页尾被截断的【菜名（等下一页拼接后再匹配）
+        self._carry = ""
+        self._carry_page: Optional[int] = None
+
+    def feed(self, page: int, text: str) -> List[Dict]:
+        """喂入一页文本，返回本页内完整结束的菜品"""
+        carry, carry_page = self._carry, self._carry_page
+        buffer = carry + text if carry else text
+        self._carry, self._carry_page = "", None
+
+        dishes = []
+        position = 0
+        for match in DISH_HEADER_RE.finditer(buffer):
+            self._append(buffer[position:match.start()])
+            if self._name is not None:
+                dishes.append(self._close())
+            self._name = match.group(1)
+            self._start_page = carry_page if match.start() < len(carry) else page
+            position = match.end()
+
+        tail = buffer[position:]
+        bracket = tail.rfind('【')
+        if bracket != -1 and '】' not in tail[bracket:] and len(tail) - bracket <= MAX_HEADER_LENGTH:
+            self._carry = tail[bracket:]
+            self._carry_page = carry_page if position + bracket < len(carry) else page
+            tail = tail[:bracket]
+        self._append(tail)
+        return dishes
 
+    def finish(self) -> List[Dict]:
+        """文件结束，输出最后一个菜品"""
+        self._append(self._carry)
+        self._carry, self._carry_page = "", None
+        return [self._close()] if self._name is not None else []
 
-def parse_pdf_dishes(pdf_path: str) -> List[Dict]:
+    def _append(self, text: str):
+        if text and self._name is not None:
+            self._parts.append(text)
+
+    def _close(self) -> Dict:
+        dish = build_dish(self._name, "".join(self._parts), self._start_page)
+        self._name, self._parts, self._start_page = None, [], None
+        return dish
+
+
+def iter_dishes(pages: Iterable[Tuple[int, str]]) -> Iterator[Dict]:
+    """由 (页码, 文本) 流产出菜品"""
+    splitter = DishBlockSplitter()
+    for page, text in pages:
+        yield from splitter.feed(page, text)
+    yield from splitter.finish()
+
+
+def parse_pdf_dishes(pdf_path: str, workers: Optional[int] = None) -> List[Dict]:
     """
     从PDF文件中解析菜品信息
-    
+
     :param pdf_path: PDF文件路径
+    :param workers: 页面提取进程数
     :return: 菜品信息列表
     """
     dishes = []
-    
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            full_text = ""
-            
-            # 读取所有页面
-            for page in pdf_reader.pages:
-                full_text += page.extract_text()
-            
-            # 按照菜品分割（假设每个菜品以【】开头）
-            dish_blocks = re.split(r'【(.+?)】', full_text)
-            
-            for i in range(1, len(dish_blocks), 2):
-                if i + 1 < len(dish_blocks):
-                    dish_name = dish_blocks[i].strip()
-                    dish_content = dish_blocks[i + 1].strip()
-                    
-                    # 提取食材和步骤
-                    ingredients = extract_ingredients(dish_content)
-                    steps = extract_steps(dish_content)
-                    
-                    dishes.append({
-                        'name': dish_name,
-                        'cooking_instructions': dish_content,
-                        'ingredients': ingredients,
-                        'steps': steps
-                    })
-    
+        pages = ((page, text) for page, _, text in iter_pages(pdf_path, workers=workers))
+        for dish in iter_dishes(pages):
+            dishes.append(dish)
     except Exception as e:
-        print(f"解析PDF时出错: {e}")
-    
+        logger.error(f"解析PDF时出错: {e}")
     return dishes
 
 
-def extract_ingredients(text: str) -> List[str]:
-    """从文本中提取食材列表"""
-    ingredients = []
-    # 查找"食材："后的内容
-    match = re.search(r'食材[:：](.+?)(?:\n\n|步骤|制作)', text, re.DOTALL)
-    if match:
-        ingredient_text = match.group(1)
-        # 按行分割
-        ingredients = [line.strip() for line in ingredient_text.split('\n') if line.strip()]
-    return ingredients
-
-
-def extract_steps(text: str) -> List[str]:
-    """从文本中提取制作步骤"""
-    steps = []
-    # 查找"步骤："后的内容
-    match = re.search(r'步骤[:：](.+?)(?:\n\n|小贴士|$)', text, re.DOTALL)
-    if match:
-        steps_text = match.group(1)
-        # 提取编号步骤
-        step_matches = re.findall(r'\d+[\.、]\s*(.+)', steps_text)
-        steps = [step.strip() for step in step_matches]
-    return steps
-
-
-def import_dishes_to_database(pdf_path: str, category: str = "未分类"):
+# ==================== 导入数据库 ====================
+
+def _cached_pages(db, source: str, pages: Iterable[Tuple[int, str, Optional[str]]],
+                  group_size: int = 64) -> Iterator[Tuple[int, str, Optional[str], bool]]:
+    """
+    为未变化的页面补上清单表中缓存的文本，产出 (页码, 内容哈希, 文本, 是否重新提取)
+    缓存文本按组一次查询，避免逐页查库
     """
-    从PDF导入菜品到数据库
-    
+    from database import PdfPageManifestModel
+
+    buffer: List[Tuple[int, str, Optional[str]]] = []
+
+    def drain():
+        missing = [page for page, _, text in buffer if text is None]
+        cached = {}
+        if missing:
+            cached = dict(db.query(PdfPageManifestModel.page_no, PdfPageManifestModel.text)
+                          .filter(PdfPageManifestModel.source == source,
+                                  PdfPageManifestModel.page_no.in_(missing)))
+        for page, page_hash, text in buffer:
+            if text is None:
+                yield page, page_hash, cached.get(page) or "", False
+            else:
+                yield page, page_hash, text, True
+        buffer.clear()
+
+    for entry in pages:
+        buffer.append(entry)
+        if len(buffer) >= group_size:
+            yield from drain()
+    yield from drain()
+
+
+def import_dishes_to_database(pdf_path: str, category: str = "未分类", workers: Optional[int] = None,
+                              batch_size: int = 200, full: bool = False,
+                              notify_url: Optional[str] = f"{BASE_URL}/api/merchant/dishes/refresh"):
+    """
+    从PDF增量导入菜品到数据库
+
     :param pdf_path: PDF文件路径
-    :param category: 菜品分类
+    :param category: 新菜品的分类（已存在的菜品保留原分类）
+    :param workers: 页面提取进程数，默认为CPU核数
+    :param batch_size: 每处理多少页提交一次（页面清单和更新的菜品）
+    :param full: 忽略页面清单，重新提取全部页面
+    :param notify_url: 导入后通知API刷新菜品的地址，为None时不通知
+    :return: 新增、更新或改名的菜品ID列表
     """
-    from database import SessionLocal, DishModel
-    
-    dishes = parse_pdf_dishes(pdf_path)
+    from database import (SessionLocal, DishModel, PdfPageManifestModel, PdfDishManifestModel,
+                          init_database)
+
+    init_database()
+    source = os.path.abspath(pdf_path)
     db = SessionLocal()
-    
+    changed_ids: List[int] = []
+    stats = {"extracted": 0, "reused": 0, "inserted": 0, "updated": 0, "renamed": 0, "unchanged": 0}
+    started = time.perf_counter()
+
     try:
-        for dish_data in dishes:
-            # 检查菜品是否已存在
-            existing = db.query(DishModel).filter(DishModel.name == dish_data['name']).first()
-            if existing:
-                print(f"菜品 {dish_data['name']} 已存在，跳过")
+        known_hashes = None if full else dict(
+            db.query(PdfPageManifestModel.page_no, PdfPageManifestModel.content_hash)
+            .filter(PdfPageManifestModel.source == source))
+        dish_manifest = {row.dish_name: row for row in
+                         db.query(PdfDishManifestModel).filter(PdfDishManifestModel.source == source)}
+        # 已有菜名一次性读出，之后查重只查内存
+        existing = dict(db.query(DishModel.name, DishModel.id))
+        total_pages = count_pages(pdf_path)
+
+        seen = set()
+        page_rows: List[Dict] = []
+        dish_rows: Dict[str, Dict] = {}
+        # 数据库中还没有的菜名，等全书解析完、确认不是改名后再插入
+        new_dishes: List[Tuple[Dict, str]] = []
+
+        def save():
+            """写入本批页面清单、更新的菜品和菜品清单（一个事务）"""
+            if page_rows:
+                db.query(PdfPageManifestModel).filter(
+                    PdfPageManifestModel.source == source,
+                    PdfPageManifestModel.page_no.in_([row["page_no"] for row in page_rows])
+                ).delete(synchronize_session=False)
+                db.bulk_insert_mappings(PdfPageManifestModel, page_rows)
+                page_rows.clear()
+            _save_dish_manifest(db, source, dish_rows)
+            db.commit()
+
+        def collect(dish_data: Dict):
+            name = dish_data['name']
+            if not name or name in seen:
+                return
+            seen.add(name)
+            instructions_hash = content_hash(dish_data['cooking_instructions'])
+            manifest = dish_manifest.get(name)
+            if manifest is not None and manifest.content_hash == instructions_hash:
+                # 内容没变（商家手动删除的菜品也不会被重新导入）
+                stats["unchanged"] += 1
+                return
+            if name not in existing:
+                new_dishes.append((dish_data, instructions_hash))
+                return
+            # 菜名已存在但制作说明变了（或之前不是从这本书导入的）：只更新说明和描述
+            dish_id = existing[name]
+            db.bulk_update_mappings(DishModel, [{"id": dish_id, **_dish_fields(dish_data)}])
+            dish_rows[name] = {"dish_name": name, "content_hash": instructions_hash, "dish_id": dish_id}
+            changed_ids.append(dish_id)
+            stats["updated"] += 1
+
+        splitter = DishBlockSplitter()
+        pages = iter_pages(pdf_path, workers, known_hashes=known_hashes)
+        for page, page_hash, text, extracted in _cached_pages(db, source, pages):
+            for dish_data in splitter.feed(page, text):
+                collect(dish_data)
+            if extracted:
+                stats["extracted"] += 1
+                page_rows.append({"source": source, "page_no": page, "content_hash": page_hash, "text": text})
+            else:
+                stats["reused"] += 1
+            if (page + 1) % batch_size == 0:
+                save()
+                logger.info(f"已处理 {page + 1}/{total_pages} 页（重新提取 {stats['extracted']} 页），"
+                            f"{(page + 1) / (time.perf_counter() - started):.1f} 页/秒")
+        for dish_data in splitter.finish():
+            collect(dish_data)
+
+        # 书中已经不存在的旧菜名：如果有新菜名的制作说明与之完全相同，视为改名
+        removed = {row.content_hash: row for name, row in dish_manifest.items() if name not in seen}
+        inserts = []
+        for dish_data, instructions_hash in new_dishes:
+            name = dish_data['name']
+            old = removed.pop(instructions_hash, None)
+            if old is not None and old.dish_id is not None and old.dish_name in existing:
+                db.bulk_update_mappings(DishModel, [{"id": old.dish_id, "name": name}])
+                dish_rows[name] = {"dish_name": name, "content_hash": instructions_hash, "dish_id": old.dish_id}
+                changed_ids.append(old.dish_id)
+                stats["renamed"] += 1
                 continue
-            
-            dish = DishModel(
-                name=dish_data['name'],
-                price=0.0,  # 价格需要手动设置
-                description='、'.join(dish_data['ingredients'][:4]) if dish_data['ingredients'] else "",
-                cooking_instructions=dish_data['cooking_instructions'],
-                category=category,
-                is_available=True
-            )
-            db.add(dish)
-        
-        db.commit()
-        print(f"成功导入 {len(dishes)} 个菜品")
-    
+            inserts.append(({
+                'name': name,
+                'price': 0.0,  # 价格需要手动设置
+                'category': category,
+                'is_available': True,
+                **_dish_fields(dish_data),
+            }, instructions_hash))
+        # return_defaults 取回自增ID，写入菜品清单并通知API
+        if inserts:
+            db.bulk_insert_mappings(DishModel, [mapping for mapping, _ in inserts], return_defaults=True)
+        for mapping, instructions_hash in inserts:
+            dish_rows[mapping['name']] = {"dish_name": mapping['name'], "content_hash": instructions_hash,
+                                          "dish_id": mapping['id']}
+            changed_ids.append(mapping['id'])
+        stats["inserted"] = len(inserts)
+
+        # 清理已删除的页面和菜品的清单记录（菜品本身保留，由商家决定是否下架）
+        db.query(PdfPageManifestModel).filter(PdfPageManifestModel.source == source,
+                                              PdfPageManifestModel.page_no >= total_pages
+                                              ).delete(synchronize_session=False)
+        gone = [name for name in dish_manifest if name not in seen]
+        if gone:
+            db.query(PdfDishManifestModel).filter(PdfDishManifestModel.source == source,
+                                                  PdfDishManifestModel.dish_name.in_(gone)
+                                                  ).delete(synchronize_session=False)
+        save()
+        logger.info(f"导入完成：重新提取 {stats['extracted']} 页、复用 {stats['reused']} 页；"
+                    f"新增 {stats['inserted']} 个、更新 {stats['updated']} 个、改名 {stats['renamed']} 个、"
+                    f"未变化 {stats['unchanged']} 个菜品，耗时 {time.perf_counter() - started:.1f} 秒")
+
     except Exception as e:
         db.rollback()
-        print(f"导入失败: {e}")
-    
+        logger.error(f"导入失败（已提交的页面会被缓存，重新运行即可继续）: {e}")
+        return []
+
     finally:
         db.close()
 
+    if changed_ids and notify_url:
+        notify_api(notify_url, changed_ids)
+    return changed_ids
+
+
+def _dish_fields(dish_data: Dict) -> Dict:
+    """由解析结果生成菜品表中随PDF更新的字段（描述取前4种食材名）"""
+    recipe = dish_data['recipe']
+    ingredients = recipe['ingredients'] if recipe else []
+    return {
+        'description': '、'.join(item['name'] for item in ingredients[:4]),
+        'cooking_instructions': dish_data['cooking_instructions'],
+        **recipe_columns(recipe),
+    }
+
+
+def _save_dish_manifest(db, source: str, dish_rows: Dict[str, Dict]):
+    """覆盖写入菜品清单"""
+    from database import PdfDishManifestModel
+
+    if not dish_rows:
+        return
+    db.query(PdfDishManifestModel).filter(PdfDishManifestModel.source == source,
+                                          PdfDishManifestModel.dish_name.in_(list(dish_rows))
+                                          ).delete(synchronize_session=False)
+    db.bulk_insert_mappings(PdfDishManifestModel, [{"source": source, **row} for row in dish_rows.values()])
+    dish_rows.clear()
+
+
+def notify_api(url: str, dish_ids: List[int], timeout: float = 3.0) -> bool:
+    """
+    通知正在运行的API重新加载指定菜品（尽力而为，API未启动时只打印提示）
+
+    :return: 是否通知成功
+    """
+    request = urllib.request.Request(
+        url, data=json.dumps({"dish_ids": dish_ids}).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            logger.info(f"已通知API刷新 {len(dish_ids)} 个菜品（HTTP {response.status}）")
+            return True
+    except Exception as e:
+        logger.warning(f"⚠️ 通知API刷新菜品失败，可调用 {url} 或重启服务使其生效: {e}")
+        return False
+
 
 if __name__ == "__main__":
-    # 示例用法
-    import sys
-    if len(sys.argv) > 1:
-        pdf_file = sys.argv[1]
-        category = sys.argv[2] if len(sys.argv) > 2 else "未分类"
-        import_dishes_to_database(pdf_file, category)
-    else:
-        print("用法: python pdf_parser.py <pdf文件路径> [分类]")
+    parser = argparse.ArgumentParser(description="从PDF菜谱增量导入菜品")
+    parser.add_argument("pdf_file", help="pdf文件路径")
+    parser.add_argument("category", nargs="?", default="未分类", help="新菜品的分类")
+    parser.add_argument("--workers", type=int, default=None, help="页面提取进程数（默认CPU核数）")
+    parser.add_argument("--batch-size", type=int, default=200, help="每处理多少页提交一次")
+    parser.add_argument("--full", action="store_true", help="忽略页面清单，重新提取全部页面")
+    parser.add_argument("--api-url", default=f"{BASE_URL}/api/merchant/dishes/refresh",
+                        help="导入后通知刷新菜品的API地址")
+    parser.add_argument("--no-notify", action="store_true", help="导入后不通知API")
+    args = parser.parse_args()
+    import_dishes_to_database(args.pdf_file, args.category, workers=args.workers,
+                              batch_size=args.batch_size, full=args.full,
+                              notify_url=None if args.no_notify else args.api_url)
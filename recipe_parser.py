@@ -0,0 +1,119 @@
+"""
+菜谱解析模块 - 把制作说明解析为结构化菜谱
+识别 init_data.py 中的版式（📋 所需食材 / 👨‍🍳 制作步骤 / 💡 小贴士），
+也兼容PDF菜谱中不带图标的"食材：/步骤：/小贴士："写法。
+只在导入和编辑菜品时解析一次，结果存入菜品表的 recipe_* 列，接口直接返回，客户端无需再解析
+"""
+import json
+import re
+from typing import Dict, List, Optional
+
+# 段落标题：行首可以有图标等非文字字符，标题后面的冒号之后可以直接跟内容
+SECTION_RE = re.compile(r'^[^\w\n]*(所需食材|食材|制作步骤|步骤|小贴士)[ \t]*[:：][ \t]*', re.MULTILINE)
+# 行首的列表符号
+BULLET_RE = re.compile(r'^[•·●▪\-\*][ \t]*')
+# 编号步骤：1. / 1、 / 1) / 1．
+STEP_RE = re.compile(r'^(\d+)[ \t]*[\.、．\)）][ \t]*(.*)$')
+# 食材与用量：以空白分隔（鸡胸肉 300g、葱姜蒜 适量），或用量以数字开头紧跟在食材后（鸡蛋2个）
+SPACED_QUANTITY_RE = re.compile(r'^(.+?)[ \t　]+(\S+)$')
+ATTACHED_QUANTITY_RE = re.compile(r'^(\D+?)(\d\S*)$')
+
+SECTION_KEYS = {
+    "所需食材": "ingredients",
+    "食材": "ingredients",
+    "制作步骤": "steps",
+    "步骤": "steps",
+    "小贴士": "tips",
+}
+
+# 菜品表中保存结构化菜谱的列（JSON文本）
+RECIPE_COLUMNS = ("recipe_ingredients", "recipe_steps", "recipe_tips")
+
+
+def _lines(text: str) -> List[str]:
+    return [BULLET_RE.sub("", line.strip()) for line in text.splitlines() if line.strip()]
+
+
+def parse_ingredient(line: str) -> Dict[str, str]:
+    """
+    解析一行食材
+
+    :param line: 如"鸡胸肉 300g"、"鸡蛋2个"、"盐"
+    :return: {"name": 食材, "quantity": 用量（没有时为空字符串）}
+    """
+    match = SPACED_QUANTITY_RE.match(line) or ATTACHED_QUANTITY_RE.match(line)
+    if match:
+        return {"name": match.group(1).strip(), "quantity": match.group(2)}
+    return {"name": line, "quantity": ""}
+
+
+def parse_steps(lines: List[str]) -> List[str]:
+    """按编号合并步骤，没有编号的行视为上一步的续行（PDF中长步骤常被折行）"""
+    steps: List[str] = []
+    for line in lines:
+        match = STEP_RE.match(line)
+        if match:
+            steps.append(match.group(2).strip())
+        elif steps:
+            steps[-1] += line
+        else:
+            steps.append(line)
+    return [step for step in steps if step]
+
+
+def parse_recipe(text: Optional[str]) -> Optional[Dict]:
+    """
+    解析制作说明
+
+    :param text: 制作说明原文
+    :return: {"ingredients": [{"name", "quantity"}], "steps": [步骤], "tips": [贴士]}；
+             文本中没有任何可识别的段落时返回None
+    """
+    if not text:
+        return None
+    matches = list(SECTION_RE.finditer(text))
+    if not matches:
+        return None
+
+    sections: Dict[str, List[str]] = {"ingredients": [], "steps": [], "tips": []}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        sections[SECTION_KEYS[match.group(1)]].extend(_lines(text[match.end():end]))
+
+    return {
+        "ingredients": [parse_ingredient(line) for line in sections["ingredients"]],
+        "steps": parse_steps(sections["steps"]),
+        "tips": sections["tips"],
+    }
+
+
+def recipe_columns(recipe: Optional[Dict]) -> Dict[str, Optional[str]]:
+    """
+    生成菜品表 recipe_* 列的值
+
+    :param recipe: parse_recipe 的结果（为None时各列都为None）
+    :return: {"recipe_ingredients": JSON, "recipe_steps": JSON, "recipe_tips": JSON}
+    """
+    if recipe is None:
+        return dict.fromkeys(RECIPE_COLUMNS)
+    return {
+        "recipe_ingredients": _dumps(recipe["ingredients"]),
+        "recipe_steps": _dumps(recipe["steps"]),
+        "recipe_tips": _dumps(recipe["tips"]),
+    }
+
+
+def recipe_from_columns(ingredients: Optional[str], steps: Optional[str],
+                        tips: Optional[str]) -> Optional[Dict]:
+    """由菜品表中保存的三列还原结构化菜谱，三列都为空时返回None"""
+    if ingredients is None and steps is None and tips is None:
+        return None
+    return {
+        "ingredients": json.loads(ingredients) if ingredients else [],
+        "steps": json.loads(steps) if steps else [],
+        "tips": json.loads(tips) if tips else [],
+    }
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,245 @@
+"""
+菜品搜索模块 - 内存倒排索引
+对菜名、描述和食材建立倒排索引：中文按单字和相邻两字（bigram）切分，
+字母和数字按单词前缀切分，菜名额外索引拼音首字母（如 gbjd 匹配宫保鸡丁）。
+菜品变更时只重新索引被替换的菜品对象，分类计数随索引增减同步维护
+"""
+import re
+import unicodedata
+from bisect import bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 未安装 pypinyin 时使用 GB2312 区位表（覆盖一级常用汉字）
+    lazy_pinyin = None
+
+# 连续的汉字、连续的字母数字
+CJK_RUN_RE = re.compile(r'[㐀-䶿一-鿿]+')
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# 各字段的权重：菜名命中比描述和食材更相关
+NAME_WEIGHT = 3.0
+INGREDIENT_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 1.0
+# 查询词的权重：两字词比单字更能说明相关性
+BIGRAM_WEIGHT = 2.0
+UNIGRAM_WEIGHT = 1.0
+WORD_WEIGHT = 2.0
+
+# 单词和拼音首字母最多索引的前缀长度
+MAX_PREFIX_LENGTH = 12
+# 至少命中这个比例的查询词才算匹配（容忍个别错字）
+MIN_MATCH_RATIO = 0.5
+
+# GB2312 一级汉字按拼音排序，各声母的起始区位码
+_GB2312_INITIALS = (
+    (0xB0A1, "a"), (0xB0C5, "b"), (0xB2C1, "c"), (0xB4EE, "d"), (0xB6EA, "e"), (0xB7A2, "f"),
+    (0xB8C1, "g"), (0xB9FE, "h"), (0xBBF7, "j"), (0xBFA6, "k"), (0xC0AC, "l"), (0xC2E8, "m"),
+    (0xC4C3, "n"), (0xC5B6, "o"), (0xC5BE, "p"), (0xC6DA, "q"), (0xC8BB, "r"), (0xC8F6, "s"),
+    (0xCBFA, "t"), (0xCDDA, "w"), (0xCEF4, "x"), (0xD1B9, "y"), (0xD4D1, "z"),
+)
+_GB2312_CODES = [code for code, _ in _GB2312_INITIALS]
+_GB2312_LEVEL1_END = 0xD7F9
+
+
+def normalize(text: Optional[str]) -> str:
+    """全角转半角、统一小写"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def _char_initial(char: str) -> Optional[str]:
+    try:
+        code = int.from_bytes(char.encode("gb2312"), "big")
+    except UnicodeEncodeError:
+        return None
+    if code < _GB2312_CODES[0] or code > _GB2312_LEVEL1_END:
+        return None
+    return _GB2312_INITIALS[bisect_right(_GB2312_CODES, code) - 1][1]
+
+
+def pinyin_initials(text: str) -> str:
+    """
+    汉字串的拼音首字母（无法识别的字跳过）
+
+    :param text: 如"宫保鸡丁"
+    :return: 如"gbjd"
+    """
+    if lazy_pinyin is not None:
+        return "".join(initial for initial in lazy_pinyin(text, style=Style.FIRST_LETTER)
+                       if initial.isalpha() and initial.isascii())
+    return "".join(filter(None, (_char_initial(char) for char in text)))
+
+
+def _cjk_tokens(run: str) -> Iterable[Tuple[str, float]]:
+    for index, char in enumerate(run):
+        yield char, UNIGRAM_WEIGHT
+        if index + 1 < len(run):
+            yield run[index:index + 2], BIGRAM_WEIGHT
+
+
+def _prefixes(word: str) -> Iterable[str]:
+    return (word[:length] for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1))
+
+
+def index_tokens(text: str, pinyin: bool = False) -> Set[str]:
+    """
+    文档一侧的切分：汉字的单字和bigram、单词的全部前缀，可选拼音首字母的全部子串
+
+    :param text: 已 normalize 的文本
+    :param pinyin: 是否索引拼音首字母
+    """
+    tokens = set()
+    for run in CJK_RUN_RE.findall(text):
+        tokens.update(token for token, _ in _cjk_tokens(run))
+        if pinyin:
+            initials = pinyin_initials(run)[:MAX_PREFIX_LENGTH]
+            # 首字母的任意子串都可以命中（jd 也能搜到宫保鸡丁）
+            tokens.update("py:" + initials[start:end]
+                          for start in range(len(initials)) for end in range(start + 1, len(initials) + 1))
+    for word in WORD_RE.findall(text):
+        tokens.update("w:" + prefix for prefix in _prefixes(word))
+    return tokens
+
+
+def query_tokens(text: str) -> Dict[Tuple[str, ...], float]:
+    """
+    查询一侧的切分：每个查询词对应若干可命中的索引词（字母词既可以是单词前缀也可以是拼音首字母）
+
+    :return: {(可命中的索引词, ...): 查询词权重}
+    """
+    terms: Dict[Tuple[str, ...], float] = {}
+    for run in CJK_RUN_RE.findall(text):
+        for token, weight in _cjk_tokens(run):
+            terms[(token,)] = weight
+    for word in WORD_RE.findall(text):
+        word = word[:MAX_PREFIX_LENGTH]
+        terms[("w:" + word, "py:" + word)] = WORD_WEIGHT
+    return terms
+
+
+class _Document(NamedTuple):
+    """已索引的菜品"""
+    dish: object
+    category: str
+    tokens: Dict[str, float]
+
+
+class SearchResult(NamedTuple):
+    """搜索结果（items 为当前页菜品，facets 为全部命中菜品的分类计数）"""
+    total: int
+    items: List[object]
+    facets: Dict[str, int]
+
+
+class DishSearchIndex:
+    """菜品倒排索引（只索引可售菜品，只在事件循环中读写）"""
+
+    def __init__(self):
+        self._documents: Dict[int, _Document] = {}
+        # 索引词 -> {菜品ID: 该词在菜品中的最高字段权重}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # 分类 -> 可售菜品数（空查询直接用它作为分类计数）
+        self.category_counts: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def sync(self, dishes: Iterable):
+        """
+        与当前菜品列表同步：菜品更新时会替换为新对象，只重新索引被替换、新增和删除的菜品
+
+        :param dishes: 全部菜品
+        """
+        seen = set()
+        for dish in dishes:
+            if not dish.is_available:
+                continue
+            seen.add(dish.id)
+            document = self._documents.get(dish.id)
+            if document is None or document.dish is not dish:
+                self.add(dish)
+        for dish_id in [dish_id for dish_id in self._documents if dish_id not in seen]:
+            self.remove(dish_id)
+
+    def add(self, dish):
+        """索引菜品（已存在时先移除旧的索引）"""
+        self.remove(dish.id)
+        tokens: Dict[str, float] = {}
+        for text, weight, pinyin in self._fields(dish):
+            for token in index_tokens(normalize(text), pinyin):
+                if tokens.get(token, 0) < weight:
+                    tokens[token] = weight
+        for token, weight in tokens.items():
+            self._postings.setdefault(token, {})[dish.id] = weight
+        self._documents[dish.id] = _Document(dish, dish.category, tokens)
+        self.category_counts[dish.category] = self.category_counts.get(dish.category, 0) + 1
+
+    def remove(self, dish_id: int):
+        document = self._documents.pop(dish_id, None)
+        if document is None:
+            return
+        for token in document.tokens:
+            postings = self._postings[token]
+            del postings[dish_id]
+            if not postings:
+                del self._postings[token]
+        remaining = self.category_counts[document.category] - 1
+        if remaining:
+            self.category_counts[document.category] = remaining
+        else:
+            del self.category_counts[document.category]
+
+    @staticmethod
+    def _fields(dish) -> List[Tuple[str, float, bool]]:
+        fields = [(dish.name, NAME_WEIGHT, True), (dish.description, DESCRIPTION_WEIGHT, False)]
+        recipe = getattr(dish, "recipe", None)
+        if recipe:
+            fields.extend((item["name"], INGREDIENT_WEIGHT, False) for item in recipe["ingredients"])
+        return fields
+
+    def search(self, query: str, category: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> SearchResult:
+        """
+        搜索菜品
+
+        :param query: 查询文本，为空时按分类浏览全部菜品
+        :param category: 只返回该分类的菜品（facets 仍按全部分类统计）
+        :param limit: 每页条数
+        :param offset: 跳过的条数
+        :return: 按相关度排序的结果；相关度相同时菜名短的在前
+        """
+        terms = query_tokens(normalize(query))
+        if not terms:
+            documents = [document for document in self._documents.values()
+                         if category is None or document.category == category]
+            documents.sort(key=lambda document: document.dish.id)
+            return SearchResult(len(documents), [document.dish for document in documents[offset:offset + limit]],
+                                dict(self.category_counts))
+
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for alternatives, term_weight in terms.items():
+            best: Dict[int, float] = {}
+            for token in alternatives:
+                for dish_id, field_weight in self._postings.get(token, {}).items():
+                    if best.get(dish_id, 0) < field_weight:
+                        best[dish_id] = field_weight
+            for dish_id, field_weight in best.items():
+                scores[dish_id] = scores.get(dish_id, 0) + term_weight * field_weight
+                matched[dish_id] = matched.get(dish_id, 0) + 1
+
+        required = max(1, int(len(terms) * MIN_MATCH_RATIO + 0.5))
+        facets: Dict[str, int] = {}
+        hits = []
+        for dish_id, count in matched.items():
+            if count < required:
+                continue
+            document = self._documents[dish_id]
+            facets[document.category] = facets.get(document.category, 0) + 1
+            if category is None or document.category == category:
+                # 命中查询词的比例越高越相关
+                hits.append((-scores[dish_id] * count / len(terms), len(document.dish.name), dish_id))
+        hits.sort()
+        return SearchResult(len(hits), [self._documents[dish_id].dish for _, _, dish_id in hits[offset:offset + limit]],
+                            facets)
@@ -0,0 +1,170 @@
+"""
+JSON序列化模块 - 为 dataclass 预生成专用编码函数
+每个类只在第一次序列化时根据字段类型生成一次编码函数，之后直接拼接JSON文本，
+不再经过 asdict 深拷贝、datetime 递归转换和 jsonable_encoder 三次遍历
+"""
+import dataclasses
+import json
+import typing
+from datetime import date, datetime
+from enum import Enum
+from json.encoder import encode_basestring
+from typing import Any, Callable, Dict
+
+from fastapi import Response
+
+# 类型 -> 编码函数（返回JSON文本）
+_class_encoders: Dict[type, Callable[[Any], str]] = {}
+
+
+def register(cls: type, encoder: Callable[[Any], str]):
+    """为非 dataclass 的类注册自定义编码函数"""
+    _class_encoders[cls] = encoder
+
+
+def encode(obj: Any) -> str:
+    """把任意支持的对象编码为JSON文本"""
+    encoder = _class_encoders.get(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return _compile(type(obj))(obj)
+    return _encode_any(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """编码为UTF-8字节串"""
+    return encode(obj).encode("utf-8")
+
+
+def json_response(obj: Any, status_code: int = 200, headers: Dict[str, str] = None) -> Response:
+    """直接返回编码好的JSON，绕过 FastAPI 的通用编码流程"""
+    return Response(content=dumps(obj), status_code=status_code,
+                    media_type="application/json", headers=headers)
+
+
+# ==================== 基础类型编码 ====================
+
+def _encode_str(value) -> str:
+    return "null" if value is None else encode_basestring(value)
+
+
+def _encode_number(value) -> str:
+    value_type = type(value)
+    if value_type is float:
+        return float.__repr__(value)
+    if value_type is int:
+        return int.__repr__(value)
+    return _encode_any(value)
+
+
+def _encode_bool(value) -> str:
+    if value is None:
+        return "null"
+    return "true" if value else "false"
+
+
+def _encode_datetime(value) -> str:
+    return "null" if value is None else '"' + value.isoformat() + '"'
+
+
+def _encode_enum(value) -> str:
+    if value is None:
+        return "null"
+    return encode_basestring(value.value if isinstance(value, Enum) else value)
+
+
+def _encode_dict(value: dict) -> str:
+    return "{" + ",".join(
+        encode_basestring(key if isinstance(key, str) else str(key)) + ":" + encode(item)
+        for key, item in value.items()
+    ) + "}"
+
+
+def _encode_list(value) -> str:
+    return "[" + ",".join(map(encode, value)) + "]"
+
+
+_BASIC_ENCODERS: Dict[type, Callable[[Any], str]] = {
+    str: encode_basestring,
+    int: int.__repr__,
+    float: float.__repr__,
+    bool: _encode_bool,
+    type(None): lambda value: "null",
+    datetime: _encode_datetime,
+    date: _encode_datetime,
+    dict: _encode_dict,
+    list: _encode_list,
+    tuple: _encode_list,
+}
+
+
+def _encode_any(value) -> str:
+    """通用编码（未知字段类型或嵌套结构时使用）"""
+    encoder = _BASIC_ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    if isinstance(value, Enum):
+        return encode(value.value)
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if type(value) in _class_encoders or dataclasses.is_dataclass(value):
+        return encode(value)
+    if isinstance(value, dict):
+        return _encode_dict(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return _encode_list(value)
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+# ==================== dataclass 编码函数生成 ====================
+
+def _field_encoder(annotation) -> Callable[[Any], str]:
+    """根据字段类型注解选择专用编码函数"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        # Optional[X]：各专用编码函数均已处理None
+        non_none = [arg for arg in args if arg is not type(None)]
+        return _field_encoder(non_none[0]) if len(non_none) == 1 else _encode_any
+    if origin in (list, tuple) and args and dataclasses.is_dataclass(args[0]):
+        item_encoder = _compile(args[0])
+        return lambda value: "null" if value is None else "[" + ",".join(map(item_encoder, value)) + "]"
+    if not isinstance(annotation, type):
+        return _encode_any
+    if issubclass(annotation, Enum):
+        return _encode_enum
+    if annotation is bool:
+        return _encode_bool
+    if annotation in (int, float):
+        return _encode_number
+    if annotation is str:
+        return _encode_str
+    if issubclass(annotation, (datetime, date)):
+        return _encode_datetime
+    if dataclasses.is_dataclass(annotation):
+        nested = _compile(annotation)
+        return lambda value: "null" if value is None else nested(value)
+    return _encode_any
+
+
+def _compile(cls: type) -> Callable[[Any], str]:
+    """为 dataclass 生成编码函数并缓存"""
+    encoder = _class_encoders.get(cls)
+    if encoder is not None:
+        return encoder
+
+    hints = typing.get_type_hints(cls)
+    namespace = {}
+    parts = []
+    for index, field in enumerate(dataclasses.fields(cls)):
+        name = f"_f{index}"
+        namespace[name] = _field_encoder(hints.get(field.name, Any))
+        prefix = ("{" if index == 0 else ",") + json.dumps(field.name) + ":"
+        parts.append(f"{prefix!r} + {name}(obj.{field.name})")
+    body = " + ".join(parts) + " + '}'" if parts else "'{}'"
+    source = f"def encode_{cls.__name__}(obj):\n    return {body}\n"
+    exec(source, namespace)
+    encoder = namespace[f"encode_{cls.__name__}"]
+    _class_encoders[cls] = encoder
+    return encoder
@@ -0,0 +1,188 @@
+"""
+静态资源缓存模块 - 内存中的预压缩静态文件
+页面、图标等静态文件在启动时读入内存，按内容哈希生成带版本的URL（如 cart.1a2b3c4d.png），
+文本类文件同时预先生成 gzip（以及安装了 brotli 时的 br）压缩版本，
+请求时按 Accept-Encoding 直接返回对应字节串，不再每次读盘；
+菜品图片数量不固定，按需读盘后放入有容量上限的LRU缓存
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from logger import get_logger
+from menu_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只提供 gzip
+    brotli = None
+
+logger = get_logger("static_cache")
+
+# 带内容哈希的URL内容永不变化，可以让浏览器和CDN长期缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 固定URL的入口页面每次都要向服务器确认（ETag没变时返回304）
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# 值得压缩的内容类型（图片本身已经压缩过）
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+# 小于这个字节数的文件不压缩
+MIN_COMPRESS_BYTES = 256
+
+
+class StaticAsset(NamedTuple):
+    """缓存的静态文件"""
+    content_type: str
+    etag: str
+    # 编码 -> 响应体（"identity" 为原始内容）
+    variants: Dict[str, bytes]
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.variants.values())
+
+
+def content_hash(data: bytes, digest_size: int = 8) -> str:
+    return hashlib.blake2b(data, digest_size=digest_size).hexdigest()
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    """在文件名和扩展名之间插入内容哈希：cart.png -> cart.<hash>.png"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{content_hash(data)}{ext}"
+
+
+def build_asset(data: bytes, content_type: str) -> StaticAsset:
+    """生成静态文件的缓存条目（文本类内容预先压缩，压缩后没有变小的版本不保留）"""
+    variants = {"identity": data}
+    if len(data) >= MIN_COMPRESS_BYTES and content_type.startswith(COMPRESSIBLE_TYPES):
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            variants["gzip"] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(data)
+            if len(compressed) < len(data):
+                variants["br"] = compressed
+    return StaticAsset(content_type, '"' + content_hash(data, 12) + '"', variants)
+
+
+def guess_type(name: str) -> str:
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/json", "application/javascript"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def _choose_encoding(accept_encoding: str, variants: Dict[str, bytes]) -> str:
+    """按 Accept-Encoding 选择编码，优先 br，其次 gzip（不解析 q 值，q=0 视为不接受）"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(coding.strip().lower())
+    for encoding in ("br", "gzip"):
+        if encoding in variants and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def respond(request: Request, asset: StaticAsset, cache_control: str = IMMUTABLE_CACHE_CONTROL) -> Response:
+    """返回缓存的静态文件，ETag命中时返回304"""
+    headers = {"ETag": asset.etag, "Cache-Control": cache_control}
+    if len(asset.variants) > 1:
+        headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request.headers.get("if-none-match"), asset.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = _choose_encoding(request.headers.get("accept-encoding", ""), asset.variants)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=asset.variants[encoding], media_type=asset.content_type, headers=headers)
+
+
+class StaticCache:
+    """
+    静态资源缓存
+    register_file 注册的文件常驻内存；load_file 读取的文件（菜品图片）按LRU淘汰，总大小不超过 max_bytes
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # 带哈希的文件名 -> 常驻文件
+        self._pinned: Dict[str, StaticAsset] = {}
+        # 原文件名 -> 带哈希的文件名
+        self.manifest: Dict[str, str] = {}
+        # 原文件名 -> 常驻文件（固定URL的页面）
+        self._by_name: Dict[str, StaticAsset] = {}
+        self._lru: "OrderedDict[str, StaticAsset]" = OrderedDict()
+        self._lru_bytes = 0
+        if brotli is None:
+            logger.warning("未安装 brotli，静态文件只提供 gzip 压缩版本")
+
+    def register_file(self, path: str, name: Optional[str] = None) -> Optional[str]:
+        """
+        读入并常驻一个静态文件
+
+        :param path: 文件路径
+        :param name: 对外的文件名，默认为文件本身的名字
+        :return: 带内容哈希的文件名；文件不存在时返回None
+        """
+        name = name or os.path.basename(path)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        asset = build_asset(data, guess_type(name))
+        versioned = hashed_name(name, data)
+        self._pinned[versioned] = asset
+        self._by_name[name] = asset
+        self.manifest[name] = versioned
+        return versioned
+
+    def get(self, versioned_name: str) -> Optional[StaticAsset]:
+        """按带哈希的文件名查找常驻文件"""
+        return self._pinned.get(versioned_name)
+
+    def get_by_name(self, name: str) -> Optional[StaticAsset]:
+        """按原文件名查找常驻文件（用于固定URL的入口页面）"""
+        return self._by_name.get(name)
+
+    def get_cached(self, key: str) -> Optional[StaticAsset]:
+        """查找LRU中的文件（命中时移到最近使用）"""
+        asset = self._lru.get(key)
+        if asset is not None:
+            self._lru.move_to_end(key)
+        return asset
+
+    @staticmethod
+    def load_file(path: str) -> Optional[StaticAsset]:
+        """
+        读盘并生成缓存条目（会阻塞，调用方应在线程池中执行，之后用 put 放入LRU）
+
+        :param path: 文件路径
+        :return: 文件不存在时返回None
+        """
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        return build_asset(data, guess_type(path))
+
+    def put(self, key: str, asset: StaticAsset):
+        """放入LRU（只能在事件循环中调用），超过容量时淘汰最久未使用的文件"""
+        if asset.size > self.max_bytes:
+            return
+        old = self._lru.pop(key, None)
+        if old is not None:
+            self._lru_bytes -= old.size
+        self._lru[key] = asset
+        self._lru_bytes += asset.size
+        while self._lru_bytes > self.max_bytes:
+            _, evicted = self._lru.popitem(last=False)
+            self._lru_bytes -= evicted.size
@@ -0,0 +1,191 @@
+"""
+测试销售统计的列式聚合
+"""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import analytics
+from analytics import OrderColumnsBuilder, build_rollups, grouped_percentiles
+
+
+def make_record(order_no, created_at, status="completed", items=((1, 2, 28.0),), minutes=(1, 2, 10)):
+    status_times = {}
+    if status != "pending":
+        for name, offset in zip(("accepted", "preparing", "completed"), minutes):
+            status_times[name] = created_at + timedelta(minutes=offset)
+    if status == "cancelled":
+        status_times = {"cancelled": created_at + timedelta(minutes=1)}
+    return {
+        "id": order_no, "created_at": created_at, "status": status, "status_times": status_times,
+        "total_amount": sum(quantity * price for _, quantity, price in items),
+        "items": [{"dish_id": dish_id, "dish_name": "", "quantity": quantity, "price": price}
+                  for dish_id, quantity, price in items],
+    }
+
+
+def test_daily_rollups_and_reports():
+    """按天、小时、菜品、分类汇总，已取消订单不计入营业额"""
+    day = datetime(2026, 5, 1, 11, 30)
+    builder = OrderColumnsBuilder()
+    builder.add_record(make_record("A", day, items=((1, 2, 28.0), (2, 1, 2.0))))
+    builder.add_record(make_record("B", day + timedelta(hours=1), minutes=(3, 4, 20)))
+    builder.add_record(make_record("C", day + timedelta(hours=2), status="cancelled"))
+    builder.add_record(make_record("D", day + timedelta(days=1), items=((2, 3, 2.0),)))
+    rollups = build_rollups(builder.build())
+    assert sorted(rollups) == [date(2026, 5, 1), date(2026, 5, 2)]
+
+    first = rollups[date(2026, 5, 1)]
+    assert first.orders_by_hour[11] == 1 and first.orders_by_hour[12] == 1 and first.cancelled == 1
+    assert first.revenue_by_hour.sum() == 5800 + 5600
+
+    dish_info = {1: ("宫保鸡丁", "川菜"), 2: ("米饭", "主食")}
+    ordered = [rollups[key] for key in sorted(rollups)]
+    by_dish = analytics.revenue_report(ordered, "dish", dish_info)
+    assert by_dish[0] == {"key": 1, "name": "宫保鸡丁", "orders": 2, "quantity": 4, "revenue": 112.0}
+    assert by_dish[1]["quantity"] == 4 and by_dish[1]["orders"] == 2
+    assert analytics.items_report(ordered, "category", {1: ("宫保鸡丁", "川菜")}, 10)[1]["key"] == "未分类"
+
+    durations = analytics.durations_report(ordered, "all", dish_info, percentiles=(50,))
+    # 接单到出餐：9、17、9 分钟
+    assert durations[0]["fulfillment"] == {"count": 3, "p50": 540.0}
+    assert durations[0]["pending"]["count"] == 3
+
+
+def test_grouped_percentiles_match_numpy():
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 5, 1000)
+    values = rng.exponential(300, 1000)
+    values[::50] = np.nan
+    counts, result = grouped_percentiles(groups, values, 5, (50, 95, 99))
+    for key in range(5):
+        expected = values[(groups == key) & ~np.isnan(values)]
+        assert counts[key] == len(expected)
+        assert np.allclose(result[key], np.percentile(expected, (50, 95, 99)))
+
+
+
+def test_only_changed_days_are_rebuilt():
+    """订单变更后只重算该订单的下单日期"""
+    import asyncio
+    from order_model import Order, OrderItem, OrderStatus
+    from order_store import OrderStore
+
+    class InlineExecutor:
+        async def run_read(self, fn, *args):
+            return fn(*args)
+
+    loads = []
+
+    def load_columns(start, end, exclude):
+        loads.append((start, end))
+        builder = OrderColumnsBuilder()
+        if start <= date(2026, 5, 1) <= end:
+            builder.add_record(make_record("OLD", datetime(2026, 5, 1, 12)))
+        return builder.build()
+
+    store = OrderStore()
+    stats = analytics.SalesAnalytics(load_columns, store.all, InlineExecutor())
+    store.subscribe(stats.on_order_change)
+    created = datetime(2026, 5, 2, 12)
+    store.add(Order("NEW", "u1", "张三", 2.0, OrderStatus.PENDING, [OrderItem(2, "米饭", 1, 2.0)], created, created))
+
+    async def scenario():
+        rollups = await stats.rollups(date(2026, 5, 1), date(2026, 5, 2))
+        assert [rollup.orders_by_hour.sum() for rollup in rollups] == [1, 1]
+        store.update_status(store.get("NEW"), OrderStatus.CANCELLED, created + timedelta(minutes=1))
+        rollups = await stats.rollups(date(2026, 5, 1), date(2026, 5, 2))
+        assert rollups[1].cancelled == 1 and rollups[1].orders_by_hour.sum() == 0
+
+    asyncio.run(scenario())
+    assert loads == [(date(2026, 5, 1), date(2026, 5, 2)), (date(2026, 5, 2), date(2026, 5, 2))]
+
+
+def test_today_is_updated_incrementally():
+    """当天的订单变更直接增量更新，结果与完整重算一致，且不再读取数据库"""
+    import asyncio
+    from order_model import Order, OrderItem, OrderStatus
+    from order_store import OrderStore
+
+    class InlineExecutor:
+        async def run_read(self, fn, *args):
+            return fn(*args)
+
+    loads = []
+    today = datetime.combine(date.today(), datetime.min.time())
+
+    def load_columns(start, end, exclude):
+        loads.append((start, end))
+        builder = OrderColumnsBuilder()
+        builder.add_record(make_record("STORED", today + timedelta(hours=9), items=((1, 1, 28.0), (3, 2, 5.0))))
+        return builder.build()
+
+    def make_order(order_no, hour, items):
+        created = today + timedelta(hours=hour)
+        return Order(order_no, "u1", "张三", sum(q * p for _, q, p in items), OrderStatus.PENDING,
+                     [OrderItem(dish_id, "", quantity, price) for dish_id, quantity, price in items], created, created)
+
+    def advance(store, order_no, status, minutes):
+        order = store.get(order_no)
+        store.update_status(order, status, order.created_at + timedelta(minutes=minutes))
+
+    store = OrderStore()
+    stats = analytics.SalesAnalytics(load_columns, store.all, InlineExecutor())
+    store.subscribe(stats.on_order_change)
+    store.add(make_order("A", 10, ((1, 2, 28.0),)))
+
+    async def scenario():
+        await stats.rollups(date.today(), date.today())
+        store.add(make_order("B", 11, ((2, 1, 2.0), (4, 3, 6.0), (2, 1, 2.0))))
+        store.add(make_order("C", 11, ((4, 1, 6.0),)))
+        advance(store, "A", OrderStatus.ACCEPTED, 1)
+        advance(store, "A", OrderStatus.PREPARING, 3)
+        advance(store, "A", OrderStatus.COMPLETED, 12)
+        advance(store, "C", OrderStatus.CANCELLED, 2)
+        return (await stats.rollups(date.today(), date.today()))[0]
+
+    live = asyncio.run(scenario())
+    assert loads == [(date.today(), date.today())]
+    builder = OrderColumnsBuilder()
+    for order in store.all():
+        builder.add_order(order)
+    builder.add_record(make_record("STORED", today + timedelta(hours=9), items=((1, 1, 28.0), (3, 2, 5.0))))
+    full = build_rollups(builder.build())[date.today()]
+
+    assert live.cancelled == full.cancelled == 1
+    for field in ("orders_by_hour", "revenue_by_hour", "items_by_hour", "dish_ids", "dish_quantity",
+                  "dish_revenue", "dish_orders"):
+        assert np.array_equal(getattr(live, field), getattr(full, field)), field
+    dish_info = {1: ("宫保鸡丁", "川菜")}
+    for group_by in ("all", "hour", "dish"):
+        assert (analytics.durations_report([live], group_by, dish_info)
+                == analytics.durations_report([full], group_by, dish_info))
+
+
+def test_stale_days_loaded_by_contiguous_runs():
+    """相隔很远的两天待重算时分别读取，不读取中间的日期"""
+    import asyncio
+
+    class InlineExecutor:
+        async def run_read(self, fn, *args):
+            return fn(*args)
+
+    loads = []
+
+    def load_columns(start, end, exclude):
+        loads.append((start, end))
+        builder = OrderColumnsBuilder()
+        for day in (date(2025, 5, 1), date(2026, 5, 1), date(2026, 5, 2)):
+            if start <= day <= end:
+                builder.add_record(make_record(f"O{day}", datetime.combine(day, datetime.min.time())))
+        return builder.build()
+
+    stats = analytics.SalesAnalytics(load_columns, list, InlineExecutor())
+    stats._days.update({date(2025, 5, 1) + timedelta(days=offset): None for offset in range(367)})
+    stats._dirty.update({date(2025, 5, 1), date(2026, 5, 1), date(2026, 5, 2)})
+    rollups = asyncio.run(stats.rollups(date(2025, 5, 1), date(2026, 5, 2)))
+
+    assert loads == [(date(2025, 5, 1), date(2025, 5, 1)), (date(2026, 5, 1), date(2026, 5, 2))]
+    assert [rollup.day for rollup in rollups] == [date(2025, 5, 1), date(2026, 5, 1), date(2026, 5, 2)]
+    assert analytics.contiguous_runs([date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 4)]) == [
+        [date(2026, 1, 1), date(2026, 1, 2)], [date(2026, 1, 4)]]
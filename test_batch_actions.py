@@ -0,0 +1,114 @@
+"""
+测试批量订单操作和批量上下架菜品
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import Cook_applet
+from db_executor import DBExecutor
+from order_model import Order, OrderItem, OrderStatus
+
+
+@pytest.fixture
+def client():
+    return TestClient(Cook_applet.app)
+
+
+def test_batch_transitions_mixed_items(client, monkeypatch):
+    """合法项各自生效，非法项返回各自的原因；成功的流转合并为一个事件"""
+    now = datetime.now()
+    orders = {name: Order(f"ORDBATCH{name}", "u1", "张三", 28.0, status, [OrderItem(1, "宫保鸡丁", 1, 28.0)],
+                          now, now)
+              for name, status in (("A", OrderStatus.PENDING), ("B", OrderStatus.PENDING),
+                                   ("C", OrderStatus.COMPLETED), ("D", OrderStatus.CANCELLED))}
+    for order in orders.values():
+        Cook_applet.orders_db.add(order)
+    events = []
+    monkeypatch.setattr(Cook_applet.event_bus, "publish", lambda event_type, data: events.append((event_type, data)))
+    try:
+        response = client.post("/api/merchant/orders/batch", json={"items": [
+            {"order_id": "ORDBATCHA", "action": "accept"},
+            {"order_id": "ORDBATCHB", "action": "complete"},
+            {"order_id": "ORDBATCHC", "action": "cancel"},
+            {"order_id": "ORDBATCHD", "action": "cancel"},
+            {"order_id": "ORDBATCHB", "action": "start"},
+            {"order_id": "ORDMISSING", "action": "accept"},
+            {"order_id": "ORDBATCHA", "action": "refund"},
+            "not-an-object",
+        ]})
+    finally:
+        for order in orders.values():
+            Cook_applet.orders_db.remove(order.id)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["success"], body["succeeded"], body["failed"]) == (False, 2, 6)
+    results = body["results"]
+    assert results[0] == {"order_id": "ORDBATCHA", "action": "accept", "success": True,
+                          "message": "接单成功", "status": "accepted"}
+    assert not results[1]["success"] and results[1]["status"] == "pending"
+    assert not results[2]["success"] and results[2]["status"] == "completed"
+    assert results[3]["success"] and results[3]["status"] == "cancelled"  # 重复取消视为成功，不产生流转
+    assert not results[4]["success"] and results[4]["status"] == "pending"
+    assert [result["message"] for result in results[5:]] == ["订单不存在", "未知的操作: refund", "未知的操作: None"]
+
+    assert orders["A"].status == OrderStatus.ACCEPTED and orders["B"].status == OrderStatus.PENDING
+    assert [(event_type, [update["order_id"] for update in data["updates"]])
+            for event_type, data in events] == [("order_status_batch", ["ORDBATCHA"])]
+
+
+def test_batch_transitions_rejects_bad_payload(client):
+    assert client.post("/api/merchant/orders/batch", json={"items": []}).status_code == 400
+    too_many = [{"order_id": "x", "action": "accept"}] * (Cook_applet.BATCH_MAX_ITEMS + 1)
+    assert client.post("/api/merchant/orders/batch", json={"items": too_many}).status_code == 400
+
+
+@pytest.fixture
+def menu(temp_database, monkeypatch):
+    """临时数据库中的三个菜品，测试结束后恢复菜单快照"""
+    executor = DBExecutor(read_threads=1)
+    db = temp_database.SessionLocal()
+    for dish_id in (1, 2, 3):
+        db.add(temp_database.DishModel(id=dish_id, name=f"菜{dish_id}", price=10 + dish_id, category="家常菜",
+                                       is_available=True))
+    db.commit()
+    db.close()
+    monkeypatch.setattr(Cook_applet, "db_executor", executor)
+    monkeypatch.setattr(Cook_applet, "dishes_db", asyncio.run(executor.read(Cook_applet._db_load_dishes)))
+    Cook_applet.refresh_menu_snapshot()
+    yield temp_database
+    executor.shutdown()
+    monkeypatch.undo()
+    Cook_applet.refresh_menu_snapshot()
+
+
+def test_bulk_availability(client, menu, monkeypatch):
+    """一次事务修改多个菜品，菜单快照只重建一次；不存在的菜品单独报告"""
+    rebuilds = []
+    rebuild = Cook_applet.menu_snapshot.rebuild
+    monkeypatch.setattr(Cook_applet.menu_snapshot, "rebuild", lambda *args: rebuilds.append(1) or rebuild(*args))
+
+    response = client.post("/api/merchant/dishes/availability", json={"items": [
+        {"dish_id": 1, "is_available": False}, {"dish_id": 3, "is_available": False},
+        {"dish_id": 99, "is_available": False}]})
+    assert response.status_code == 200
+    assert [(result["dish_id"], result["success"]) for result in response.json()["results"]] == [
+        (1, True), (3, True), (99, False)]
+    assert len(rebuilds) == 1
+
+    assert [dish["id"] for dish in client.get("/api/user/dishes").json()] == [2]
+    assert client.get("/api/user/dishes/1").status_code == 404
+    assert not Cook_applet.menu_snapshot.prices[1].is_available
+    db = menu.SessionLocal()
+    assert {row.id: row.is_available for row in db.query(menu.DishModel)} == {1: False, 2: True, 3: False}
+    db.close()
+
+
+@pytest.mark.parametrize("item", [{"dish_id": True, "is_available": False}, {"dish_id": "1", "is_available": False},
+                                  {"dish_id": 1, "is_available": 0}, {"dish_id": 1}])
+def test_bulk_availability_validates_items(client, item):
+    response = client.post("/api/merchant/dishes/availability", json={"items": [item]})
+    assert response.status_code == 400
@@ -0,0 +1,68 @@
+"""
+测试WebSocket非阻塞广播
+"""
+import asyncio
+
+from connection_manager import ConnectionManager, RESYNC_MESSAGE
+
+
+class FakeWebSocket:
+    """可控制发送速度的假WebSocket"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("broken pipe")
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_slow_and_broken_connections_do_not_block_broadcast():
+    """慢连接积压后合并为resync消息，出错的连接被剔除"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=3, overflow_policy="coalesce", send_timeout=1)
+        fast, slow, broken = FakeWebSocket(), FakeWebSocket(delay=0.05), FakeWebSocket(fail=True)
+        for ws in (fast, slow, broken):
+            await manager.connect(ws)
+
+        for i in range(10):
+            manager.broadcast(f"m{i}")  # 同步入队，不等待发送
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.3)
+
+        assert fast.sent == [f"m{i}" for i in range(10)]
+        assert RESYNC_MESSAGE in slow.sent
+        assert broken.closed and broken not in manager.active_connections
+        await manager.close_all()
+
+    asyncio.run(scenario())
+
+
+def test_disconnect_policy_evicts_once():
+    """DISCONNECT 策略下队列溢出后只启动一个剔除任务，任务结束后不再持有引用"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, overflow_policy="disconnect", send_timeout=1)
+        slow = FakeWebSocket(delay=0.05)
+        await manager.connect(slow)
+
+        for i in range(20):
+            manager.broadcast(f"m{i}")
+        assert len(manager._tasks) == 1
+        await asyncio.sleep(0.01)
+
+        assert slow.closed and slow not in manager.active_connections
+        assert manager.evicted_count == 1 and not manager._tasks
+        await manager.close_all()
+
+    asyncio.run(scenario())
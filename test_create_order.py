@@ -0,0 +1,40 @@
+"""
+测试下单接口的参数校验
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import Cook_applet
+from menu_cache import PriceEntry
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Cook_applet.menu_snapshot, "prices", {1: PriceEntry("宫保鸡丁", 2800, True)})
+    return TestClient(Cook_applet.app)
+
+
+@pytest.mark.parametrize("dish_id", [True, False, "1", 1.0, None])
+def test_dish_id_must_be_integer(client, dish_id):
+    """dish_id 只接受整数，True 不会被当成菜品1"""
+    response = client.post("/api/user/orders", json={
+        "user_id": "u1", "user_name": "测试", "items": [{"dish_id": dish_id, "quantity": 1}]})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("菜品不存在")
+
+
+def test_idempotency_key_scoped_by_user(client):
+    """两个用户使用同一个幂等键时各自下单，重试只返回自己的订单"""
+    def submit(user_id):
+        return client.post("/api/user/orders", headers={"Idempotency-Key": "shared-key"}, json={
+            "user_id": user_id, "user_name": "测试", "items": [{"dish_id": 1, "quantity": 1}]})
+
+    first = submit("scope-u1")
+    second = submit("scope-u2")
+    assert first.status_code == second.status_code == 200
+    assert "Idempotent-Replayed" not in second.headers
+    assert second.json()["id"] != first.json()["id"] and second.json()["user_id"] == "scope-u2"
+
+    retry = submit("scope-u1")
+    assert retry.headers["Idempotent-Replayed"] == "true" and retry.json()["id"] == first.json()["id"]
+    assert Cook_applet.idempotency_cache.get("scope-u2:shared-key").body == second.content
@@ -0,0 +1,67 @@
+"""
+测试 SQLite 连接调优参数和读写分离的连接池
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import config
+from database import create_db_engine
+
+
+def _pragma(conn, name):
+    return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_pragmas_applied_on_connect(tmp_path):
+    """每个新连接都应用调优参数，只读连接池拒绝写入"""
+    url = f"sqlite:///{tmp_path / 'tuned.db'}"
+    write_engine = create_db_engine(url, pool_size=1)
+    read_engine = create_db_engine(url, pool_size=2, read_only=True)
+    try:
+        with write_engine.begin() as conn:
+            assert _pragma(conn, "journal_mode") == config.SQLITE_JOURNAL_MODE.lower()
+            assert _pragma(conn, "synchronous") == 1  # NORMAL
+            assert _pragma(conn, "busy_timeout") == config.SQLITE_BUSY_TIMEOUT_MS
+            assert _pragma(conn, "cache_size") == -config.SQLITE_CACHE_SIZE_KB
+            assert _pragma(conn, "temp_store") == 2  # MEMORY
+            assert _pragma(conn, "query_only") == 0
+            conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+
+        assert write_engine.pool.size() == 1 and read_engine.pool.size() == 2
+        with read_engine.connect() as conn:
+            assert _pragma(conn, "query_only") == 1
+            assert conn.execute(text("SELECT x FROM t")).scalar() == 1
+            with pytest.raises(OperationalError):
+                conn.execute(text("INSERT INTO t VALUES (2)"))
+    finally:
+        write_engine.dispose()
+        read_engine.dispose()
+
+
+def test_metrics_endpoint_reports_db_pools(temp_database):
+    """/metrics 以 Prometheus 文本格式导出读写两个连接池的操作耗时"""
+    from Cook_applet import app
+    from db_executor import DBExecutor
+
+    executor = DBExecutor(read_threads=1)
+    try:
+        asyncio.run(executor.write(lambda db: db.execute(text("SELECT 1"))))
+        asyncio.run(executor.read(lambda db: db.execute(text("SELECT 1")).scalar()))
+    finally:
+        executor.shutdown()
+
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE db_operation_duration_seconds histogram" in lines
+    for pool in ("read", "write"):
+        count = next(line for line in lines if line.startswith(f'db_operation_duration_seconds_count{{pool="{pool}"}}'))
+        assert int(float(count.rsplit(" ", 1)[1])) >= 1
+    assert any(line.startswith('sqlite_commit_duration_seconds_count{source="executor"}') for line in lines)
+    assert "# TYPE order_writes_pending gauge" in lines
@@ -0,0 +1,39 @@
+"""
+测试数据库执行器的单写者线程
+"""
+import asyncio
+import threading
+
+import pytest
+
+from db_executor import DBExecutor
+
+
+def test_writes_run_on_single_writer_thread():
+    """写操作全部在同一个 db-writer 线程中串行执行，读操作走读取线程；关闭后不再接受新操作"""
+    executor = DBExecutor(read_threads=4)
+    active = []
+    overlaps = []
+
+    def write():
+        active.append(1)
+        if len(active) > 1:
+            overlaps.append(len(active))
+        threading.Event().wait(0.002)
+        active.pop()
+        return threading.current_thread().name
+
+    async def scenario():
+        writers = await asyncio.gather(*(executor.run_write(write) for _ in range(20)))
+        readers = await asyncio.gather(*(executor.run_read(lambda: threading.current_thread().name)
+                                         for _ in range(4)))
+        return writers, readers
+
+    writers, readers = asyncio.run(scenario())
+    assert len(set(writers)) == 1 and writers[0].startswith("db-writer")
+    assert all(name.startswith("db-reader") for name in readers)
+    assert overlaps == [] and executor.stats()["write"]["count"] == 20
+
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        asyncio.run(executor.run_write(write))
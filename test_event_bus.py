@@ -0,0 +1,28 @@
+"""
+测试跨进程事件总线
+"""
+import asyncio
+import json
+import sqlite3
+
+from event_bus import SQLiteJournalEventBus
+
+
+def test_stop_flushes_pending_events(tmp_path):
+    """关闭前最后一个轮询间隔内发布的事件也写入日志"""
+    path = str(tmp_path / "events.db")
+
+    async def scenario():
+        bus = SQLiteJournalEventBus(path, poll_interval_ms=300)
+        await bus.start()
+        # 后台任务已完成第一次同步，之后发布的事件在下一次轮询前只可能由 stop 写入
+        await asyncio.sleep(0.05)
+        bus.publish("order_created", {"order": {"id": "ORD1"}})
+        await bus.stop()
+
+    asyncio.run(scenario())
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT type, payload FROM event_journal").fetchall()
+    conn.close()
+    assert [(event_type, json.loads(payload)) for event_type, payload in rows] == [
+        ("order_created", {"order": {"id": "ORD1"}})]
@@ -0,0 +1,52 @@
+"""
+测试下单幂等键缓存
+"""
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyCache, normalize_key, request_fingerprint, scoped_key
+
+
+class CaptureExecutor:
+    def __init__(self):
+        self.batches = []
+
+    async def run_write(self, fn, entries, now):
+        self.batches.append(dict(entries))
+
+
+def test_key_and_fingerprint():
+    """幂等键去掉首尾空白；指纹与字段顺序和幂等键字段无关"""
+    assert normalize_key("  abc-1 ") == "abc-1"
+    assert normalize_key("") is None and normalize_key(None) is None
+    for bad in ("x" * 129, "a\nb", 123):
+        with pytest.raises(ValueError):
+            normalize_key(bad)
+
+    order = {"user_id": "u1", "items": [{"dish_id": 1, "quantity": 2}], "note": None}
+    same = {"note": None, "items": [{"quantity": 2, "dish_id": 1}], "user_id": "u1", "idempotency_key": "k"}
+    assert request_fingerprint(order) == request_fingerprint(same)
+    assert request_fingerprint(order) != request_fingerprint({**order, "note": "少辣"})
+
+
+def test_ttl_capacity_and_persist():
+    """过期和超出上限的键被淘汰；同步自其他 worker 的键不重复写入数据库"""
+    executor = CaptureExecutor()
+    cache = IdempotencyCache(ttl_seconds=60, max_entries=2, executor=executor)
+    cache.put("a", "fa", 200, b'{"id":"A"}', now=1000.0)
+    cache.put("b", "fb", 200, b'{"id":"B"}', now=1010.0)
+    assert cache.get("a", now=1020.0).body == b'{"id":"A"}'
+
+    cache.put("c", "fc", 200, b'{"id":"C"}', now=1030.0, expires_at=1200.0, persist=False)
+    assert cache.get("a", now=1030.0) is None and cache.evicted == 1
+    assert cache.get("b", now=1070.0) is None
+    assert cache.get("c", now=1070.0).expires_at == 1200.0 and len(cache) == 1
+
+    asyncio.run(cache.flush())
+    assert [sorted(batch) for batch in executor.batches] == [["a", "b"]]
+    assert cache.pending_count == 0
+
+
+def test_scoped_key():
+    assert scoped_key("u1", "k") == "u1:k" != scoped_key("u2", "k")
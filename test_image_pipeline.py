@@ -0,0 +1,151 @@
+"""
+测试菜品图片的下载限制、格式校验和缩略图生成
+"""
+import base64
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import image_pipeline
+from image_pipeline import ImagePipeline, check_public_address, detect_extension
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(32)
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.1.2.3", "192.168.0.8", "172.16.0.1", "169.254.169.254",
+                                     "100.64.0.1", "0.0.0.0", "224.0.0.1", "::1", "fe80::1%eth0",
+                                     "fd00::1", "::ffff:127.0.0.1"])
+def test_non_public_addresses_rejected(address):
+    with pytest.raises(ValueError):
+        check_public_address(address)
+
+
+def test_public_addresses_allowed():
+    check_public_address("93.184.216.34")
+    check_public_address("2606:2800:220:1:248:1893:25c8:1946")
+
+
+@pytest.mark.parametrize("url", ["http://127.0.0.1:9/a.png", "http://localhost:9/a.png",
+                                 "http://169.254.169.254/latest/meta-data/", "https://[::1]:9/a.png",
+                                 "http://2130706433/a.png"])
+def test_fetch_refuses_internal_hosts(tmp_path, url):
+    """解析到非公网地址时在建立连接前拒绝"""
+    pipeline = ImagePipeline(str(tmp_path))
+    with pytest.raises(ValueError):
+        pipeline._fetch(url)
+    pipeline.close()
+
+
+def test_allowed_hosts(tmp_path):
+    pipeline = ImagePipeline(str(tmp_path), allowed_hosts=["img.example.com"])
+    with pytest.raises(ValueError, match="不允许从该主机"):
+        pipeline._fetch("https://evil.example.org/a.png")
+    pipeline._check_host("https://cdn.img.example.com/a.png")
+    pipeline.close()
+
+
+def test_redirect_not_followed(tmp_path, monkeypatch):
+    """重定向（如跳转到内网地址）不予跟随"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/image.png":
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(PNG)
+                return
+            self.send_response(302)
+            self.send_header("Location", "http://169.254.169.254/latest/meta-data/")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # 测试服务器在回环地址上，只在这个测试中放行
+    monkeypatch.setattr(image_pipeline, "check_public_address", lambda address: None)
+    pipeline = ImagePipeline(str(tmp_path))
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+        assert pipeline._fetch(base + "/image.png") == PNG
+        with pytest.raises(ValueError, match="重定向"):
+            pipeline._fetch(base + "/redirect")
+    finally:
+        server.shutdown()
+        server.server_close()
+        pipeline.close()
+
+
+def test_concurrent_writes_of_same_image(tmp_path):
+    """同一张图并发写入时各自使用独立的临时文件，不会留下半截文件"""
+    pipeline = ImagePipeline(str(tmp_path))
+    name = "0" * 32 + ".png"
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def write():
+        barrier.wait()
+        try:
+            pipeline._write(name, PNG)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pipeline.close()
+    assert errors == []
+    assert [p.name for p in tmp_path.iterdir()] == [name] and (tmp_path / name).read_bytes() == PNG
+
+
+def _data_url(data: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+
+
+def test_signature_and_size_rejected(tmp_path):
+    """按文件头识别格式，非图片内容和超过大小上限的图片都被拒绝，且不落盘"""
+    assert detect_extension(PNG) == "png"
+    assert detect_extension(b"\xff\xd8\xff\xe0" + bytes(8)) == "jpg"
+    assert detect_extension(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert detect_extension(b"<svg xmlns='http://www.w3.org/2000/svg'/>") is None
+
+    pipeline = ImagePipeline(str(tmp_path / "images"), max_bytes=64)
+    try:
+        with pytest.raises(ValueError, match="不是支持的图片格式"):
+            pipeline._ingest_sync(_data_url(b"<html>not an image</html>"))
+        with pytest.raises(ValueError, match="图片超过 64 字节"):
+            pipeline._ingest_sync(_data_url(PNG + bytes(64)))
+        with pytest.raises(ValueError, match="不支持的图片地址"):
+            pipeline._ingest_sync("file:///etc/passwd")
+        assert not (tmp_path / "images").exists()
+
+        image = pipeline._ingest_sync(_data_url(PNG))
+        assert image.url.endswith(".png") and pipeline.is_local(image.url)
+    finally:
+        pipeline.close()
+
+
+def test_thumbnails_generated(tmp_path):
+    """比档位宽的图片按档位缩放，不比档位宽时直接使用原图；相同内容只处理一次"""
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (500, 250), (200, 80, 40)).save(buffer, "JPEG")
+    data = buffer.getvalue()
+
+    pipeline = ImagePipeline(str(tmp_path), widths=(160, 320, 640))
+    try:
+        image = pipeline._ingest_sync(_data_url(data))
+        assert image.thumbnails["640"] == image.url
+        for width in (160, 320):
+            name = image.thumbnails[str(width)].rsplit("/", 1)[1]
+            assert name.endswith(f"_{width}.jpg")
+            with Image.open(pipeline.path_for(name)) as thumbnail:
+                assert thumbnail.size == (width, width // 2)
+        assert pipeline._ingest_sync(_data_url(data)) == image
+        assert len(list(tmp_path.iterdir())) == 3
+    finally:
+        pipeline.close()
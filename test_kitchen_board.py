@@ -0,0 +1,44 @@
+"""
+测试后厨看板的增量计数
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+from kitchen_board import KitchenBoard
+from order_store import OrderStore
+
+
+def _order(order_id, items):
+    now = datetime.now()
+    return SimpleNamespace(id=order_id, user_id="u1", status="pending", created_at=now, updated_at=now,
+                           items=[SimpleNamespace(dish_id=d, dish_name=f"菜{d}", quantity=q) for d, q in items])
+
+
+def test_counters_follow_order_transitions():
+    """份数随订单状态流转增减，制作说明每个菜品只下发一次"""
+    dishes = {1: SimpleNamespace(name="菜1", description="", cooking_instructions="先炒后炖")}
+    board = KitchenBoard(dishes.get)
+    store = OrderStore()
+    store.subscribe(board.on_order_change)
+
+    store.add(_order("A", [(1, 2), (2, 1)]))
+    store.add(_order("B", [(1, 1)]))
+    snapshot = board.snapshot()
+    assert {item["dish_id"]: item["pending"] for item in snapshot["items"]} == {1: 3, 2: 1}
+    assert list(snapshot["dishes"]) == [1]
+
+    first = board.drain()
+    assert first["dishes"][1]["cooking_instructions"] == "先炒后炖"
+
+    store.update_status(store.get("A"), "preparing")
+    update = board.drain()
+    assert update["dishes"] == {}
+    dish1 = next(item for item in update["items"] if item["dish_id"] == 1)
+    assert (dish1["pending"], dish1["preparing"]) == (1, 2)
+
+    store.update_status(store.get("A"), "completed")
+    store.update_status(store.get("B"), "cancelled")
+    cleared = board.drain()
+    assert all(item["total"] == 0 for item in cleared["items"])
+    assert board.snapshot()["items"] == []
+    assert board.drain() is None
@@ -0,0 +1,48 @@
+"""
+测试菜单快照中的价格表
+"""
+from types import SimpleNamespace
+
+from menu_cache import MenuSnapshot, to_cents
+
+
+def _dish(dish_id, name, price, is_available=True):
+    return SimpleNamespace(id=dish_id, name=name, price=price, category="家常菜",
+                           is_available=is_available)
+
+
+def test_price_table_uses_integer_cents():
+    """价格表按整数分保存，重建后整体替换"""
+    snapshot = MenuSnapshot()
+    snapshot.rebuild([_dish(1, "宫保鸡丁", 28.1), _dish(2, "麻婆豆腐", 0.29, False)],
+                     lambda dish: "{}")
+
+    assert to_cents(28.1) == 2810
+    assert to_cents("0.285") == 29
+    assert snapshot.prices[1] == ("宫保鸡丁", 2810, True)
+    assert not snapshot.prices[2].is_available
+    # 三份 0.1 元在浮点下累加不等于 0.3，按分计算则精确
+    assert sum(to_cents(0.1) for _ in range(3)) == to_cents(0.3)
+
+    old_prices = snapshot.prices
+    snapshot.rebuild([_dish(1, "宫保鸡丁", 30)], lambda dish: "{}")
+    assert old_prices[1].price_cents == 2810
+    assert snapshot.prices == {1: ("宫保鸡丁", 3000, True)}
+
+
+def test_detail_returns_recipe_instead_of_instructions():
+    """列表带制作说明原文，详情只带结构化菜谱"""
+    import json
+
+    from Cook_applet import Dish, encode_dish_detail, encode_dish_summary
+
+    recipe = {"ingredients": [{"name": "鸡胸肉", "quantity": "300g"}], "steps": ["切丁"], "tips": []}
+    dish = Dish(id=1, name="宫保鸡丁", price=28, description="", category="家常菜",
+                cooking_instructions="📋 所需食材：\n  • 鸡胸肉 300g", recipe=recipe)
+    snapshot = MenuSnapshot()
+    snapshot.rebuild([dish], encode_dish_summary, encode_dish_detail)
+
+    summary = json.loads(snapshot.dishes[0])[0]
+    detail = json.loads(snapshot.get_dish(1)[0])
+    assert "recipe" not in summary and summary["cooking_instructions"].startswith("📋")
+    assert "cooking_instructions" not in detail and detail["recipe"] == recipe
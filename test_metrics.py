@@ -0,0 +1,34 @@
+"""
+测试运行指标的 Prometheus 文本导出
+"""
+from metrics import Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    """直方图按桶上限累计计数，并输出 _sum 和 _count"""
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "耗时", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, route="/a")
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 3.65' in lines
+
+
+def test_counter_and_gauge_render():
+    """无标签计数器从0开始导出，仪表盘可绑定取值函数"""
+    registry = Registry()
+    evictions = registry.counter("evictions_total", "剔除次数")
+    assert "evictions_total 0" in registry.render().splitlines()
+    evictions.inc()
+    depth = registry.gauge("queue_depth", "积压")
+    depth.set_function(lambda: 7)
+
+    lines = registry.render().splitlines()
+    assert "evictions_total 1" in lines
+    assert "queue_depth 7" in lines
+    assert "# TYPE queue_depth gauge" in lines
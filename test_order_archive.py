@@ -0,0 +1,72 @@
+"""
+测试订单归档文件
+"""
+from datetime import datetime, timedelta
+
+from order_archive import OrderArchive
+
+
+def make_order(order_no, created_at, user_id="u1", status="completed"):
+    return {
+        "id": order_no, "user_id": user_id, "user_name": "张三", "total_amount": 28.0,
+        "status": status, "items": [{"dish_id": 1, "dish_name": "宫保鸡丁", "quantity": 1, "price": 28.0}],
+        "note": None, "created_at": created_at, "updated_at": created_at + timedelta(minutes=5),
+    }
+
+
+def test_archive_merge_lookup_and_paging(tmp_path):
+    """按天归档后可以按订单号查找，游标分页跨越多天文件，重复写入同一订单会合并"""
+    archive = OrderArchive(str(tmp_path))
+    base = datetime(2026, 3, 1, 12, 0)
+    orders = [make_order(f"ORD{int((base + timedelta(days=d, hours=h)).timestamp() * 1000)}{d}{h}",
+                         base + timedelta(days=d, hours=h), user_id="u1" if h else "u2")
+              for d in range(3) for h in range(3)]
+    for day in range(3):
+        archive.write_day((base + timedelta(days=day)).date(), orders[day * 3:day * 3 + 3])
+    # 重新写入同一订单（如中断后重试）不会产生重复
+    archive.write_day(base.date(), [dict(orders[0], status="cancelled")])
+
+    assert len(archive.days()) == 3
+    assert archive.upper_bound() == datetime(2026, 3, 4)
+    assert archive.get(orders[0]["id"])["status"] == "cancelled"
+    assert archive.get(orders[4]["id"])["items"] == orders[4]["items"]
+
+    newest_first = sorted(orders, key=lambda o: o["created_at"], reverse=True)
+    page, more = archive.query_page(4)
+    assert [o["id"] for o in page] == [o["id"] for o in newest_first[:4]] and more
+    cursor = (page[-1]["created_at"], page[-1]["id"])
+    page, more = archive.query_page(10, before=cursor)
+    assert [o["id"] for o in page] == [o["id"] for o in newest_first[4:]] and not more
+
+    page, more = archive.query_page(10, user_id="u2")
+    assert [o["id"] for o in page] == [orders[6]["id"], orders[3]["id"], orders[0]["id"]]
+    page, more = archive.query_page(2, after=(orders[2]["created_at"], orders[2]["id"]))
+    assert [o["id"] for o in page] == [orders[4]["id"], orders[3]["id"]] and more
+
+
+def test_index_skips_days_without_matches(tmp_path):
+    """索引显示当天没有匹配订单时不解压归档文件；索引与归档文件不一致时回退为读取文件"""
+    archive = OrderArchive(str(tmp_path))
+    base = datetime(2026, 3, 1, 12, 0)
+    for day in range(5):
+        created_at = base + timedelta(days=day)
+        archive.write_day(created_at.date(), [
+            make_order(f"ORD{int(created_at.timestamp() * 1000)}0", created_at, user_id=f"u{day % 2}")])
+
+    read_days = []
+    read_day = archive.read_day
+    archive.read_day = lambda day: read_days.append(day) or read_day(day)
+
+    assert archive.query_page(10, user_id="nobody") == ([], False)
+    assert archive.query_page(10, status="pending") == ([], False)
+    assert read_days == []
+
+    page, _ = archive.query_page(10, user_id="u1")
+    assert [o["user_id"] for o in page] == ["u1", "u1"] and len(read_days) == 2
+
+    # 索引中的字节数与归档文件不一致（如写入中断）时不能跳过这一天
+    with open(archive.index_path_for(base.date()), "w", encoding="utf-8") as file:
+        file.write('{"format": "cook_applet.orders.index", "version": 1, "data_size": 1, "users": {}}')
+    read_days.clear()
+    page, _ = archive.query_page(10, user_id="u0")
+    assert len(page) == 3 and len(read_days) == 3
@@ -0,0 +1,74 @@
+"""
+测试紧凑订单模型
+"""
+import json
+from datetime import datetime
+
+from order_model import Order, OrderItem, OrderStatus
+from serializer import dumps
+
+
+def _make_order(status=OrderStatus.PENDING, note=None):
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    return Order(
+        id="ORD1714537815123000001",
+        user_id="u1",
+        user_name="张三\"",
+        total_amount=84.3,
+        status=status,
+        items=[OrderItem(dish_id=1, dish_name="宫保鸡丁", quantity=2, price=28.1),
+               {"dish_id": 2, "dish_name": "米饭", "quantity": 1, "price": 28.1}],
+        created_at=created_at,
+        updated_at=created_at,
+        note=note,
+    )
+
+
+def test_json_matches_legacy_shape():
+    """序列化结果与原 dataclass 的JSON结构和取值相同"""
+    order = _make_order(note="少辣")
+    data = json.loads(dumps(order))
+    assert list(data) == ["id", "user_id", "user_name", "total_amount", "status", "items",
+                          "created_at", "updated_at", "note"]
+    assert data["user_name"] == "张三\""
+    assert data["total_amount"] == 84.3
+    assert data["status"] == "pending"
+    assert data["created_at"] == "2024-05-01T12:30:15.123456"
+    assert data["items"] == [
+        {"dish_id": 1, "dish_name": "宫保鸡丁", "quantity": 2, "price": 28.1},
+        {"dish_id": 2, "dish_name": "米饭", "quantity": 1, "price": 28.1},
+    ]
+    assert data["note"] == "少辣"
+    assert json.loads(dumps(_make_order()))["note"] is None
+
+
+def test_properties_round_trip():
+    """属性访问时还原为 datetime、OrderItem 和枚举"""
+    order = _make_order()
+    assert order.created_at == datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert order.items[0] == OrderItem(1, "宫保鸡丁", 2, 28.1)
+    assert order.to_dict()["items"][1]["dish_name"] == "米饭"
+
+    order.status = OrderStatus.COMPLETED
+    assert order.status is OrderStatus.COMPLETED
+    # 不在枚举中的历史状态原样保留
+    order.status = "refunded"
+    assert order.status == "refunded"
+    assert json.loads(dumps(order))["status"] == "refunded"
+    assert not hasattr(order, "__dict__")
+
+
+def test_status_history_only_changes_with_status():
+    """只修改 updated_at 不会产生状态记录；状态变更经 OrderStore 记录进入时间"""
+    from order_store import OrderStore
+
+    order = _make_order()
+    order.updated_at = datetime(2024, 5, 1, 13, 0)
+    assert order.updated_at == datetime(2024, 5, 1, 13, 0)
+    assert order.status_times() == {}
+
+    store = OrderStore()
+    store.add(order)
+    accepted_at = datetime(2024, 5, 1, 13, 5)
+    store.update_status(order, OrderStatus.ACCEPTED, accepted_at)
+    assert order.status_times() == {"accepted": accepted_at}
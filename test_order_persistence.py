@@ -0,0 +1,80 @@
+"""
+测试订单持久化和数据库分页
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from order_model import Order, OrderItem, OrderStatus
+from order_persistence import OrderWriteBehind, load_order, order_to_record, query_orders_page, write_order_batch
+from order_store import OrderStore
+
+
+def make_order(order_no, created_at, user_id="u1", status=OrderStatus.PENDING):
+    return Order(order_no, user_id, "张三", 28.0, status, [OrderItem(1, "宫保鸡丁", 1, 28.0)],
+                 created_at, created_at)
+
+
+def test_page_skips_orders_already_in_memory(temp_database):
+    """内存中已有的订单不计入数据库层的"是否还有更多"，不会多翻出一个空页"""
+    base = datetime(2026, 5, 1, 12)
+    orders = [make_order(f"ORD{index}", base + timedelta(minutes=index)) for index in range(5)]
+    write_order_batch([order_to_record(order) for order in orders])
+    store = OrderStore()
+    for order in orders[1:]:
+        store.add(order)
+
+    rows, more = query_orders_page(2, user_id="u1", exclude=store)
+    assert [row["id"] for row in rows] == ["ORD0"] and not more
+    rows, more = query_orders_page(2, user_id="u1")
+    assert [row["id"] for row in rows] == ["ORD4", "ORD3"] and more
+
+    # 全部在内存中时数据库层为空且没有更多
+    store.add(orders[0])
+    assert query_orders_page(2, user_id="u1", exclude=store) == ([], False)
+    # 向前翻页同样跳过
+    rows, more = query_orders_page(2, user_id="u1", after=(base - timedelta(days=1), ""), exclude=OrderStore())
+    assert [row["id"] for row in rows] == ["ORD1", "ORD0"] and more
+
+
+class FlakyExecutor:
+    """第一次写入失败、之后正常执行的写入线程替身"""
+
+    def __init__(self):
+        self.calls = 0
+        self.on_failure = None  # 失败的批次提交期间执行（模拟这时订单又有了新变更）
+
+    async def run_write(self, fn, *args):
+        self.calls += 1
+        if self.calls == 1:
+            if self.on_failure is not None:
+                self.on_failure()
+            raise OSError("disk I/O error")
+        return fn(*args)
+
+
+def test_write_behind_batch_survives_failed_flush(temp_database):
+    """同一订单的多次变更合并为一次写入；批次写入失败时放回缓冲区，且不覆盖提交期间的新状态"""
+    base = datetime(2026, 5, 1, 12)
+    first, second = make_order("ORD1", base), make_order("ORD2", base)
+    executor = FlakyExecutor()
+    writer = OrderWriteBehind(executor=executor)
+    writer.submit(first)
+    writer.submit(second)
+    second.status = OrderStatus.ACCEPTED
+    writer.submit(second)
+    assert writer.pending_count == 2
+
+    def cancel_first():
+        assert writer.is_pending("ORD1") and writer.pending_count == 0
+        first.status = OrderStatus.CANCELLED
+        writer.submit(first)
+
+    executor.on_failure = cancel_first
+    asyncio.run(writer.flush())
+    assert executor.calls == 1 and writer.pending_count == 2
+    assert load_order("ORD1") is None
+
+    asyncio.run(writer.flush())
+    assert executor.calls == 2 and writer.pending_count == 0 and not writer.is_pending("ORD1")
+    assert load_order("ORD1")["status"] == "cancelled"
+    assert load_order("ORD2")["status"] == "accepted"
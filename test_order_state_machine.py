@@ -0,0 +1,93 @@
+"""
+测试订单状态机和流转日志环形缓冲区
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from order_model import Order, OrderItem, OrderStatus
+from order_state_machine import InvalidTransition, OrderStateMachine, TransitionLog
+from order_store import OrderStore
+
+
+class CaptureExecutor:
+    def __init__(self):
+        self.batches = []
+
+    async def run_write(self, fn, entries):
+        self.batches.append(entries)
+
+
+def _make_order(order_id):
+    now = datetime.now()
+    return Order(order_id, "u1", "张三", 28.0, OrderStatus.PENDING, [OrderItem(1, "宫保鸡丁", 1, 28.0)], now, now)
+
+
+def test_transitions_follow_table_and_emit_once():
+    """不允许的流转不修改订单；批量流转只通知一次"""
+    store = OrderStore()
+    machine = OrderStateMachine(store, TransitionLog(capacity=8))
+    events = []
+    machine.subscribe(events.append)
+    store.add(_make_order("A"))
+    store.add(_make_order("B"))
+
+    with pytest.raises(InvalidTransition):
+        machine.transition(store.get("A"), OrderStatus.COMPLETED)
+    assert store.get("A").status is OrderStatus.PENDING and events == []
+
+    machine.transition(store.get("A"), OrderStatus.ACCEPTED)
+    assert [(t.from_status, t.to_status) for t in events[0]] == [("pending", "accepted")]
+    assert store.count_by_status(OrderStatus.ACCEPTED) == 1
+
+    batch = [machine.transition(store.get(order_id), OrderStatus.CANCELLED, emit=False) for order_id in "AB"]
+    machine.emit(batch)
+    assert len(events) == 2 and len(events[1]) == 2
+    # 已取消的订单不再流转；重复取消由调用方按 is_repeat 直接返回
+    assert not machine.can_transition(store.get("A"), OrderStatus.CANCELLED)
+    assert machine.is_repeat(store.get("A"), OrderStatus.CANCELLED)
+    assert not machine.is_repeat(store.get("A"), OrderStatus.PENDING)
+    with pytest.raises(InvalidTransition):
+        machine.transition(store.get("A"), OrderStatus.CANCELLED)
+
+
+def test_ring_buffer_flush_and_overflow():
+    """缓冲区写满时覆盖最早未写入的记录，提交后按顺序写出剩余记录"""
+    executor = CaptureExecutor()
+    log = TransitionLog(capacity=4, executor=executor)
+    for index in range(6):
+        log.append(f"O{index}", 0, 1, 1_000_000 * index)
+    assert log.dropped == 2 and log.pending_count == 4
+    assert log.pending_for("O5")[0][1:3] == ("pending", "accepted")
+
+    asyncio.run(log.flush())
+    assert [entry[0] for entry in executor.batches[0]] == ["O2", "O3", "O4", "O5"]
+    assert log.pending_count == 0 and log.pending_for("O5") == []
+
+
+def test_repeated_cancel_is_noop():
+    """重复取消返回成功，但不修改 updated_at、不写流转日志、不推送"""
+    from fastapi.testclient import TestClient
+    import Cook_applet
+
+    order = _make_order("ORD_REPEAT_CANCEL")
+    Cook_applet.orders_db.add(order)
+    events = []
+    Cook_applet.order_machine.subscribe(events.append)
+    client = TestClient(Cook_applet.app)
+
+    assert client.post(f"/api/merchant/orders/{order.id}/cancel").json()["order"]["status"] == "cancelled"
+    updated_at = order.updated_at
+    logged = Cook_applet.order_transition_log.pending_for(order.id)
+    assert len(logged) == 1 and len(events) == 1
+
+    for response in (client.post(f"/api/merchant/orders/{order.id}/cancel"),
+                     client.put(f"/api/merchant/orders/{order.id}", json={"status": "cancelled"}),
+                     client.post("/api/merchant/orders/batch",
+                                 json={"items": [{"order_id": order.id, "action": "cancel"}]})):
+        assert response.status_code == 200 and response.json()["success"]
+    assert order.updated_at == updated_at
+    assert Cook_applet.order_transition_log.pending_for(order.id) == logged
+    assert len(events) == 1
+    Cook_applet.order_machine._listeners.remove(events.append)
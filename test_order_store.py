@@ -0,0 +1,73 @@
+"""
+测试带索引的订单仓库
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+from order_store import OrderStore, sort_key, to_microseconds
+
+
+def _make_order(order_id, user_id, status="pending"):
+    now = datetime.now()
+    return SimpleNamespace(id=order_id, user_id=user_id, status=status,
+                           created_at=now, updated_at=now)
+
+
+def test_indexes_follow_status_changes():
+    """状态变更后各索引保持一致"""
+    store = OrderStore()
+    store.add(_make_order("A", "u1"))
+    store.add(_make_order("B", "u1"))
+    store.add(_make_order("C", "u2"))
+
+    assert store.get("B").user_id == "u1"
+    assert [o.id for o in store.by_user("u1")] == ["A", "B"]
+    assert store.count_by_status("pending") == 3
+
+    old = store.update_status(store.get("A"), "accepted")
+    assert old == "pending"
+    assert [o.id for o in store.by_status("pending")] == ["B", "C"]
+    assert [o.id for o in store.by_status("accepted")] == ["A"]
+
+    store.remove("C")
+    assert store.by_user("u2") == []
+    assert "C" not in store
+    assert len(store) == 2
+
+
+def test_changes_since_returns_only_recent_changes():
+    """增量同步只返回游标之后变更的订单"""
+    store = OrderStore()
+    for order_id in ("A", "B", "C"):
+        store.add(_make_order(order_id, "u1"))
+    _, cursor = store.changes_since(0)
+    assert cursor == 3
+
+    store.update_status(store.get("A"), "accepted")
+    store.add(_make_order("D", "u2"))
+    changed, cursor = store.changes_since(3)
+    assert [o.id for o in changed] == ["A", "D"]
+    assert store.changes_since(cursor) == ([], cursor)
+
+
+def test_keyset_pagination_newest_first():
+    """游标分页按下单时间倒序，每页代价与页码无关"""
+    store = OrderStore()
+    base = datetime(2026, 1, 1, 12, 0)
+    for minute in range(5):
+        order = _make_order(f"O{minute}", "u1", "completed" if minute % 2 else "pending")
+        order.created_at = base.replace(minute=minute)
+        store.add(order)
+
+    first, more = store.page(2)
+    assert [o.id for o in first] == ["O4", "O3"] and more
+    second, more = store.page(2, before=sort_key(first[-1]))
+    assert [o.id for o in second] == ["O2", "O1"] and more
+    newer, _ = store.page(2, after=sort_key(second[0]))
+    assert [o.id for o in newer] == ["O4", "O3"]
+
+    pending, _ = store.page(10, status="pending")
+    assert [o.id for o in pending] == ["O4", "O2", "O0"]
+    window, _ = store.page(10, start=to_microseconds(base.replace(minute=1)),
+                           end=to_microseconds(base.replace(minute=2)))
+    assert [o.id for o in window] == ["O2", "O1"]
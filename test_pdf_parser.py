@@ -0,0 +1,99 @@
+"""
+测试PDF菜谱的流式切分和增量导入
+"""
+import pdf_parser
+from pdf_parser import content_hash, import_dishes_to_database, iter_dishes
+
+
+def test_dishes_span_page_boundaries():
+    """菜品正文和被截断的菜名跨页时能正确拼接"""
+    pages = [
+        "目录\n【宫保鸡丁】\n食材：\n鸡胸肉 300g\n\n步骤：\n1. 切丁",
+        "\n2. 翻炒出锅\n【麻婆",
+        "豆腐】\n步骤：\n1. 切块",
+    ]
+    dishes = list(iter_dishes(enumerate(pages)))
+
+    assert [d['name'] for d in dishes] == ["宫保鸡丁", "麻婆豆腐"]
+    assert dishes[0]['recipe']['steps'] == ["切丁", "翻炒出锅"]
+    assert dishes[0]['recipe']['ingredients'] == [{"name": "鸡胸肉", "quantity": "300g"}]
+    assert [d['page'] for d in dishes] == [0, 1]
+
+
+def test_preamble_and_stray_brackets():
+    """第一个菜名之前的内容丢弃，正文中过长的未闭合【不当作菜名"""
+    stray = "【" + "注" * 60
+    pages = ["前言【目录说明", "】【甲】内容甲" + stray, "续甲"]
+    dishes = list(iter_dishes(enumerate(pages)))
+
+    assert [d['name'] for d in dishes] == ["目录说明", "甲"]
+    assert dishes[1]['cooking_instructions'] == "内容甲" + stray + "续甲"
+
+
+class FakeBook:
+    """替代PDF文件的页面来源：与 iter_pages 相同，内容哈希未变的页面不提取文本"""
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.extracted = []
+
+    def count_pages(self, pdf_path):
+        return len(self.pages)
+
+    def iter_pages(self, pdf_path, workers=None, known_hashes=None):
+        for page, text in enumerate(self.pages):
+            page_hash = content_hash(text)
+            if known_hashes is not None and known_hashes.get(page) == page_hash:
+                yield page, page_hash, None
+            else:
+                self.extracted.append(page)
+                yield page, page_hash, text
+
+
+def test_reimport_rewrites_only_changed_dishes(temp_database, monkeypatch, tmp_path):
+    """只有一页变化时只重新提取该页、只更新该页的菜品；菜名变了而制作说明没变时视为改名"""
+    book = FakeBook([
+        "【宫保鸡丁】\n食材：\n鸡胸肉 300g\n步骤：\n1. 切丁",
+        "【麻婆豆腐】\n步骤：\n1. 切块",
+        "【鱼香肉丝】\n步骤：\n1. 切丝",
+    ])
+    monkeypatch.setattr(pdf_parser, "count_pages", book.count_pages)
+    monkeypatch.setattr(pdf_parser, "iter_pages", book.iter_pages)
+    pdf_path = str(tmp_path / "menu.pdf")
+    DishModel = temp_database.DishModel
+
+    def dishes():
+        db = temp_database.SessionLocal()
+        try:
+            return {row.name: (row.id, row.price, row.cooking_instructions) for row in db.query(DishModel)}
+        finally:
+            db.close()
+
+    first = import_dishes_to_database(pdf_path, "川菜", notify_url=None)
+    before = dishes()
+    assert sorted(first) == sorted(dish_id for dish_id, _, _ in before.values()) and len(before) == 3
+    # 商家手动设置的价格不应被重新导入覆盖
+    db = temp_database.SessionLocal()
+    db.query(DishModel).update({DishModel.price: 18.0})
+    db.commit()
+    db.close()
+
+    book.extracted.clear()
+    book.pages[1] = "【麻婆豆腐】\n步骤：\n1. 切块\n2. 小火焖煮"
+    assert import_dishes_to_database(pdf_path, notify_url=None) == [before["麻婆豆腐"][0]]
+    assert book.extracted == [1]
+    after = dishes()
+    assert after["麻婆豆腐"][2].endswith("小火焖煮")
+    assert after["宫保鸡丁"] == (before["宫保鸡丁"][0], 18.0, before["宫保鸡丁"][2])
+
+    book.extracted.clear()
+    book.pages[2] = "【鱼香茄子】\n步骤：\n1. 切丝"
+    assert import_dishes_to_database(pdf_path, notify_url=None) == [before["鱼香肉丝"][0]]
+    assert book.extracted == [2]
+    renamed = dishes()
+    assert "鱼香肉丝" not in renamed and renamed["鱼香茄子"][:2] == (before["鱼香肉丝"][0], 18.0)
+
+    # 没有任何变化时不提取、不写库
+    book.extracted.clear()
+    assert import_dishes_to_database(pdf_path, notify_url=None) == []
+    assert book.extracted == [] and dishes() == renamed
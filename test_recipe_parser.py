@@ -0,0 +1,37 @@
+"""
+测试制作说明的结构化解析
+"""
+from recipe_parser import parse_recipe, recipe_columns, recipe_from_columns
+
+
+def test_parse_init_data_layout():
+    """解析示例数据使用的 📋/👨‍🍳/💡 版式，并能经数据库列往返"""
+    text = """【宫保鸡丁】
+
+📋 所需食材：
+  • 鸡胸肉 300g
+  • 料酒、酱油、醋、糖、盐 适量
+  • 鸡蛋2个
+  • 盐
+
+👨‍🍳 制作步骤：
+  1. 鸡胸肉切丁，加料酒、盐、淀粉腌制
+     15分钟
+  2、热油炒花生米至金黄
+
+💡 小贴士：
+  火候要掌握好，鸡肉不要炒老了"""
+    recipe = parse_recipe(text)
+
+    assert recipe["ingredients"] == [
+        {"name": "鸡胸肉", "quantity": "300g"},
+        {"name": "料酒、酱油、醋、糖、盐", "quantity": "适量"},
+        {"name": "鸡蛋", "quantity": "2个"},
+        {"name": "盐", "quantity": ""},
+    ]
+    assert recipe["steps"] == ["鸡胸肉切丁，加料酒、盐、淀粉腌制15分钟", "热油炒花生米至金黄"]
+    assert recipe["tips"] == ["火候要掌握好，鸡肉不要炒老了"]
+    assert recipe_from_columns(*recipe_columns(recipe).values()) == recipe
+
+    assert parse_recipe("暂无制作说明") is None
+    assert recipe_from_columns(*recipe_columns(None).values()) is None
@@ -0,0 +1,50 @@
+"""
+测试菜品搜索索引
+"""
+from types import SimpleNamespace
+
+from search_index import DishSearchIndex, pinyin_initials
+
+
+def make_dish(dish_id, name, category, description="", ingredients=(), is_available=True):
+    recipe = {"ingredients": [{"name": item, "quantity": ""} for item in ingredients], "steps": [], "tips": []}
+    return SimpleNamespace(id=dish_id, name=name, category=category, description=description,
+                           recipe=recipe, is_available=is_available)
+
+
+def test_search_ranking_pinyin_and_incremental_sync():
+    """中文片段、错字、拼音首字母和食材都能命中，分类计数随菜品变更增量更新"""
+    assert pinyin_initials("宫保鸡丁") == "gbjd"
+
+    dishes = [
+        make_dish(1, "宫保鸡丁", "川菜", "鸡肉、花生", ["鸡胸肉", "花生米"]),
+        make_dish(2, "鱼香肉丝", "川菜", "猪肉、木耳", ["猪里脊", "木耳"]),
+        make_dish(3, "花生炖猪蹄", "家常菜", "猪蹄", ["猪蹄", "花生"]),
+        make_dish(4, "红烧肉", "家常菜", is_available=False),
+    ]
+    index = DishSearchIndex()
+    index.sync(dishes)
+    assert len(index) == 3
+    assert index.category_counts == {"川菜": 2, "家常菜": 1}
+
+    assert [d.id for d in index.search("宫保鸡丁").items] == [1]
+    assert [d.id for d in index.search("宫爆鸡丁").items] == [1]
+    assert [d.id for d in index.search("gbjd").items] == [1]
+    assert [d.id for d in index.search("YXRS").items] == [2]
+
+    # 菜名命中排在只有食材命中的前面
+    result = index.search("花生")
+    assert [d.id for d in result.items] == [3, 1]
+    assert result.facets == {"川菜": 1, "家常菜": 1}
+    filtered = index.search("花生", category="川菜", limit=1)
+    assert (filtered.total, [d.id for d in filtered.items]) == (1, [1])
+    assert index.search("", limit=2, offset=1).items == [dishes[1], dishes[2]]
+
+    # 只有被替换的菜品对象会重新索引，下架的菜品从索引中移除
+    dishes[0] = make_dish(1, "辣子鸡", "川菜")
+    dishes[2] = make_dish(3, "花生炖猪蹄", "家常菜", is_available=False)
+    index.sync(dishes)
+    assert index.search("宫保").total == 0
+    assert [d.id for d in index.search("lzj").items] == [1]
+    assert index.search("猪蹄").total == 0
+    assert index.category_counts == {"川菜": 2}
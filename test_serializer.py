@@ -0,0 +1,82 @@
+"""
+测试预生成编码函数的输出与旧的 asdict + jsonable_encoder 路径一致
+"""
+import json
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from order_model import Order, OrderItem, OrderStatus
+from serializer import encode, json_response
+
+
+class Spice(Enum):
+    MILD = "mild"
+    HOT = "hot"
+
+
+@dataclass
+class Line:
+    dish_id: int
+    name: str
+    price: float
+
+
+@dataclass
+class Ticket:
+    id: str
+    total: float
+    paid: bool
+    spice: Spice
+    created_at: datetime
+    lines: List[Line]
+    note: Optional[str] = None
+    closed_at: Optional[datetime] = None
+    extra: Dict[str, object] = field(default_factory=dict)
+    count: int = 0
+
+
+def _convert_datetime_in_dict(data):
+    """旧实现：递归转换字典中的datetime对象"""
+    if isinstance(data, dict):
+        return {key: _convert_datetime_in_dict(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_convert_datetime_in_dict(item) for item in data]
+    if isinstance(data, datetime):
+        return data.isoformat()
+    return data
+
+
+def legacy(content) -> str:
+    return json.dumps(jsonable_encoder(_convert_datetime_in_dict(content)), ensure_ascii=False)
+
+
+def pairs(text: str):
+    """按键的顺序解析，字段顺序不同也视为不一致"""
+    return json.loads(text, object_pairs_hook=list)
+
+
+def test_dataclass_output_matches_legacy():
+    ticket = Ticket(
+        id='T"1\\\n', total=0.1 + 0.2, paid=False, spice=Spice.HOT,
+        created_at=datetime(2026, 5, 1, 12, 30, 5, 123456),
+        lines=[Line(1, "宫保鸡丁", 28.0), Line(2, "麻婆豆腐 🌶", 1e-7)],
+        extra={"tags": ["辣", None], "rank": 3, "when": datetime(2026, 5, 1)}, count=-2,
+    )
+    empty = Ticket(id="", total=0, paid=True, spice=Spice.MILD, created_at=datetime(2026, 1, 1), lines=[])
+
+    for obj in (ticket, empty, [ticket, empty]):
+        content = [asdict(item) for item in obj] if isinstance(obj, list) else asdict(obj)
+        assert pairs(encode(obj)) == pairs(legacy(content))
+
+
+def test_order_output_matches_legacy():
+    now = datetime(2026, 5, 1, 12)
+    order = Order("ORD1", "u1", "张三", 56.0, OrderStatus.ACCEPTED, [OrderItem(1, "宫保鸡丁", 2, 28.0)],
+                  now, now, note="不要太辣")
+    response = json_response([order])
+    assert response.media_type == "application/json"
+    assert pairs(response.body.decode("utf-8")) == pairs(legacy([order.to_dict()]))
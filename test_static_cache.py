@@ -0,0 +1,39 @@
+"""
+测试静态资源缓存
+"""
+import gzip
+
+from starlette.requests import Request
+
+from static_cache import StaticCache, build_asset, hashed_name, respond
+
+
+def make_request(**headers):
+    raw = [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_precompressed_variants_and_lru():
+    """文本按 Accept-Encoding 返回预压缩版本并支持304，图片LRU按总字节数淘汰"""
+    html = ("<html>" + "点菜" * 500 + "</html>").encode("utf-8")
+    asset = build_asset(html, "text/html; charset=utf-8")
+    assert gzip.decompress(asset.variants["gzip"]) == html
+    assert hashed_name("demo.html", html) != hashed_name("demo.html", html + b" ")
+
+    response = respond(make_request(accept_encoding="gzip, deflate"), asset)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "immutable" in response.headers["cache-control"]
+    assert "content-encoding" not in respond(make_request(accept_encoding="gzip;q=0"), asset).headers
+    assert respond(make_request(if_none_match=asset.etag), asset).status_code == 304
+
+    # 已经压缩过的图片不再压缩
+    assert list(build_asset(b"\x89PNG" + bytes(1000), "image/png").variants) == ["identity"]
+
+    cache = StaticCache(max_bytes=2500)
+    for key in ("a", "b", "c"):
+        cache.put(key, build_asset(bytes(1000), "image/png"))
+    assert cache.get_cached("a") is None
+    assert cache.get_cached("b") is not None
+    cache.put("d", build_asset(bytes(1000), "image/png"))
+    assert cache.get_cached("c") is None and cache.get_cached("b") is not None